@@ -1,16 +1,53 @@
+import time
+BOOT_STARTED = time.perf_counter()  # Marco zero da linha do tempo de inicialização
+
 import discord
 from discord.ext import commands
 import asyncio
 import json
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 import aiofiles
 from threading import Thread
 from flask import Flask
 import re
+import sqlite3
+import io
+import hashlib
+import struct
+import base64
+from array import array
+import zlib
+import lzma
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
+import sys
+import uuid
 from dotenv import load_dotenv
 
+class StartupTimeline:
+    """Mede as etapas da inicialização (imports, login, estado, servidores)"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.marks = []
+        self.finished = False
+
+    def mark(self, stage: str):
+        self.marks.append((stage, time.perf_counter()))
+
+    def report(self):
+        self.finished = True
+        print("⏱️ Linha do tempo de inicialização:")
+        previous = self.started
+        for stage, moment in self.marks:
+            print(f"   • {stage:<18} +{(moment - previous) * 1000:8.1f} ms | {(moment - self.started) * 1000:8.1f} ms")
+            previous = moment
+
+startup_timeline = StartupTimeline(BOOT_STARTED)
+startup_timeline.mark('imports')
+
 # Keep alive para manter o bot online
 app = Flask('')
 
@@ -63,7 +100,14 @@ DEFAULT_CONFIG = {
     'auto_ban_bots_on_deletion': True,
     'kick_timeout': 300,
     'ban_timeout': 3600,
-    'auto_ban_everyone_mention': True
+    'auto_ban_everyone_mention': True,
+    'blocked_terms': [],
+    'anti_raid_enabled': True,
+    'raid_join_threshold': 10,  # Entradas dentro da janela que ativam o modo raid
+    'raid_join_window': 10,  # Segundos
+    'raid_account_age_days': 7,  # Contas mais novas que isso são removidas durante o raid
+    'raid_mode_duration': 120,  # Segundos sem novas entradas até sair do modo raid
+    'raid_action': 'ban'  # 'ban' (em lote) ou 'kick'
 }
 
 COLORS = {
@@ -74,6 +118,47 @@ COLORS = {
     'purple': 0x9932cc
 }
 
+class GuildConfig:
+    """Configuração materializada de um servidor: atributos tipados, imutável e versionada"""
+    __slots__ = tuple(DEFAULT_CONFIG) + ('version',)
+
+    def __init__(self, values: Dict, version: int = 1):
+        for key, default in DEFAULT_CONFIG.items():
+            value = values.get(key, default)
+            if key == 'whitelist_users':
+                value = frozenset(int(user_id) for user_id in value)  # Pertinência O(1) nos handlers
+            elif key == 'blocked_terms':
+                value = tuple(value)
+            elif isinstance(default, bool):
+                value = bool(value)
+            elif isinstance(default, int) and value is not None:
+                value = int(value)
+            object.__setattr__(self, key, value)
+        object.__setattr__(self, 'version', version)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("GuildConfig é imutável: use SecurityBot.update_guild_config")
+
+    # Compatibilidade com o acesso antigo por chave (config['chave'] / config.get)
+    def __getitem__(self, key: str):
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def replace(self, **changes) -> 'GuildConfig':
+        """Nova versão com as alterações aplicadas"""
+        values = self.to_dict()
+        values.update(changes)
+        return GuildConfig(values, self.version + 1)
+
+    def to_dict(self) -> Dict:
+        """Forma persistida (listas no lugar dos conjuntos)"""
+        values = {key: getattr(self, key) for key in DEFAULT_CONFIG}
+        values['whitelist_users'] = sorted(self.whitelist_users)
+        values['blocked_terms'] = list(self.blocked_terms)
+        return values
+
 # Configurações do bot
 intents = discord.Intents.default()
 intents.message_content = True
@@ -82,73 +167,3285 @@ intents.guilds = True
 intents.guild_messages = True
 intents.moderation = True
 
-bot = commands.Bot(command_prefix='!sec_', intents=intents, help_command=None)
+class SecurityBotClient(commands.Bot):
+    """Bot que carrega o estado uma única vez, antes de conectar ao gateway"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.status_task = None
+
+    async def setup_hook(self):
+        # Roda depois do login e antes do gateway: nenhum evento vê o estado vazio
+        startup_timeline.mark('login')
+        await security_system.load_data()
+        # Modo 'sharded': arquivos dos servidores lidos fora do loop antes do primeiro evento
+        if security_system.storage.lazy:
+            await security_system.preload_guilds(security_system.storage.guild_ids())
+        security_system.start_background_tasks()
+        startup_timeline.mark('estado carregado')
+
+bot = SecurityBotClient(command_prefix='!sec_', intents=intents, help_command=None)
 
 # Arquivo para salvar dados de segurança
 SECURITY_DATA_FILE = "security_data.json"
 
+# Modo de armazenamento:
+#   'json'    - arquivo único reescrito a cada salvamento (padrão)
+#   'journal' - snapshot + diário só de acréscimo, compactado em segundo plano
+#   'sharded' - um arquivo por servidor e por seção, carregado sob demanda
+#   'sqlite'  - banco SQLite em modo WAL (importa o security_data.json na primeira execução)
+STORAGE_MODE = os.getenv('SECURITY_STORAGE_MODE', 'json')
+SECURITY_JOURNAL_FILE = "security_data.journal"
+SECURITY_DATA_DIR = "security_data"  # Pasta usada pelo modo 'sharded'
+SECURITY_DB_FILE = "security_data.db"  # Banco usado pelo modo 'sqlite'
+
+# Codificação dos dados persistidos: 'json' (padrão), 'zlib' ou 'lzma'
+# (formato binário compacto + compressão). JSON continua sendo o formato
+# de importação/exportação.
+DATA_CODEC = os.getenv('SECURITY_DATA_CODEC', 'json')
+SECURITY_DATA_BIN_FILE = "security_data.bin"
+JOURNAL_COMPACT_INTERVAL = 300  # Segundos entre compactações do diário
+JOURNAL_COMPACT_MAX_BYTES = 1024 * 1024  # Compacta antes se o diário passar deste tamanho
+
+# Persistência em segundo plano (write-behind)
+PERSIST_FLUSH_INTERVAL_MS = 2000  # Intervalo mínimo entre gravações
+PERSIST_DIRTY_BYTES_THRESHOLD = 256 * 1024  # Grava antes do intervalo se acumular isso
+
+# Seções do estado que são persistidas em disco
+PERSISTED_SECTIONS = (
+    'guild_configs',
+    'restored_roles',
+    'security_logs',
+    'user_warnings',
+    'backup_data',
+    'ban_tracker',
+    'bot_activity_logs',
+    'restore_jobs'
+)
+
+# Seções indexadas pelo ID do servidor (restored_roles é indexado por usuário)
+GUILD_SECTIONS = ('guild_configs', 'security_logs', 'user_warnings', 'backup_data', 'ban_tracker', 'restore_jobs')
+
+def change_guild_id(change: Dict) -> Optional[str]:
+    """Descobre a qual servidor pertence uma mutação registrada"""
+    section = change['path'][0]
+    if section in GUILD_SECTIONS and len(change['path']) > 1:
+        return change['path'][1]
+    return change.get('guild')
+
+# Threads que serializam/parsam JSON fora do event loop
+SERIALIZATION_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix='sec-json')
+
+# Até que profundidade cada seção é copiada no snapshot. Abaixo disso ficam
+# registros (logs, avisos, backups...) que nunca são alterados depois de criados,
+# então podem ser compartilhados com a thread de serialização sem cópia.
+SNAPSHOT_DEPTHS = {
+    'guild_configs': 3,
+    'restored_roles': 1,
+    'security_logs': 2,
+    'user_warnings': 3,
+    'backup_data': 3,
+    'ban_tracker': 3,
+    'bot_activity_logs': 8,
+    'restore_jobs': 5  # O registro do job recebe resultados a cada passo concluído
+}
+
+def copy_containers(value, depth: int):
+    """Copia dicts/listas até a profundidade indicada, compartilhando o resto"""
+    if depth <= 0:
+        return value
+    if isinstance(value, dict):
+        return {k: copy_containers(v, depth - 1) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_containers(v, depth - 1) for v in value]
+    return value
+
+def snapshot_state(state: Dict) -> Dict:
+    """Cópia consistente do estado para ser serializada em outra thread"""
+    return {
+        section: copy_containers(value, SNAPSHOT_DEPTHS.get(section, 8))
+        for section, value in state.items()
+    }
+
+def dump_json(value, indent: Optional[int] = None) -> str:
+    return json.dumps(value, indent=indent, ensure_ascii=False)
+
+async def run_serializer(fn, *args):
+    """Executa serialização/parsing no pool de threads"""
+    return await asyncio.get_running_loop().run_in_executor(SERIALIZATION_POOL, fn, *args)
+
+# === FORMATO BINÁRIO COMPACTO ===
+# Cabeçalho + tipo de compressão + payload. Cada valor é uma tag de 1 byte
+# seguida do conteúdo; inteiros usam varint (IDs do Discord ocupam ~9 bytes)
+# e datas ISO nos campos de data viram microssegundos desde a época.
+BINARY_MAGIC = b'SBD1'
+BINARY_COMPRESSORS = {
+    'zlib': (b'z', lambda raw: zlib.compress(raw, 6)),
+    'lzma': (b'x', lzma.compress)
+}
+BINARY_DECOMPRESSORS = {b'z': zlib.decompress, b'x': lzma.decompress, b'r': lambda raw: raw}
+TIMESTAMP_KEYS = frozenset(('timestamp', 'created_at', 'deleted_at', 'removed_at'))
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+def _write_varint(out: bytearray, value: int):
+    value = value * 2 if value >= 0 else -value * 2 - 1  # zigzag
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(raw: bytes, pos: int):
+    value = shift = 0
+    while True:
+        byte = raw[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return (value >> 1 if not value & 1 else -(value >> 1) - 1), pos
+
+def _epoch_to_iso(tag: bytes, micros: int) -> str:
+    base = _EPOCH if tag == b't' else _EPOCH_UTC
+    return (base + micros * _MICROSECOND).isoformat()
+
+def _iso_to_epoch(value: str):
+    """Converte data ISO em (tag, microssegundos) se o texto puder ser refeito igual"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        tag, micros = b't', (moment - _EPOCH) // _MICROSECOND
+    elif moment.utcoffset() == timedelta(0):
+        tag, micros = b'z', (moment - _EPOCH_UTC) // _MICROSECOND
+    else:
+        return None
+    if _epoch_to_iso(tag, micros) != value:
+        return None
+    return tag, micros
+
+def _encode_value(value, out: bytearray, key: Optional[str] = None):
+    if value is None:
+        out += b'N'
+    elif value is True:
+        out += b'T'
+    elif value is False:
+        out += b'F'
+    elif isinstance(value, int):
+        out += b'I'
+        _write_varint(out, value)
+    elif isinstance(value, float):
+        out += b'D' + struct.pack('<d', value)
+    elif isinstance(value, str):
+        epoch = _iso_to_epoch(value) if key in TIMESTAMP_KEYS else None
+        if epoch:
+            out += epoch[0]
+            _write_varint(out, epoch[1])
+        else:
+            data = value.encode('utf-8')
+            out += b'S'
+            _write_varint(out, len(data))
+            out += data
+    elif isinstance(value, (list, tuple)):
+        out += b'L'
+        _write_varint(out, len(value))
+        for item in value:
+            _encode_value(item, out)
+    elif isinstance(value, dict):
+        out += b'M'
+        _write_varint(out, len(value))
+        for item_key, item in value.items():
+            data = str(item_key).encode('utf-8')
+            _write_varint(out, len(data))
+            out += data
+            _encode_value(item, out, str(item_key))
+    else:
+        raise TypeError(f"Tipo não suportado no formato binário: {type(value).__name__}")
+
+def _decode_value(raw: bytes, pos: int):
+    tag = raw[pos:pos + 1]
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag == b'T':
+        return True, pos
+    if tag == b'F':
+        return False, pos
+    if tag == b'I':
+        return _read_varint(raw, pos)
+    if tag == b'D':
+        return struct.unpack_from('<d', raw, pos)[0], pos + 8
+    if tag in (b't', b'z'):
+        micros, pos = _read_varint(raw, pos)
+        return _epoch_to_iso(tag, micros), pos
+    if tag == b'S':
+        size, pos = _read_varint(raw, pos)
+        return raw[pos:pos + size].decode('utf-8'), pos + size
+    if tag == b'L':
+        count, pos = _read_varint(raw, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode_value(raw, pos)
+            items.append(item)
+        return items, pos
+    if tag == b'M':
+        count, pos = _read_varint(raw, pos)
+        result = {}
+        for _ in range(count):
+            size, pos = _read_varint(raw, pos)
+            item_key = raw[pos:pos + size].decode('utf-8')
+            result[item_key], pos = _decode_value(raw, pos + size)
+        return result, pos
+    raise ValueError(f"Tag desconhecida no formato binário: {tag!r}")
+
+def encode_data(value, indent: Optional[int] = None) -> bytes:
+    """Serializa no codec configurado (JSON ou binário compactado)"""
+    if DATA_CODEC not in BINARY_COMPRESSORS:
+        return dump_json(value, indent).encode('utf-8')
+    out = bytearray()
+    _encode_value(value, out)
+    tag, compress = BINARY_COMPRESSORS[DATA_CODEC]
+    return BINARY_MAGIC + tag + compress(bytes(out))
+
+def decode_data(raw: bytes):
+    """Lê JSON ou binário, detectando o formato pelo cabeçalho"""
+    if raw[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+        return json.loads(raw.decode('utf-8'))
+    header = len(BINARY_MAGIC)
+    payload = BINARY_DECOMPRESSORS[raw[header:header + 1]](raw[header + 1:])
+    return _decode_value(payload, 0)[0]
+
+def measure_encoding(value) -> Dict:
+    """Compara o tamanho no codec atual com o JSON indentado antigo"""
+    encoded = len(encode_data(value))
+    legacy = len(dump_json(value, 2).encode('utf-8'))
+    return {'encoded': encoded, 'json': legacy, 'savings': (1 - encoded / legacy) * 100 if legacy else 0.0}
+
+# Backups completos são deduplicados: cada canal/cargo/categoria é guardado
+# uma única vez em backup_data[guild]['objects'] (chave = hash do conteúdo)
+# e o backup vira um manifesto com as listas de hashes.
+BACKUP_RECORD_KINDS = ('categories', 'channels', 'roles')
+
+def pack_ids(values) -> str:
+    """Inteiros de 64 bits empacotados (array('Q') little-endian) em base64"""
+    packed = values if isinstance(values, array) else array('Q', values)
+    if sys.byteorder != 'little':
+        packed = array('Q', packed)
+        packed.byteswap()
+    return base64.b64encode(packed.tobytes()).decode('ascii')
+
+def unpack_ids(text: str) -> array:
+    packed = array('Q')
+    packed.frombytes(base64.b64decode(text))
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed
+
+# Leituras rápidas de atributos internos do discord.py, sempre com a API pública como
+# alternativa: uma atualização da biblioteca deixa tudo mais lento, mas não quebra
+def channel_overwrites(channel) -> List[Tuple[int, int, int, int]]:
+    """Sobrescritas do canal como (id, tipo, allow, deny); tipo 0 = cargo, 1 = membro"""
+    raw = getattr(channel, '_overwrites', None)
+    if isinstance(raw, list) and all(hasattr(item, 'allow') for item in raw[:1]):
+        return [(overwrite.id, overwrite.type, overwrite.allow, overwrite.deny) for overwrite in raw]
+    overwrites = []
+    for target, overwrite in channel.overwrites.items():
+        allow, deny = overwrite.pair()
+        overwrites.append((target.id, 0 if isinstance(target, discord.Role) else 1, allow.value, deny.value))
+    return overwrites
+
+def member_role_ids(member):
+    """IDs dos cargos do membro (sem @everyone): o array ordenado interno ou member.roles"""
+    raw = getattr(member, '_roles', None)
+    if isinstance(raw, array):
+        return raw
+    return [role.id for role in member.roles if not role.is_default()]
+
+def pack_overwrites(overwrites: List[Tuple[int, int, int, int]]) -> str:
+    """Sobrescritas de permissão de um canal como quádruplas (id, tipo, allow, deny)"""
+    return pack_ids(value for overwrite in overwrites for value in overwrite)
+
+def unpack_overwrites(text: Optional[str]) -> List[Tuple[int, int, int, int]]:
+    if not text:
+        return []
+    values = unpack_ids(text)
+    return list(zip(values[0::4], values[1::4], values[2::4], values[3::4]))
+
+def content_hash(record: Dict) -> str:
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+def backup_checksum(manifest: Dict) -> str:
+    """sha256 do manifesto; como ele lista os hashes dos objetos, cobre o backup inteiro"""
+    canonical = json.dumps({k: v for k, v in manifest.items() if k != 'checksum'},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def pick_backup(bucket: Dict, backup_id: str, hashes) -> Tuple[Optional[Dict], Dict]:
+    """Extrai um backup e os objetos pedidos do contêiner de backups de um servidor"""
+    manifest = next((b for b in bucket.get('full_backups', []) if b.get('backup_id') == backup_id), None)
+    stored = bucket.get('objects', {})
+    return manifest, {digest: stored[digest] for digest in hashes if digest in stored}
+
+def build_backup_manifest(backup: Dict):
+    """Separa um backup em manifesto + objetos endereçados por conteúdo"""
+    manifest = {key: value for key, value in backup.items() if key not in BACKUP_RECORD_KINDS}
+    manifest['manifest'] = True
+    objects = {}
+    for kind in BACKUP_RECORD_KINDS:
+        hashes = []
+        for record in backup.get(kind, []):
+            digest = content_hash(record)
+            objects[digest] = record
+            hashes.append(digest)
+        manifest[kind] = hashes
+    manifest['checksum'] = backup_checksum(manifest)
+    return manifest, objects
+
+def apply_change(state: Dict, change: Dict):
+    """Aplica uma mutação registrada (set/del/push) a um dicionário de estado"""
+    *parents, key = change['path']
+    target = state
+    for part in parents:
+        target = target.setdefault(part, {})
+
+    op = change['op']
+    if op == 'set':
+        target[key] = change['value']
+    elif op == 'del':
+        target.pop(key, None)
+    elif op == 'push':
+        items = target.setdefault(key, [])
+        items.append(change['value'])
+        # Mantém apenas os últimos itens, como o código que gerou a mutação
+        if change.get('limit'):
+            del items[:-change['limit']]
+
+class JsonStorage:
+    """Persiste todo o estado em um único arquivo JSON"""
+
+    lazy = False  # Se True, os dados de cada servidor são lidos sob demanda
+    migrated_guilds = frozenset()  # Servidores que load() já devolveu completos (não recarregar)
+
+    def __init__(self, path: Optional[str] = None, legacy_path: str = SECURITY_DATA_FILE):
+        self.path = path or (SECURITY_DATA_FILE if DATA_CODEC == 'json' else SECURITY_DATA_BIN_FILE)
+        self.legacy_path = legacy_path  # JSON antigo, importado se o arquivo atual não existir
+        self.blocked_ms = 0.0  # Tempo de event loop bloqueado na última gravação
+
+    async def load(self) -> Dict:
+        path = self.path if os.path.exists(self.path) else self.legacy_path
+        if not os.path.exists(path):
+            return {}
+        async with aiofiles.open(path, 'rb') as f:
+            raw = await f.read()
+        return await run_serializer(decode_data, raw)
+
+    async def save(self, data: Dict, changes: List[Dict]) -> int:
+        # No loop só a cópia do estado; a serialização roda no pool
+        started = time.perf_counter()
+        snapshot = snapshot_state(data)
+        self.blocked_ms = (time.perf_counter() - started) * 1000
+
+        content = await run_serializer(encode_data, snapshot, 2)
+        async with aiofiles.open(self.path, 'wb') as f:
+            await f.write(content)
+        return len(content)
+
+    def disk_usage(self) -> int:
+        """Bytes ocupados em disco por este armazenamento"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def load_guild(self, guild_id: str) -> Dict:
+        return {}
+
+    async def read_backup(self, guild_id: str, backup_id: str, hashes) -> Tuple[Optional[Dict], Dict]:
+        """Lê do disco um backup e os objetos pedidos, sem tocar no estado em memória"""
+        # Limite do modo JSON: o estado é um arquivo só, então conferir um backup relê e decodifica
+        # o arquivo inteiro (no pool). Os outros modos (diário, shards, SQLite) leem só esse backup
+        data = await JsonStorage.load(self)
+        return pick_backup(data.get('backup_data', {}).get(guild_id, {}), backup_id, hashes)
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    async def compact(self, data: Dict) -> int:
+        return 0
+
+class JournalStorage(JsonStorage):
+    """Snapshot JSON + diário de mutações (uma linha JSON por alteração)"""
+
+    def __init__(self, path: Optional[str] = None, journal_path: str = SECURITY_JOURNAL_FILE):
+        super().__init__(path)
+        self.journal_path = journal_path
+        self.seq = 0  # Última mutação gravada
+        self.journal_bytes = 0
+        # Posição no diário dos backups/objetos gravados desde a última compactação
+        self.backup_offsets = {}
+
+    async def load(self) -> Dict:
+        data = await super().load()
+        # Mutações com seq <= _journal_seq já estão no snapshot
+        self.seq = data.pop('_journal_seq', 0)
+        self.journal_bytes = 0
+
+        if os.path.exists(self.journal_path):
+            async with aiofiles.open(self.journal_path, 'r', encoding='utf-8') as f:
+                content = await f.read()
+            self.journal_bytes = len(content.encode('utf-8'))
+            self.seq = await run_serializer(self._replay, data, content, self.seq)
+
+        return data
+
+    @staticmethod
+    def _replay(data: Dict, content: str, seq: int) -> int:
+        """Reaplica o diário sobre o snapshot (roda no pool de threads)"""
+        for line in content.splitlines():
+            try:
+                change = json.loads(line)
+            except json.JSONDecodeError:
+                # Linha incompleta (queda no meio de uma escrita)
+                continue
+            if change['seq'] <= seq:
+                continue
+            apply_change(data, change)
+            seq = change['seq']
+        return seq
+
+    async def save(self, data: Dict, changes: List[Dict]) -> int:
+        if not changes:
+            self.blocked_ms = 0.0
+            return 0
+
+        # Registros pequenos: serializar no loop custa menos que despachar ao pool
+        started = time.perf_counter()
+        lines = []
+        offset = self.journal_bytes
+        for change in changes:
+            self.seq += 1
+            line = json.dumps({'seq': self.seq, **change}, ensure_ascii=False)
+            size = len(line.encode('utf-8')) + 1
+            key = self._backup_key(change)
+            if key:
+                self.backup_offsets[key] = (offset, size)
+            offset += size
+            lines.append(line)
+        content = '\n'.join(lines) + '\n'
+        self.blocked_ms = (time.perf_counter() - started) * 1000
+
+        written = len(content.encode('utf-8'))
+        async with aiofiles.open(self.journal_path, 'a', encoding='utf-8') as f:
+            await f.write(content)
+        self.journal_bytes += written
+        return written
+
+    @staticmethod
+    def _backup_key(change: Dict) -> Optional[Tuple]:
+        path = change['path']
+        if path[0] != 'backup_data' or len(path) < 3:
+            return None
+        if path[2] == 'full_backups' and change['op'] == 'push':
+            return ('full_backups', path[1], change['value'].get('backup_id'))
+        if path[2] == 'objects' and len(path) == 4 and change['op'] == 'set':
+            return ('objects', path[1], path[3])
+        return None
+
+    async def read_backup(self, guild_id: str, backup_id: str, hashes) -> Tuple[Optional[Dict], Dict]:
+        # Lê só as linhas do diário desse backup; após uma compactação cai no snapshot
+        keys = [('full_backups', guild_id, backup_id)] + [('objects', guild_id, digest) for digest in hashes]
+        if any(key not in self.backup_offsets for key in keys):
+            data = await JsonStorage.load(self)
+            if os.path.exists(self.journal_path):
+                async with aiofiles.open(self.journal_path, 'r', encoding='utf-8') as f:
+                    content = await f.read()
+                await run_serializer(self._replay, data, content, data.pop('_journal_seq', 0))
+            return pick_backup(data.get('backup_data', {}).get(guild_id, {}), backup_id, hashes)
+        spans = [self.backup_offsets[key] for key in keys]
+
+        def read():
+            with open(self.journal_path, 'rb') as f:
+                records = []
+                for offset, size in spans:
+                    f.seek(offset)
+                    records.append(json.loads(f.read(size)))
+            return records
+
+        manifest, *objects = await run_serializer(read)
+        return manifest['value'], {record['path'][3]: record['value'] for record in objects}
+
+    def needs_compaction(self) -> bool:
+        return self.journal_bytes >= JOURNAL_COMPACT_MAX_BYTES
+
+    def disk_usage(self) -> int:
+        journal = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        return super().disk_usage() + journal
+
+    async def compact(self, data: Dict) -> int:
+        """Grava um snapshot novo e esvazia o diário"""
+        started = time.perf_counter()
+        snapshot = dict(snapshot_state(data), _journal_seq=self.seq)
+        self.blocked_ms = (time.perf_counter() - started) * 1000
+        content = await run_serializer(encode_data, snapshot)
+        tmp_path = self.path + '.tmp'
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(content)
+        os.replace(tmp_path, self.path)
+
+        # Se cair aqui, o seq no snapshot evita reaplicar o diário antigo
+        async with aiofiles.open(self.journal_path, 'w', encoding='utf-8') as f:
+            await f.write('')
+        self.journal_bytes = 0
+        self.backup_offsets.clear()
+        return len(content)
+
+class ShardedStorage(JsonStorage):
+    """Um arquivo JSON por servidor e por seção; só servidores alterados são regravados"""
+
+    lazy = True
+
+    def __init__(self, root: str = SECURITY_DATA_DIR, legacy_path: str = SECURITY_DATA_FILE):
+        self.ext = '.json' if DATA_CODEC == 'json' else '.bin'
+        super().__init__(os.path.join(root, '_global' + self.ext), legacy_path)
+        self.root = root
+
+    def _shard_path(self, guild_id: str, section: str) -> str:
+        return os.path.join(self.root, guild_id, section + self.ext)
+
+    @staticmethod
+    def _read_file(path: str):
+        """Lê um arquivo em qualquer codec (aceita a extensão do codec anterior)"""
+        base = os.path.splitext(path)[0]
+        for candidate in (path, base + '.json', base + '.bin'):
+            if os.path.exists(candidate):
+                with open(candidate, 'rb') as f:
+                    return decode_data(f.read())
+        return None
+
+    async def load(self) -> Dict:
+        if not os.path.isdir(self.root) and os.path.exists(self.legacy_path):
+            return await self._migrate_legacy()
+        # Apenas as seções globais; os servidores são carregados em load_guild
+        return await run_serializer(self._read_file, self.path) or {}
+
+    async def _migrate_legacy(self) -> Dict:
+        """Divide o security_data.json antigo em arquivos por servidor"""
+        async with aiofiles.open(self.legacy_path, 'rb') as f:
+            raw = await f.read()
+        data = await run_serializer(decode_data, raw)
+
+        guild_ids = set(str(e.get('guild_id')) for e in data.get('restored_roles', {}).values())
+        for section in GUILD_SECTIONS:
+            guild_ids.update(data.get(section, {}).keys())
+
+        for guild_id in guild_ids:
+            for section in PERSISTED_SECTIONS:
+                await self._write_file(self._shard_path(guild_id, section), self._shard_value(data, guild_id, section))
+        await self._write_file(self.path, self._global_value(data))
+
+        print(f"✅ {self.legacy_path} migrado para {self.root}/ ({len(guild_ids)} servidores)")
+        # Os dados migrados já vão inteiros para a memória: mesclar os shards de novo duplicaria as listas
+        self.migrated_guilds = frozenset(guild_ids)
+        return data
+
+    def load_guild(self, guild_id: str) -> Dict:
+        """Lê as seções de um servidor (backup_data pode ser grande)
+
+        Síncrono: preload_guilds chama numa thread (inicialização e on_guild_join);
+        no loop só para um servidor que ainda não foi pré-carregado.
+        """
+        data = {}
+        for section in GUILD_SECTIONS + ('restored_roles',):
+            value = self._read_file(self._shard_path(guild_id, section))
+            if value is not None:
+                data[section] = value
+        return data
+
+    async def read_backup(self, guild_id: str, backup_id: str, hashes) -> Tuple[Optional[Dict], Dict]:
+        # Só o arquivo de backups desse servidor
+        bucket = await run_serializer(self._read_file, self._shard_path(guild_id, 'backup_data'))
+        return pick_backup(bucket or {}, backup_id, hashes)
+
+    def guild_ids(self) -> List[str]:
+        """Servidores que têm dados em disco"""
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))]
+
+    def disk_usage(self) -> int:
+        total = 0
+        for folder, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(folder, name)) for name in files)
+        return total
+
+    async def save(self, data: Dict, changes: List[Dict]) -> int:
+        shards = set()
+        global_dirty = False
+        for change in changes:
+            guild_id = change_guild_id(change)
+            if guild_id is None:
+                global_dirty = True
+            else:
+                shards.add((guild_id, change['path'][0]))
+
+        # Copia só as seções sujas no loop; a serialização vai para o pool
+        started = time.perf_counter()
+        files = []
+        for guild_id, section in shards:
+            value = self._shard_value(data, guild_id, section)
+            files.append((self._shard_path(guild_id, section), copy_containers(value, SNAPSHOT_DEPTHS[section] - 1)))
+        if global_dirty:
+            files.append((self.path, snapshot_state(self._global_value(data))))
+        self.blocked_ms = (time.perf_counter() - started) * 1000
+
+        written = 0
+        for path, value in files:
+            written += await self._write_file(path, value)
+        return written
+
+    def _shard_value(self, data: Dict, guild_id: str, section: str):
+        if section == 'restored_roles':
+            return {
+                user_id: entry for user_id, entry in data.get('restored_roles', {}).items()
+                if str(entry.get('guild_id')) == guild_id
+            }
+        if section in GUILD_SECTIONS:
+            return data.get(section, {}).get(guild_id)
+        return None
+
+    def _global_value(self, data: Dict) -> Dict:
+        return {
+            section: data.get(section, {}) for section in PERSISTED_SECTIONS
+            if section not in GUILD_SECTIONS and section != 'restored_roles'
+        }
+
+    async def _write_file(self, path: str, value) -> int:
+        if not value:
+            if os.path.exists(path):
+                os.remove(path)
+            return 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = await run_serializer(encode_data, value)
+        tmp_path = path + '.tmp'
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(content)
+        os.replace(tmp_path, path)
+        return len(content)
+
+class _EncodedBlob:
+    """Valor que só é serializado na thread do SQLite (backups completos)"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+class SQLiteStorage(JsonStorage):
+    """Banco SQLite (WAL) com tabelas indexadas; cada mutação vira uma ou duas linhas SQL"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS guild_configs (
+            guild_id TEXT PRIMARY KEY,
+            config TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS security_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            title TEXT,
+            description TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_security_logs_guild ON security_logs (guild_id, id);
+        CREATE TABLE IF NOT EXISTS user_warnings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            moderator INTEGER,
+            reason TEXT,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_warnings_user ON user_warnings (guild_id, user_id, id);
+        CREATE TABLE IF NOT EXISTS restored_roles (
+            user_id TEXT PRIMARY KEY,
+            guild_id TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_restored_roles_guild ON restored_roles (guild_id);
+        CREATE TABLE IF NOT EXISTS ban_tracker (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            executor_id TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            target_id INTEGER,
+            target_name TEXT,
+            is_bot INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_ban_tracker_executor ON ban_tracker (guild_id, executor_id, timestamp);
+        CREATE TABLE IF NOT EXISTS backups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            backup_id TEXT NOT NULL,
+            created_at TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_backups_guild ON backups (guild_id, backup_id);
+        CREATE TABLE IF NOT EXISTS deleted_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_deleted_items_guild ON deleted_items (guild_id, kind, id);
+        CREATE TABLE IF NOT EXISTS backup_objects (
+            guild_id TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (guild_id, hash)
+        );
+        CREATE TABLE IF NOT EXISTS restore_jobs (
+            guild_id TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (guild_id, job_id)
+        );
+        CREATE TABLE IF NOT EXISTS restore_job_results (
+            guild_id TEXT NOT NULL,
+            job_id TEXT NOT NULL,
+            step_key TEXT NOT NULL,
+            result TEXT NOT NULL,
+            PRIMARY KEY (guild_id, job_id, step_key)
+        );
+        CREATE TABLE IF NOT EXISTS kv (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = SECURITY_DB_FILE, legacy_path: str = SECURITY_DATA_FILE):
+        super().__init__(path)
+        self.legacy_path = legacy_path
+        self._conn = None
+        # Uma única thread dona da conexão: as chamadas nunca rodam no event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sec-sqlite')
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self.SCHEMA)
+        return self._conn
+
+    async def load(self) -> Dict:
+        migrate = not os.path.exists(self.path) and os.path.exists(self.legacy_path)
+        if migrate:
+            async with aiofiles.open(self.legacy_path, 'rb') as f:
+                legacy = decode_data(await f.read())
+            await self._run(self._import_state, legacy)
+            print(f"✅ {self.legacy_path} importado para {self.path}")
+        return await self._run(self._load_state)
+
+    def _import_state(self, data: Dict):
+        """Importa o estado no formato do security_data.json (migração)"""
+        statements = []
+        for guild_id, config in data.get('guild_configs', {}).items():
+            statements += self._change_statements(data, {'op': 'set', 'path': ['guild_configs', guild_id]})
+        for guild_id, logs in data.get('security_logs', {}).items():
+            for entry in logs:
+                statements += self._change_statements(data, {'op': 'push', 'path': ['security_logs', guild_id], 'value': entry})
+        for guild_id, users in data.get('user_warnings', {}).items():
+            for user_id, warnings in users.items():
+                for warning in warnings:
+                    statements += self._change_statements(data, {'op': 'push', 'path': ['user_warnings', guild_id, user_id], 'value': warning})
+        for user_id, entry in data.get('restored_roles', {}).items():
+            statements += self._change_statements(data, {'op': 'set', 'path': ['restored_roles', user_id], 'value': entry})
+        for guild_id, executors in data.get('ban_tracker', {}).items():
+            for executor_id, bans in executors.items():
+                statements += self._change_statements(data, {'op': 'set', 'path': ['ban_tracker', guild_id, executor_id], 'value': bans})
+        for guild_id, backups in data.get('backup_data', {}).items():
+            for digest, record in backups.get('objects', {}).items():
+                statements += self._change_statements(data, {'op': 'set', 'path': ['backup_data', guild_id, 'objects', digest], 'value': record})
+            for kind in ('channels', 'roles', 'full_backups'):
+                for item in backups.get(kind, []):
+                    statements += self._change_statements(data, {'op': 'push', 'path': ['backup_data', guild_id, kind], 'value': item})
+        for guild_id, jobs in data.get('restore_jobs', {}).items():
+            for job_id in jobs:
+                statements += self._change_statements(data, {'op': 'set', 'path': ['restore_jobs', guild_id, job_id]})
+        statements += self._change_statements(data, {'op': 'set', 'path': ['bot_activity_logs'], 'value': data.get('bot_activity_logs', {})})
+        self._execute(statements)
+
+    def _load_state(self) -> Dict:
+        conn = self._connect()
+        data = {section: {} for section in PERSISTED_SECTIONS}
+
+        for guild_id, config in conn.execute('SELECT guild_id, config FROM guild_configs'):
+            data['guild_configs'][guild_id] = json.loads(config)
+        for guild_id, timestamp, title, description in conn.execute(
+                'SELECT guild_id, timestamp, title, description FROM security_logs ORDER BY id'):
+            data['security_logs'].setdefault(guild_id, []).append(
+                {'timestamp': timestamp, 'title': title, 'description': description})
+        for guild_id, user_id, moderator, reason, timestamp in conn.execute(
+                'SELECT guild_id, user_id, moderator, reason, timestamp FROM user_warnings ORDER BY id'):
+            data['user_warnings'].setdefault(guild_id, {}).setdefault(user_id, []).append(
+                {'reason': reason, 'moderator': moderator, 'timestamp': timestamp})
+        for user_id, entry in conn.execute('SELECT user_id, data FROM restored_roles'):
+            data['restored_roles'][user_id] = json.loads(entry)
+        for guild_id, executor_id, timestamp, target_id, target_name, is_bot in conn.execute(
+                'SELECT guild_id, executor_id, timestamp, target_id, target_name, is_bot FROM ban_tracker ORDER BY id'):
+            data['ban_tracker'].setdefault(guild_id, {}).setdefault(executor_id, []).append(
+                {'timestamp': timestamp, 'target_id': target_id, 'target_name': target_name, 'is_bot': bool(is_bot)})
+        for guild_id, kind, item in conn.execute('SELECT guild_id, kind, data FROM deleted_items ORDER BY id'):
+            bucket = data['backup_data'].setdefault(guild_id, {'channels': [], 'roles': []})
+            bucket.setdefault(kind, []).append(json.loads(item))
+        for guild_id, digest, record in conn.execute('SELECT guild_id, hash, data FROM backup_objects'):
+            bucket = data['backup_data'].setdefault(guild_id, {'channels': [], 'roles': []})
+            bucket.setdefault('objects', {})[digest] = json.loads(record)
+        for guild_id, backup in conn.execute('SELECT guild_id, data FROM backups ORDER BY id'):
+            bucket = data['backup_data'].setdefault(guild_id, {'channels': [], 'roles': []})
+            bucket.setdefault('full_backups', []).append(
+                decode_data(backup if isinstance(backup, bytes) else backup.encode('utf-8')))
+        for guild_id, job_id, job in conn.execute('SELECT guild_id, job_id, data FROM restore_jobs'):
+            data['restore_jobs'].setdefault(guild_id, {})[job_id] = {**json.loads(job), 'results': {}}
+        for guild_id, job_id, step_key, result in conn.execute(
+                'SELECT guild_id, job_id, step_key, result FROM restore_job_results'):
+            job = data['restore_jobs'].get(guild_id, {}).get(job_id)
+            if job is not None:
+                job['results'][step_key] = json.loads(result)
+        for key, value in conn.execute('SELECT key, value FROM kv'):
+            data[key] = json.loads(value)
+
+        return data
+
+    async def save(self, data: Dict, changes: List[Dict]) -> int:
+        # Os valores são serializados aqui, no loop, para não ler o estado de outra thread
+        started = time.perf_counter()
+        statements = []
+        for change in changes:
+            statements += self._change_statements(data, change)
+        self.blocked_ms = (time.perf_counter() - started) * 1000
+        if not statements:
+            return 0
+        return await self._run(self._execute, statements)
+
+    def _execute(self, statements: List) -> int:
+        conn = self._connect()
+        written = 0
+        with conn:
+            for sql, params in statements:
+                params = tuple(encode_data(p.value) if isinstance(p, _EncodedBlob) else p for p in params)
+                written += sum(len(p) if isinstance(p, (bytes, str)) else 8 for p in params)
+                conn.execute(sql, params)
+        return written
+
+    def _change_statements(self, data: Dict, change: Dict) -> List:
+        """Traduz uma mutação registrada para comandos SQL de uma ou poucas linhas"""
+        op, path = change['op'], change['path']
+        section = path[0]
+        value = change.get('value')
+        limit = change.get('limit')
+
+        if section == 'guild_configs':
+            guild_id = path[1]
+            config = data.get('guild_configs', {}).get(guild_id)
+            if config is None:
+                return [('DELETE FROM guild_configs WHERE guild_id = ?', (guild_id,))]
+            return [('INSERT OR REPLACE INTO guild_configs (guild_id, config) VALUES (?, ?)',
+                     (guild_id, json.dumps(config, ensure_ascii=False)))]
+
+        if section == 'security_logs' and op == 'push':
+            guild_id = path[1]
+            statements = [('INSERT INTO security_logs (guild_id, timestamp, title, description) VALUES (?, ?, ?, ?)',
+                           (guild_id, value['timestamp'], value['title'], value['description']))]
+            if limit:
+                statements.append(('DELETE FROM security_logs WHERE guild_id = ? AND id <= '
+                                   '(SELECT id FROM security_logs WHERE guild_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                                   (guild_id, guild_id, limit)))
+            return statements
+
+        if section == 'user_warnings' and len(path) == 3:
+            guild_id, user_id = path[1], path[2]
+            if op == 'push':
+                return [('INSERT INTO user_warnings (guild_id, user_id, moderator, reason, timestamp) VALUES (?, ?, ?, ?, ?)',
+                         (guild_id, user_id, value['moderator'], value['reason'], value['timestamp']))]
+            if op == 'del':
+                return [('DELETE FROM user_warnings WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))]
+
+        if section == 'restored_roles' and len(path) == 2:
+            user_id = path[1]
+            if op == 'del':
+                return [('DELETE FROM restored_roles WHERE user_id = ?', (user_id,))]
+            return [('INSERT OR REPLACE INTO restored_roles (user_id, guild_id, data) VALUES (?, ?, ?)',
+                     (user_id, str(value['guild_id']), json.dumps(value, ensure_ascii=False)))]
+
+        if section == 'ban_tracker' and len(path) == 3:
+            guild_id, executor_id = path[1], path[2]
+            statements = [('DELETE FROM ban_tracker WHERE guild_id = ? AND executor_id = ?', (guild_id, executor_id))]
+            if op == 'set':
+                for ban in value:
+                    statements.append(('INSERT INTO ban_tracker (guild_id, executor_id, timestamp, target_id, target_name, is_bot) '
+                                       'VALUES (?, ?, ?, ?, ?, ?)',
+                                       (guild_id, executor_id, ban['timestamp'], ban.get('target_id'),
+                                        ban.get('target_name'), int(ban.get('is_bot', False)))))
+            return statements
+
+        if section == 'backup_data':
+            guild_id = path[1]
+            if len(path) == 2:
+                if op == 'del':
+                    # Remoção explícita do contêiner de backups do servidor
+                    return [('DELETE FROM deleted_items WHERE guild_id = ?', (guild_id,)),
+                            ('DELETE FROM backups WHERE guild_id = ?', (guild_id,)),
+                            ('DELETE FROM backup_objects WHERE guild_id = ?', (guild_id,))]
+                if op == 'set' and not any(value.values()):
+                    # Criação do contêiner vazio: as linhas chegam pelas mudanças de cada item
+                    return []
+            kind = path[2]
+            if kind == 'objects' and len(path) == 4:
+                if op == 'del':
+                    return [('DELETE FROM backup_objects WHERE guild_id = ? AND hash = ?', (guild_id, path[3]))]
+                return [('INSERT OR REPLACE INTO backup_objects (guild_id, hash, data) VALUES (?, ?, ?)',
+                         (guild_id, path[3], json.dumps(value, ensure_ascii=False)))]
+            if kind == 'full_backups' and op == 'push':
+                # Backups antigos (v1) não têm backup_id; a data de criação serve de chave
+                backup_key = value.get('backup_id') or f"v1-{value.get('created_at')}"
+                statements = [('INSERT OR REPLACE INTO backups (guild_id, backup_id, created_at, data) VALUES (?, ?, ?, ?)',
+                               (guild_id, backup_key, value.get('created_at'), _EncodedBlob(value)))]
+                if limit:
+                    statements.append(('DELETE FROM backups WHERE guild_id = ? AND id <= '
+                                       '(SELECT id FROM backups WHERE guild_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                                       (guild_id, guild_id, limit)))
+                return statements
+            if op == 'push':
+                return [('INSERT INTO deleted_items (guild_id, kind, data) VALUES (?, ?, ?)',
+                         (guild_id, kind, json.dumps(value, ensure_ascii=False)))]
+            raise ValueError(f"Mudança não suportada em backup_data: {op} {path}")
+
+        if section == 'restore_jobs' and len(path) >= 3:
+            guild_id, job_id = path[1], path[2]
+            if len(path) == 5 and path[3] == 'results':
+                # Checkpoint de um passo: uma linha pequena
+                return [('INSERT OR REPLACE INTO restore_job_results (guild_id, job_id, step_key, result) VALUES (?, ?, ?, ?)',
+                         (guild_id, job_id, path[4], json.dumps(value, ensure_ascii=False)))]
+            job = data.get('restore_jobs', {}).get(guild_id, {}).get(job_id)
+            if job is None:
+                return [('DELETE FROM restore_jobs WHERE guild_id = ? AND job_id = ?', (guild_id, job_id)),
+                        ('DELETE FROM restore_job_results WHERE guild_id = ? AND job_id = ?', (guild_id, job_id))]
+            # Plano e metadados; os resultados ficam na tabela própria
+            statements = [('INSERT OR REPLACE INTO restore_jobs (guild_id, job_id, data) VALUES (?, ?, ?)',
+                           (guild_id, job_id, json.dumps({k: v for k, v in job.items() if k != 'results'}, ensure_ascii=False)))]
+            if len(path) == 3:
+                statements.append(('DELETE FROM restore_job_results WHERE guild_id = ? AND job_id = ?', (guild_id, job_id)))
+                for step_key, result in job.get('results', {}).items():
+                    statements.append(('INSERT INTO restore_job_results (guild_id, job_id, step_key, result) VALUES (?, ?, ?, ?)',
+                                       (guild_id, job_id, step_key, json.dumps(result, ensure_ascii=False))))
+            return statements
+
+        if section in ('backup_data', 'restore_jobs'):
+            # Essas seções têm tabelas próprias: cair no kv sobrescreveria as tabelas no load
+            raise ValueError(f"Mudança não suportada em {section}: {op} {path}")
+
+        # Demais seções: guardadas inteiras na tabela chave/valor
+        return [('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                 (section, json.dumps(data.get(section, {}), ensure_ascii=False)))]
+
+    async def read_backup(self, guild_id: str, backup_id: str, hashes) -> Tuple[Optional[Dict], Dict]:
+        def query():
+            conn = self._connect()
+            row = conn.execute('SELECT data FROM backups WHERE guild_id = ? AND backup_id = ?',
+                               (guild_id, backup_id)).fetchone()
+            manifest = decode_data(row[0] if isinstance(row[0], bytes) else row[0].encode('utf-8')) if row else None
+            objects = {}
+            for digest in hashes:
+                found = conn.execute('SELECT data FROM backup_objects WHERE guild_id = ? AND hash = ?',
+                                     (guild_id, digest)).fetchone()
+                if found:
+                    objects[digest] = json.loads(found[0])
+            return manifest, objects
+        return await self._run(query)
+
+    def disk_usage(self) -> int:
+        return sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal', '-shm')
+                   if os.path.exists(self.path + suffix))
+
+    async def fetch_logs(self, guild_id: str, limit: int) -> List[Dict]:
+        def query():
+            rows = self._connect().execute(
+                'SELECT timestamp, title, description FROM security_logs WHERE guild_id = ? ORDER BY id DESC LIMIT ?',
+                (guild_id, limit)).fetchall()
+            return [{'timestamp': t, 'title': title, 'description': d} for t, title, d in reversed(rows)]
+        return await self._run(query)
+
+    async def fetch_warnings(self, guild_id: str, user_id: str, limit: int):
+        def query():
+            conn = self._connect()
+            total = conn.execute('SELECT COUNT(*) FROM user_warnings WHERE guild_id = ? AND user_id = ?',
+                                 (guild_id, user_id)).fetchone()[0]
+            rows = conn.execute(
+                'SELECT reason, moderator, timestamp FROM user_warnings WHERE guild_id = ? AND user_id = ? '
+                'ORDER BY id DESC LIMIT ?', (guild_id, user_id, limit)).fetchall()
+            return [{'reason': r, 'moderator': m, 'timestamp': t} for r, m, t in reversed(rows)], total
+        return await self._run(query)
+
+class BanWindow:
+    """Janela deslizante dos banimentos de um executor (timestamps monotônicos)"""
+
+    __slots__ = ('times', 'targets', 'is_bot')
+
+    def __init__(self, is_bot: bool = False):
+        self.times = deque()  # time.monotonic() de cada banimento, em ordem
+        self.targets = deque()  # (target_id, target_name) na mesma ordem
+        self.is_bot = is_bot
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, target_id: int, target_name: str, now: Optional[float] = None):
+        self.times.append(time.monotonic() if now is None else now)
+        self.targets.append((target_id, target_name))
+
+    def prune(self, window_seconds: float, now: Optional[float] = None):
+        """Descarta os banimentos fora da janela; O(1) amortizado por banimento"""
+        cutoff = (time.monotonic() if now is None else now) - window_seconds
+        while self.times and self.times[0] <= cutoff:
+            self.times.popleft()
+            self.targets.popleft()
+
+    @staticmethod
+    def _wall_offset() -> float:
+        return time.time() - time.monotonic()
+
+    def last_timestamp(self) -> Optional[str]:
+        if not self.times:
+            return None
+        wall = self.times[-1] + self._wall_offset()
+        return datetime.fromtimestamp(wall, timezone.utc).replace(tzinfo=None).isoformat()
+
+    def to_records(self) -> List[Dict]:
+        """Formato persistido (o mesmo de antes: timestamp ISO em UTC)"""
+        offset = self._wall_offset()
+        return [
+            {
+                'timestamp': datetime.fromtimestamp(moment + offset, timezone.utc).replace(tzinfo=None).isoformat(),
+                'target_id': target_id,
+                'target_name': target_name,
+                'is_bot': self.is_bot
+            }
+            for moment, (target_id, target_name) in zip(self.times, self.targets)
+        ]
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> 'BanWindow':
+        window = cls(bool(records and records[0].get('is_bot', False)))
+        offset = cls._wall_offset()
+        for ban in records:
+            wall = datetime.fromisoformat(ban['timestamp']).replace(tzinfo=timezone.utc).timestamp()
+            window.add(ban.get('target_id'), ban.get('target_name'), wall - offset)
+        return window
+
+SPAM_TRACKER_MAX_USERS = 50000  # Limite de usuários rastreados (os menos recentes saem primeiro)
+SPAM_TRACKER_IDLE_TTL = 300  # Segundos sem mensagens para o varredor descartar o usuário
+SPAM_SWEEP_INTERVAL = 60
+
+class RateTracker:
+    """Mensagens por usuário em janela deslizante (timestamps monotônicos, memória limitada)"""
+
+    def __init__(self, max_users: int = SPAM_TRACKER_MAX_USERS):
+        self.max_users = max_users
+        self.users = OrderedDict()  # (guild_id, user_id) -> deque; ordem = uso mais recente por último
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def hit(self, key: Tuple, window: float, now: Optional[float] = None) -> int:
+        """Registra uma mensagem e devolve quantas o usuário tem dentro da janela"""
+        now = time.monotonic() if now is None else now
+        times = self.users.get(key)
+        if times is None:
+            times = self.users[key] = deque()
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.users.move_to_end(key)
+
+        times.append(now)
+        while now - times[0] >= window:
+            times.popleft()
+        return len(times)
+
+    def reset(self, key: Tuple):
+        self.users.pop(key, None)
+
+    def sweep(self, idle_ttl: float = SPAM_TRACKER_IDLE_TTL, now: Optional[float] = None) -> int:
+        """Descarta quem não manda mensagem há idle_ttl segundos (os ociosos ficam no início)"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self.users:
+            key, times = next(iter(self.users.items()))
+            if times and now - times[-1] < idle_ttl:
+                break
+            del self.users[key]
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def memory_bytes(self) -> int:
+        """Estimativa do espaço ocupado (dicionário + deques + timestamps)"""
+        total = sys.getsizeof(self.users)
+        for key, times in self.users.items():
+            total += sys.getsizeof(key) + sys.getsizeof(times) + len(times) * 24
+        return total
+
+class MessageRules:
+    """Pipeline de regras de mensagem de um servidor, compilado a partir da configuração"""
+    __slots__ = ('config', 'spam', 'spam_window', 'spam_limit', 'max_mentions', 'everyone', 'whitelist', 'matcher')
+
+    def __init__(self, config: GuildConfig):
+        self.config = config  # Versão da configuração que originou o pipeline
+        self.spam = config.anti_spam_enabled
+        self.spam_window = config.spam_time_window
+        self.spam_limit = config.spam_message_count
+        self.max_mentions = config.max_mentions if config.auto_kick_mass_ping else None
+        self.everyone = config.auto_ban_everyone_mention
+        self.whitelist = config.whitelist_users
+
+        # Um único regex com grupos nomeados: o conteúdo é percorrido uma vez só
+        patterns = []
+        if config.auto_delete_invite_links:
+            patterns.append(r'(?P<invite>discord\.gg/\w+)')
+        if self.everyone:
+            patterns.append(r'(?P<everyone>@(?:everyone|here))')
+        terms = sorted({term.strip() for term in config.blocked_terms if term.strip()}, key=len, reverse=True)
+        if terms:
+            patterns.append(r'(?P<term>(?i:' + '|'.join(re.escape(term) for term in terms) + '))')
+        self.matcher = re.compile('|'.join(patterns)) if patterns else None
+
+    def evaluate(self, message, tracker: RateTracker) -> List[Tuple[str, object]]:
+        """Devolve os veredictos (regra, detalhe) da mensagem, sem efeitos colaterais na API"""
+        verdicts = []
+        author = message.author
+
+        if self.spam and tracker.hit((message.guild.id, author.id), self.spam_window) >= self.spam_limit:
+            verdicts.append(('spam', None))
+
+        if self.max_mentions is not None:
+            mention_count = len(message.mentions)
+            if mention_count >= self.max_mentions:
+                verdicts.append(('mass_ping', mention_count))
+
+        if self.matcher is not None and message.content:
+            found = {}
+            wanted = self.matcher.groupindex.keys()
+            for match in self.matcher.finditer(message.content):
+                found.setdefault(match.lastgroup, match.group())
+                if len(found) == len(wanted):
+                    break
+            if 'invite' in found:
+                verdicts.append(('invite', None))
+            if 'term' in found:
+                verdicts.append(('blocked_term', found['term']))
+            if 'everyone' in found:
+                # None = uso não autorizado (punição); senão, quem autorizou
+                if author.id == OWNER_ID:
+                    verdicts.append(('everyone', 'owner'))
+                elif author.id in self.whitelist:
+                    verdicts.append(('everyone', 'whitelist'))
+                else:
+                    verdicts.append(('everyone', None))
+
+        return verdicts
+
+class MessageRuleEngine:
+    """Avalia mensagens com o pipeline compilado de cada servidor e aplica os veredictos em lote"""
+
+    def __init__(self):
+        self.rules = {}  # guild_id -> MessageRules
+        self.stats = {'messages': 0, 'cpu_ns': 0, 'max_ns': 0, 'compiled': 0, 'verdicts': 0}
+
+    def rules_for(self, guild_id: int, config: GuildConfig) -> MessageRules:
+        rules = self.rules.get(guild_id)
+        # Cada edição gera um novo GuildConfig: recompila só quando a versão muda
+        if rules is None or rules.config is not config:
+            rules = self.rules[guild_id] = MessageRules(config)
+            self.stats['compiled'] += 1
+        return rules
+
+    def evaluate(self, message, config: GuildConfig, tracker: RateTracker) -> List[Tuple[str, object]]:
+        """Avalia a mensagem medindo o tempo gasto (contador embutido)"""
+        start = time.perf_counter_ns()
+        verdicts = self.rules_for(message.guild.id, config).evaluate(message, tracker)
+        elapsed = time.perf_counter_ns() - start
+
+        stats = self.stats
+        stats['messages'] += 1
+        stats['cpu_ns'] += elapsed
+        if elapsed > stats['max_ns']:
+            stats['max_ns'] = elapsed
+        stats['verdicts'] += len(verdicts)
+        return verdicts
+
+    def average_us(self) -> float:
+        messages = self.stats['messages']
+        return self.stats['cpu_ns'] / messages / 1000 if messages else 0.0
+
+    async def apply(self, message, config: GuildConfig, verdicts: List[Tuple[str, object]]):
+        """Aplica os veredictos de uma vez: no máximo uma deleção e uma punição por mensagem"""
+        guild = message.guild
+        author = message.author
+        found = dict(verdicts)
+        punish_everyone = 'everyone' in found and found['everyone'] is None
+
+        # Uma só deleção, mesmo que várias regras peçam
+        deleted = False
+        if punish_everyone or any(rule in found for rule in ('mass_ping', 'invite', 'blocked_term')):
+            try:
+                await action_scheduler.run(PRIORITY_PUNISH, guild.id, message.delete)
+                deleted = True
+            except Exception as e:
+                print(f"❌ Erro ao deletar mensagem: {e}")
+
+        # Uma só punição: ban (@everyone) prevalece; senão o maior mute pedido
+        outcome = None
+        mute_seconds = 0
+        if punish_everyone:
+            try:
+                await bulk_ban_queue.ban(guild, author, reason="🔒 Uso não autorizado de @everyone/@here")
+                outcome = 'banned'
+            except (discord.Forbidden, BulkBanRefused):
+                # Se não conseguir banir, tenta outras punições
+                try:
+                    await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: author.timeout(
+                        timedelta(hours=24),
+                        reason="🔒 Uso não autorizado de @everyone/@here (sem permissão para banir)"
+                    ))
+                    outcome = 'muted_24h'
+                except:
+                    outcome = 'failed'
+            except Exception as e:
+                outcome = e
+        else:
+            reasons = []
+            if 'spam' in found:
+                mute_seconds = config.auto_mute_duration
+                reasons.append("🔒 Anti-spam: Muitas mensagens em pouco tempo")
+            if 'mass_ping' in found:
+                mute_seconds = max(mute_seconds, config.mass_ping_mute_duration)
+                reasons.append(f"🔒 Mass ping: {found['mass_ping']} menções")
+            if reasons:
+                try:
+                    await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: author.timeout(
+                        timedelta(seconds=mute_seconds),
+                        reason=' | '.join(reasons)
+                    ))
+                    outcome = 'muted'
+                except Exception as e:
+                    print(f"❌ Erro ao silenciar usuário: {e}")
+
+        if 'spam' in found and outcome in ('muted', 'banned', 'muted_24h'):
+            security_system.spam_tracker.reset((guild.id, author.id))
+
+        # Logs de cada veredicto (o LogDispatcher agrupa o envio)
+        if outcome == 'muted' and 'spam' in found:
+            await security_system.log_security_action(
+                guild,
+                "🚫 Usuário Mutado por Spam",
+                f"{author.mention} foi mutado por {mute_seconds}s",
+                COLORS['warning']
+            )
+        if outcome == 'muted' and 'mass_ping' in found:
+            await security_system.log_security_action(
+                guild,
+                "🚫 Usuário Silenciado por Mass Ping",
+                f"{author.mention} silenciado por {mute_seconds}s ({found['mass_ping']} menções)",
+                COLORS['warning']
+            )
+        if deleted and 'invite' in found:
+            await security_system.log_security_action(
+                guild,
+                "🔗 Link de Convite Deletado",
+                f"Mensagem de {author.mention} continha convite",
+                COLORS['info']
+            )
+        if deleted and 'blocked_term' in found:
+            await security_system.log_security_action(
+                guild,
+                "🚫 Termo Bloqueado",
+                f"Mensagem de {author.mention} continha termo bloqueado",
+                COLORS['info'],
+                [{'name': '🔤 Termo', 'value': f"||{found['blocked_term'][:100]}||", 'inline': True}]
+            )
+
+        if found.get('everyone') == 'owner':
+            await security_system.log_security_action(
+                guild,
+                "👑 @everyone/@here por OWNER",
+                f"🟢 {author.mention} (OWNER) usou @everyone/@here - ✅ **AUTORIZADO**",
+                COLORS['success']
+            )
+        elif found.get('everyone') == 'whitelist':
+            await security_system.log_security_action(
+                guild,
+                "🟡 @everyone/@here por Usuário Autorizado",
+                f"🟡 {author.mention} usou @everyone/@here (whitelist)",
+                COLORS['warning']
+            )
+        elif outcome == 'banned':
+            await security_system.log_security_action(
+                guild,
+                "🚨 USUÁRIO BANIDO - @everyone/@here",
+                f"⚠️ {author.mention} foi banido por usar @everyone/@here",
+                COLORS['danger'],
+                [
+                    {'name': '📝 Mensagem', 'value': f"```{message.content[:100]}```", 'inline': False},
+                    {'name': '👤 Usuário', 'value': author.mention, 'inline': True},
+                    {'name': '⚡ Ação', 'value': "Banimento automático", 'inline': True},
+                    {'name': '📺 Canal', 'value': message.channel.mention, 'inline': True}
+                ]
+            )
+        elif outcome == 'muted_24h':
+            await security_system.log_security_action(
+                guild,
+                "🔇 USUÁRIO MUTADO - @everyone/@here",
+                f"⚠️ {author.mention} foi mutado por 24h (sem permissão para banir)",
+                COLORS['warning']
+            )
+        elif outcome == 'failed':
+            await security_system.log_security_action(
+                guild,
+                "❌ ERRO - @everyone/@here",
+                f"Não foi possível punir {author.mention} por usar @everyone/@here",
+                COLORS['danger']
+            )
+        elif isinstance(outcome, Exception):
+            await security_system.log_security_action(
+                guild,
+                "❌ ERRO AO BANIR - @everyone/@here",
+                f"Erro ao banir {author.mention}: {str(outcome)}",
+                COLORS['danger']
+            )
+
+DISCORD_EPOCH_MS = 1420070400000  # Início dos snowflakes do Discord (2015-01-01)
+RAID_FLUSH_INTERVAL = 2.0  # Segundos acumulando contas antes de cada remoção em lote
+
+def snowflake_time_ms(snowflake: int) -> int:
+    """Momento de criação (ms desde 1970) codificado no próprio ID"""
+    return (snowflake >> 22) + DISCORD_EPOCH_MS
+
+BULK_BAN_WINDOW = 0.5  # Segundos acumulando alvos antes de enviar o lote
+BULK_BAN_CHUNK = 200  # Máximo de usuários por chamada de Guild.bulk_ban
+
+class BulkBanRefused(Exception):
+    """O Discord listou o usuário entre as falhas do lote (hierarquia, já banido...)"""
+
+class BulkBanQueue:
+    """Acumula banimentos por servidor e envia em lotes via Guild.bulk_ban"""
+
+    def __init__(self, window: float = BULK_BAN_WINDOW):
+        self.window = window
+        self.pending = {}  # guild_id -> {user_id: (reason, [Future])}
+        self.guilds = {}  # guild_id -> guild
+        self.timers = {}  # guild_id -> Task do envio agendado
+        self.stats = {'requested': 0, 'chunks': 0, 'banned': 0, 'failed': 0, 'fallback': 0}
+        self.history = deque(maxlen=20)  # Resultado dos últimos lotes
+
+    def ban(self, guild, user, reason: Optional[str] = None) -> asyncio.Future:
+        """Enfileira um banimento; o Future resolve em True ou levanta o erro do banimento"""
+        future = asyncio.get_running_loop().create_future()
+        self.stats['requested'] += 1
+        self.guilds[guild.id] = guild
+        targets = self.pending.setdefault(guild.id, {})
+        if user.id in targets:
+            targets[user.id][1].append(future)  # Mesmo alvo pedido duas vezes: um só banimento
+        else:
+            targets[user.id] = (reason, [future])
+
+        if len(targets) >= BULK_BAN_CHUNK:
+            timer = self.timers.pop(guild.id, None)
+            if timer:
+                timer.cancel()
+            asyncio.create_task(self.flush(guild.id))
+        elif guild.id not in self.timers:
+            self.timers[guild.id] = asyncio.create_task(self._flush_later(guild.id))
+        return future
+
+    async def _flush_later(self, guild_id: int):
+        await asyncio.sleep(self.window)
+        self.timers.pop(guild_id, None)
+        await self.flush(guild_id)
+
+    async def flush(self, guild_id: int):
+        """Envia tudo o que está pendente no servidor, agrupado por motivo"""
+        targets = self.pending.pop(guild_id, None)
+        if not targets:
+            return
+        guild = self.guilds[guild_id]
+
+        by_reason = {}
+        for user_id, (reason, _) in targets.items():
+            by_reason.setdefault(reason, []).append(user_id)
+        for reason, user_ids in by_reason.items():
+            for start in range(0, len(user_ids), BULK_BAN_CHUNK):
+                await self._send(guild, reason, user_ids[start:start + BULK_BAN_CHUNK], targets)
+
+    async def _call(self, guild, reason: Optional[str], user_ids: List[int]) -> Tuple[List[int], List[int]]:
+        if len(user_ids) == 1:
+            await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: guild.ban(discord.Object(id=user_ids[0]), reason=reason))
+            return user_ids, []
+        result = await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: guild.bulk_ban(
+            [discord.Object(id=user_id) for user_id in user_ids], reason=reason
+        ))
+        return [user.id for user in result.banned], [user.id for user in result.failed]
+
+    async def _send(self, guild, reason: Optional[str], user_ids: List[int], targets: Dict):
+        started = time.perf_counter()
+        errors = {}
+        try:
+            banned, failed = await self._call(guild, reason, user_ids)
+        except discord.Forbidden as e:
+            if len(user_ids) == 1:
+                banned, failed, errors = [], [], {user_ids[0]: e}
+            else:
+                # bulk_ban também exige Gerenciar Servidor: tenta um a um
+                self.stats['fallback'] += 1
+                outcomes = await asyncio.gather(*(self._call(guild, reason, [user_id]) for user_id in user_ids), return_exceptions=True)
+                banned, failed = [], []
+                for user_id, outcome in zip(user_ids, outcomes):
+                    if isinstance(outcome, BaseException):
+                        errors[user_id] = outcome
+                    else:
+                        banned.append(user_id)
+        except Exception as e:
+            banned, failed, errors = [], [], {user_id: e for user_id in user_ids}
+
+        # IDs que a API não listou em nenhum dos dois contam como falha
+        answered = set(banned) | set(failed) | set(errors)
+        failed += [user_id for user_id in user_ids if user_id not in answered]
+
+        for user_id in banned:
+            for future in targets[user_id][1]:
+                if not future.done():
+                    future.set_result(True)
+        for user_id in failed:
+            for future in targets[user_id][1]:
+                if not future.done():
+                    future.set_exception(BulkBanRefused(f"Banimento de {user_id} recusado pelo Discord"))
+        for user_id, error in errors.items():
+            for future in targets[user_id][1]:
+                if not future.done():
+                    future.set_exception(error)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        failures = len(failed) + len(errors)
+        self.stats['chunks'] += 1
+        self.stats['banned'] += len(banned)
+        self.stats['failed'] += failures
+        self.history.append({
+            'guild_id': guild.id,
+            'size': len(user_ids),
+            'banned': len(banned),
+            'failed': failures,
+            'ms': elapsed_ms,
+            'at': datetime.utcnow().isoformat()
+        })
+        print(f"🔨 Lote de banimentos em {guild.name}: {len(banned)}/{len(user_ids)} ok, {failures} falhas ({elapsed_ms:.0f} ms)")
+
+class RaidState:
+    """Entradas recentes de um servidor e o incidente de raid em andamento"""
+    __slots__ = ('guild', 'joins', 'raid_until', 'started_at', 'peak', 'joins_during', 'queue', 'queued_ids', 'removed', 'failed')
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.joins = deque()  # (time.monotonic(), member_id, created_ms)
+        self.reset_incident()
+
+    def reset_incident(self):
+        self.raid_until = 0.0
+        self.started_at = None  # None = fora do modo raid
+        self.peak = 0
+        self.joins_during = 0
+        self.queue = []  # IDs aguardando a próxima remoção em lote
+        self.queued_ids = set()
+        self.removed = 0
+        self.failed = 0
+
+class JoinRaidDetector:
+    """Detecta raids pela taxa de entradas, remove as contas em lote e gera um único log por incidente"""
+
+    def __init__(self):
+        self.guilds = {}  # guild_id -> RaidState
+        self.removing = set()  # (guild_id, user_id) banidos pelo próprio detector
+        self.stats = {'raids': 0, 'removed': 0, 'failed': 0}
+
+    def active(self) -> int:
+        return sum(1 for state in self.guilds.values() if state.started_at is not None)
+
+    def observe(self, member, config: GuildConfig, now: Optional[float] = None) -> bool:
+        """Registra a entrada; devolve True se o membro foi enfileirado para remoção"""
+        now = time.monotonic() if now is None else now
+        guild = member.guild
+        state = self.guilds.get(guild.id)
+        if state is None:
+            state = self.guilds[guild.id] = RaidState(guild)
+        state.guild = guild
+
+        joins = state.joins
+        joins.append((now, member.id, snowflake_time_ms(member.id)))
+        while now - joins[0][0] > config.raid_join_window:
+            joins.popleft()
+
+        if state.started_at is None:
+            if len(joins) < config.raid_join_threshold:
+                return False
+            # Entra em modo raid: quem entrou na janela também é avaliado
+            state.started_at = datetime.utcnow()
+            state.joins_during = len(joins)
+            for _, member_id, created_ms in joins:
+                self._queue_if_offending(state, config, member_id, created_ms)
+            self.stats['raids'] += 1
+            print(f"🚨 Raid detectado em {guild.name}: {len(joins)} entradas em {config.raid_join_window}s")
+            asyncio.create_task(self._run(guild.id, state))
+        else:
+            state.joins_during += 1
+            self._queue_if_offending(state, config, member.id, joins[-1][2])
+
+        state.peak = max(state.peak, len(joins))
+        state.raid_until = now + config.raid_mode_duration
+        return member.id in state.queued_ids
+
+    @staticmethod
+    def _queue_if_offending(state: RaidState, config: GuildConfig, member_id: int, created_ms: int):
+        if member_id in state.queued_ids or member_id == OWNER_ID or member_id in config.whitelist_users:
+            return
+        if time.time() * 1000 - created_ms < config.raid_account_age_days * 86400000:
+            state.queue.append(member_id)
+            state.queued_ids.add(member_id)
+
+    def consume_removal(self, guild_id: int, user_id: int) -> bool:
+        """True se o banimento foi feito pelo detector (o log já sai no resumo do incidente)"""
+        key = (guild_id, user_id)
+        if key in self.removing:
+            self.removing.discard(key)
+            return True
+        return False
+
+    async def _run(self, guild_id: int, state: RaidState):
+        """Remove as contas enfileiradas a cada RAID_FLUSH_INTERVAL até o raid acabar"""
+        try:
+            while True:
+                await asyncio.sleep(RAID_FLUSH_INTERVAL)
+                if state.queue:
+                    await self._remove(state, security_system.get_guild_config(guild_id))
+                elif time.monotonic() >= state.raid_until:
+                    break
+        except Exception as e:
+            print(f"❌ Erro no modo raid: {e}")
+
+        # Resumo capturado antes de sair do modo raid (novas entradas abrem outro incidente)
+        summary = (state.started_at, state.joins_during, state.peak, state.removed, state.failed + len(state.queue))
+        state.reset_incident()
+        await self._log(state.guild, security_system.get_guild_config(guild_id), *summary)
+
+    async def _remove(self, state: RaidState, config: GuildConfig):
+        guild = state.guild
+        batch, state.queue = state.queue, []
+        reason = f"🔒 Anti-raid: conta com menos de {config.raid_account_age_days} dias durante raid"
+
+        if config.raid_action == 'kick':
+            # Não existe expulsão em lote: as chamadas vão juntas para a fila priorizada
+            members = [member for member in map(guild.get_member, batch) if member is not None]
+            results = await asyncio.gather(*(
+                action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda member=member: member.kick(reason=reason))
+                for member in members
+            ), return_exceptions=True)
+            removed = sum(1 for result in results if not isinstance(result, BaseException))
+            failed = len(batch) - removed
+        else:
+            # Cada conta vai para a fila de banimentos em lote (até 200 por chamada)
+            self.removing.update((guild.id, user_id) for user_id in batch)
+            results = await asyncio.gather(*(
+                bulk_ban_queue.ban(guild, discord.Object(id=user_id), reason=reason) for user_id in batch
+            ), return_exceptions=True)
+            removed = sum(1 for result in results if result is True)
+            failed = len(batch) - removed
+            self.removing.difference_update(
+                (guild.id, user_id) for user_id, result in zip(batch, results) if result is not True
+            )
+
+        state.removed += removed
+        state.failed += failed
+        self.stats['removed'] += removed
+        self.stats['failed'] += failed
+
+    async def _log(self, guild, config: GuildConfig, started_at: datetime, joins: int, peak: int, removed: int, failed: int):
+        duration = (datetime.utcnow() - started_at).total_seconds()
+        action = "banidas" if config.raid_action != 'kick' else "expulsas"
+        await security_system.log_security_action(
+            guild,
+            "🚨 RAID DETECTADO",
+            f"⚠️ {joins} entradas durante o modo raid - **{removed}** contas {action}",
+            COLORS['danger'],
+            [
+                {'name': '📈 Pico', 'value': f"{peak} entradas em {config.raid_join_window}s", 'inline': True},
+                {'name': '🔨 Removidas', 'value': str(removed), 'inline': True},
+                {'name': '❌ Falhas', 'value': str(failed), 'inline': True},
+                {'name': '⏱️ Duração', 'value': f"{duration:.0f}s", 'inline': True},
+                {'name': '🆕 Critério', 'value': f"Contas com menos de {config.raid_account_age_days} dias", 'inline': True}
+            ]
+        )
+
+class AuditLogCorrelator:
+    """Casa eventos do gateway com as entradas do registro de auditoria (on_audit_log_entry_create)"""
+
+    def __init__(self, ttl: float = 30.0):
+        self.ttl = ttl  # Tempo que uma entrada sem ninguém esperando fica no índice
+        self.entries = {}  # (guild_id, action, target_id) -> (entry, time.monotonic())
+        self.waiters = {}  # (guild_id, action, target_id) -> [Future]
+        self.stats = {'gateway': 0, 'fallback': 0, 'missed': 0}
+
+    @staticmethod
+    def _key(guild_id: int, action, target_id) -> Tuple:
+        return (guild_id, action, target_id)
+
+    def _prune(self, now: float):
+        # O dict mantém ordem de inserção: as entradas mais antigas estão no início
+        while self.entries:
+            key = next(iter(self.entries))
+            if now - self.entries[key][1] < self.ttl:
+                break
+            del self.entries[key]
+
+    def feed(self, entry):
+        """Recebe uma entrada do gateway e acorda quem estiver esperando por ela"""
+        target_id = getattr(entry.target, 'id', None)
+        if target_id is None:
+            return
+        key = self._key(entry.guild.id, entry.action, target_id)
+        now = time.monotonic()
+        self._prune(now)
+
+        waiters = [future for future in self.waiters.pop(key, []) if not future.done()]
+        if waiters:
+            for future in waiters:
+                future.set_result(entry)
+        else:
+            self.entries[key] = (entry, now)
+
+    async def wait_for(self, guild, action, target_id: int, timeout: float):
+        """Entrada de auditoria de uma ação; só consulta a API se o gateway não entregar a tempo"""
+        key = self._key(guild.id, action, target_id)
+        cached = self.entries.pop(key, None)
+        if cached:
+            entry, source = cached[0], 'gateway'
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters.setdefault(key, []).append(future)
+            try:
+                entry = await asyncio.wait_for(future, timeout=timeout)
+                source = 'gateway'
+            except asyncio.TimeoutError:
+                entry = await self._fetch(guild, action, target_id)
+                source = 'fallback' if entry else 'missed'
+            finally:
+                waiters = self.waiters.get(key)
+                if waiters and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self.waiters[key]
+        self.stats[source] += 1
+        if entry is None:
+            return None
+
+        # Entradas do gateway só trazem o ID se o executor não estiver em cache
+        if entry.user is None and entry.user_id:
+            try:
+                entry.user = guild.get_member(entry.user_id) or await guild.fetch_member(entry.user_id)
+            except discord.HTTPException:
+                entry.user = await bot.fetch_user(entry.user_id)
+        return entry
+
+    async def _fetch(self, guild, action, target_id: int):
+        """Fallback pela API: procura a entrada do alvo entre as mais recentes"""
+        async for entry in guild.audit_logs(action=action, limit=25):
+            if getattr(entry.target, 'id', None) == target_id:
+                return entry
+        return None
+
+INCIDENT_WINDOW = 5  # Segundos sem novas exclusões para encerrar um incidente
+INCIDENT_MAX_WAIT = 60  # Limite para esperar gatilhos que ainda estão recriando itens
+
+class Incident:
+    """Exclusões de um mesmo executor agrupadas em uma punição e um log"""
+
+    def __init__(self, guild, executor):
+        self.guild = guild
+        self.executor = executor
+        self.counts = {}  # 'channel'/'role' -> quantidade
+        self.names = []  # '#canal' / '@cargo' na ordem em que foram deletados
+        self.recreated = []  # Menções dos itens recriados
+        self.punishment = None  # Texto da punição aplicada
+        self.bot_banned = False
+        self.punished = asyncio.Event()
+        self.active = 0  # Gatilhos ainda em andamento
+        self.last_trigger = time.monotonic()
+
+class PunishmentCoordinator:
+    """Uma única punição em andamento por (servidor, executor), mesmo com dezenas de gatilhos"""
+
+    KIND_LABELS = {'channel': ('canal', '📺 Canais'), 'role': ('cargo', '🎭 Cargos')}
+
+    def __init__(self, window: float = INCIDENT_WINDOW):
+        self.window = window
+        self.incidents = {}  # (guild_id, executor_id) -> Incident
+        self._tasks = set()
+
+    def open(self, guild, executor, config: GuildConfig, kind: str, name: str) -> Incident:
+        """Registra uma exclusão; só a primeira do incidente dispara a punição"""
+        key = (guild.id, executor.id)
+        incident = self.incidents.get(key)
+        if incident is None:
+            incident = self.incidents[key] = Incident(guild, executor)
+            task = asyncio.create_task(self._run(key, incident, config, kind, name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        incident.counts[kind] = incident.counts.get(kind, 0) + 1
+        incident.names.append(name)
+        incident.active += 1
+        incident.last_trigger = time.monotonic()
+        return incident
+
+    def close(self, incident: Incident, recreated: Optional[str] = None):
+        if recreated:
+            incident.recreated.append(recreated)
+        incident.active -= 1
+
+    async def _run(self, key, incident: Incident, config: GuildConfig, kind: str, name: str):
+        try:
+            incident.punishment = await self._punish(incident, config, kind, name)
+        except Exception as e:
+            incident.punishment = f"falha ({e})"
+        finally:
+            incident.punished.set()
+
+        # Espera a rajada acabar (e as recriações em andamento) antes do log único
+        while True:
+            now = time.monotonic()
+            idle = now - incident.last_trigger
+            if idle >= self.window and (incident.active <= 0 or idle >= INCIDENT_MAX_WAIT):
+                break
+            await asyncio.sleep(max(self.window - idle, 0.5))
+        del self.incidents[key]
+
+        try:
+            await self._log(incident, config)
+        except Exception as e:
+            print(f"❌ Erro ao registrar incidente: {e}")
+
+    async def _punish(self, incident: Incident, config: GuildConfig, kind: str, name: str) -> str:
+        guild, executor = incident.guild, incident.executor
+        label = self.KIND_LABELS[kind][0]
+
+        # Verifica se é um bot e se deve ser banido
+        if executor.bot and config.auto_ban_bots_on_deletion:
+            try:
+                await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: executor.ban(reason=f"🔒 Bot deletou {label} {name}"))
+                incident.bot_banned = True
+                return "ban (bot)"
+            except Exception as e:
+                await security_system.log_security_action(
+                    guild,
+                    "❌ ERRO AO BANIR BOT",
+                    f"Falha ao banir bot {executor.mention}: {str(e)}",
+                    COLORS['danger']
+                )
+
+        # Aplica punição para usuários
+        member = guild.get_member(executor.id)
+        punishment = getattr(config, f'{kind}_delete_punishment')
+        if not member:
+            return punishment
+
+        original_roles = [role for role in member.roles if role != guild.default_role]
+
+        # Salva cargos uma única vez, antes de qualquer remoção
+        if original_roles and config.save_roles_before_kick:
+            security_system.restored_roles[str(executor.id)] = {
+                'roles': [role.id for role in original_roles],
+                'removed_at': datetime.utcnow().isoformat(),
+                'reason': f"Deletou {label} {name}",
+                'guild_id': guild.id
+            }
+            security_system.record_change('set', ['restored_roles', executor.id], security_system.restored_roles[str(executor.id)], guild_id=guild.id)
+
+        # Aplica punição baseada na configuração
+        if punishment == 'ban':
+            try:
+                await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: member.ban(reason=f"🔒 Segurança: Deletou {label} {name}"))
+            except:
+                punishment = "falha (sem permissão para banir)"
+        elif config.use_kick_instead_remove_roles:
+            try:
+                await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: member.kick(reason=f"🔒 Segurança: Deletou {label} {name}"))
+                punishment = "kick"
+            except discord.Forbidden:
+                # Se não tem permissão para kick, remove cargos
+                try:
+                    await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: member.remove_roles(*original_roles, reason=f"🔒 Segurança: Deletou {label}"))
+                    punishment = "remove_roles (sem permissão para kick)"
+                except:
+                    punishment = "falha (sem permissões)"
+            except Exception:
+                # Se falhar o kick por outro motivo, remove cargos como fallback
+                try:
+                    await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: member.remove_roles(*original_roles, reason=f"🔒 Segurança: Deletou {label}"))
+                    punishment = "remove_roles (kick falhou)"
+                except:
+                    punishment = "falha (erro geral)"
+        elif punishment == 'remove_roles':
+            try:
+                await action_scheduler.run(PRIORITY_PUNISH, guild.id, lambda: member.remove_roles(*original_roles, reason=f"🔒 Segurança: Deletou {label}"))
+            except:
+                punishment = "falha (sem permissões para remover cargos)"
+        return punishment
+
+    async def _log(self, incident: Incident, config: GuildConfig):
+        executor = incident.executor
+        total = sum(incident.counts.values())
+
+        if incident.bot_banned:
+            title = "🤖 BOT BANIDO - Exclusões" if total > 1 else f"🤖 BOT BANIDO - Deletou {self.KIND_LABELS[next(iter(incident.counts))][0].capitalize()}"
+        elif total > 1:
+            title = "🚨 INCIDENTE: EXCLUSÕES EM MASSA"
+        else:
+            title = f"🚨 {self.KIND_LABELS[next(iter(incident.counts))][0].upper()} DELETADO"
+
+        action_text = incident.punishment or "nenhuma"
+        if incident.recreated:
+            action_text += f" + {len(incident.recreated)} recriado(s)"
+
+        names = ', '.join(incident.names)
+        if len(names) > 1000:
+            names = names[:997] + '...'
+        fields = [
+            {'name': self.KIND_LABELS[kind][1], 'value': str(count), 'inline': True}
+            for kind, count in incident.counts.items()
+        ]
+        fields += [
+            {'name': '👤 Responsável', 'value': executor.mention, 'inline': True},
+            {'name': '⚡ Ação', 'value': action_text, 'inline': True},
+            {'name': '📋 Itens', 'value': names, 'inline': False}
+        ]
+        if incident.recreated:
+            recreated = ' '.join(incident.recreated)
+            fields.append({'name': '🔄 Recriados', 'value': recreated[:1024], 'inline': False})
+
+        await security_system.log_security_action(
+            incident.guild,
+            title,
+            f"⚠️ {executor.mention} deletou {total} item(ns): {names[:200]}",
+            COLORS['danger'],
+            fields
+        )
+
+# Prioridades das chamadas à API (menor = mais urgente)
+PRIORITY_PUNISH = 0  # Banir, expulsar, silenciar, apagar mensagem: conter o ataque
+PRIORITY_RECREATE = 1  # Recriar canais/cargos
+PRIORITY_BULK = 2  # Trabalho em massa da restauração (cargos devolvidos aos membros)
+PRIORITY_LOG = 3  # Mensagens no canal de logs
+PRIORITY_COSMETIC = 4  # Status/presença do bot
+PRIORITY_NAMES = ('punir', 'recriar', 'em massa', 'log', 'cosmético')
+ACTION_WORKERS = 6  # Chamadas simultâneas no total
+ACTION_LOW_PRIORITY_SLOTS = 2  # Quantas delas podem ser log/cosmético (o resto fica livre para punições)
+ACTION_PUNISH_RESERVED_SLOTS = 2  # Workers que só punições usam (restaurações não ocupam todos)
+# Recriações em andamento por servidor (rodízio justo entre servidores); é o único limite
+# de concorrência da recriação e da restauração, que derivam dele
+ACTION_GUILD_RECREATE_SLOTS = int(os.getenv('SECURITY_GUILD_RECREATE_SLOTS', '2'))
+
+class ActionScheduler:
+    """Fila única das chamadas à API: por prioridade e, dentro dela, em rodízio entre servidores"""
+
+    def __init__(self, workers: int = ACTION_WORKERS, low_priority_slots: int = ACTION_LOW_PRIORITY_SLOTS,
+                 punish_slots: int = ACTION_PUNISH_RESERVED_SLOTS, guild_recreate_slots: int = ACTION_GUILD_RECREATE_SLOTS):
+        self.workers = workers
+        self.low_priority_slots = low_priority_slots
+        self.punish_slots = punish_slots
+        self.guild_recreate_slots = guild_recreate_slots
+        # prioridade -> {guild_id: deque[(factory, future, enfileirado_em)]}; a ordem do dict é o rodízio
+        self.queues = [{} for _ in PRIORITY_NAMES]
+        self.running_low = 0
+        self.running_other = 0  # Tudo que não é punição (limitado a workers - punish_slots)
+        self.running_recreate = {}  # guild_id -> recriações em andamento
+        self.stats = [{'done': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0} for _ in PRIORITY_NAMES]
+        self._wakeup = None
+        self._tasks = []
+
+    def depth(self, priority: int) -> int:
+        return sum(len(queue) for queue in self.queues[priority].values())
+
+    async def run(self, priority: int, guild_id, factory):
+        """Enfileira a chamada (factory devolve a corrotina) e espera o resultado"""
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        future = asyncio.get_running_loop().create_future()
+        self.queues[priority].setdefault(guild_id, deque()).append((factory, future, time.monotonic()))
+        self._wakeup.set()
+        return await future
+
+    def _next(self):
+        for priority, guilds in enumerate(self.queues):
+            if priority > PRIORITY_PUNISH and self.running_other >= self.workers - self.punish_slots:
+                break
+            if priority >= PRIORITY_LOG and self.running_low >= self.low_priority_slots:
+                break
+            # Rodízio: pega o primeiro servidor disponível e o devolve ao fim da fila se ainda tiver itens
+            for guild_id in list(guilds):
+                if priority == PRIORITY_RECREATE and self.running_recreate.get(guild_id, 0) >= self.guild_recreate_slots:
+                    continue
+                queue = guilds.pop(guild_id)
+                while queue:
+                    factory, future, enqueued = queue.popleft()
+                    if not future.done():  # Quem pediu pode ter desistido
+                        break
+                else:
+                    continue
+                if queue:
+                    guilds[guild_id] = queue
+                return priority, guild_id, factory, future, enqueued
+        return None
+
+    async def _worker(self):
+        while True:
+            item = self._next()
+            if item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, guild_id, factory, future, enqueued = item
+            waited_ms = (time.monotonic() - enqueued) * 1000
+            stats = self.stats[priority]
+            stats['done'] += 1
+            stats['wait_ms_total'] += waited_ms
+            stats['wait_ms_max'] = max(stats['wait_ms_max'], waited_ms)
+
+            low = priority >= PRIORITY_LOG
+            if low:
+                self.running_low += 1
+            if priority > PRIORITY_PUNISH:
+                self.running_other += 1
+            if priority == PRIORITY_RECREATE:
+                self.running_recreate[guild_id] = self.running_recreate.get(guild_id, 0) + 1
+            try:
+                result = await factory()
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                if low:
+                    self.running_low -= 1
+                if priority > PRIORITY_PUNISH:
+                    self.running_other -= 1
+                if priority == PRIORITY_RECREATE:
+                    self.running_recreate[guild_id] -= 1
+                    if not self.running_recreate[guild_id]:
+                        del self.running_recreate[guild_id]
+                # Uma vaga liberada pode destravar itens que estavam no limite
+                self._wakeup.set()
+
+RECREATE_BATCH_WINDOW = 1.5  # Segundos sem novas exclusões antes de recriar o lote
+RECREATE_CONCURRENCY = ACTION_GUILD_RECREATE_SLOTS  # Mais que isso só esperaria na fila do agendador
+
+def clamp_role_position(guild, position: int) -> int:
+    """Posição que o bot consegue dar a um cargo: abaixo do cargo mais alto dele (uma só fora
+    do limite faria o Discord recusar o edit_role_positions inteiro)"""
+    ceiling = guild.me.top_role.position - 1 if guild.me else 1
+    return max(1, min(position, ceiling))
+
+async def edit_channel_positions(guild, positions: Dict, reason: Optional[str] = None):
+    """Reposiciona vários canais ({canal: posição}), como guild.edit_role_positions faz com cargos.
+    O discord.py não expõe a versão em lote: usa a rota em uma chamada se existir, senão um edit por canal"""
+    if hasattr(guild, 'edit_channel_positions'):
+        return await guild.edit_channel_positions(positions, reason=reason)
+    bulk = getattr(bot.http, 'bulk_channel_update', None)
+    if bulk is not None:
+        payload = [{'id': channel.id, 'position': position} for channel, position in positions.items()]
+        return await bulk(guild.id, payload, reason=reason)
+    for channel, position in positions.items():
+        await channel.edit(position=position, reason=reason)
+
+class RecreationEngine:
+    """Recria em lote o que foi deletado: categorias antes dos filhos, posições em uma chamada"""
+
+    def __init__(self, window: float = RECREATE_BATCH_WINDOW, concurrency: int = RECREATE_CONCURRENCY):
+        self.window = window
+        self.concurrency = concurrency
+        self.batches = {}  # guild_id -> lote em formação
+        self.last_recovery = None  # {'items', 'failed', 'ms'} do último lote
+        self._tasks = set()
+
+    def recreate_channel(self, channel, executor) -> asyncio.Future:
+        return self._enqueue(channel.guild, 'channels', channel, executor)
+
+    def recreate_role(self, role, executor) -> asyncio.Future:
+        return self._enqueue(role.guild, 'roles', role, executor)
+
+    def _enqueue(self, guild, kind: str, item, executor) -> asyncio.Future:
+        """Agenda a recriação; o future resolve com o novo canal/cargo (ou None)"""
+        batch = self.batches.get(guild.id)
+        if batch is None:
+            batch = self.batches[guild.id] = {
+                'guild': guild, 'channels': [], 'roles': [], 'executors': set(),
+                'started': time.monotonic(), 'last': time.monotonic()
+            }
+            task = asyncio.create_task(self._run(guild.id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        future = asyncio.get_running_loop().create_future()
+        batch[kind].append((item, future))
+        batch['executors'].add(str(executor))
+        batch['last'] = time.monotonic()
+        return future
+
+    async def _run(self, guild_id: int):
+        # Junta a rajada inteira antes de começar
+        while True:
+            batch = self.batches[guild_id]
+            idle = time.monotonic() - batch['last']
+            if idle >= self.window:
+                break
+            await asyncio.sleep(self.window - idle)
+        del self.batches[guild_id]
+
+        try:
+            await self._recreate(batch)
+        except Exception as e:
+            print(f"❌ Erro na recriação em lote: {e}")
+        finally:
+            for _, future in batch['channels'] + batch['roles']:
+                if not future.done():
+                    future.set_result(None)
+
+        created = sum(1 for _, future in batch['channels'] + batch['roles'] if future.result())
+        total = len(batch['channels']) + len(batch['roles'])
+        elapsed_ms = (time.monotonic() - batch['started']) * 1000
+        self.last_recovery = {'items': created, 'failed': total - created, 'ms': elapsed_ms}
+        print(f"🔄 Recriação em lote: {created}/{total} itens em {elapsed_ms:.0f} ms (desde a primeira exclusão)")
+
+    async def _recreate(self, batch: Dict):
+        guild = batch['guild']
+        reason = f"🔄 Recriação automática após deletação por {', '.join(sorted(batch['executors']))}"
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def create(future, factory):
+            async with semaphore:
+                try:
+                    future.set_result(await action_scheduler.run(PRIORITY_RECREATE, guild.id, factory))
+                except Exception as e:
+                    print(f"❌ Erro ao recriar: {e}")
+                    future.set_result(None)
+
+        # 1) Categorias primeiro, para os canais poderem voltar para dentro delas
+        categories = [(c, f) for c, f in batch['channels'] if isinstance(c, discord.CategoryChannel)]
+        children = [(c, f) for c, f in batch['channels'] if not isinstance(c, discord.CategoryChannel)]
+        await asyncio.gather(*(
+            create(future, lambda c=category: guild.create_category(name=c.name, reason=reason))
+            for category, future in categories
+        ))
+        new_categories = {old.id: future.result() for old, future in categories if future.result()}
+
+        # 2) Canais e cargos em paralelo (limitados pelo semáforo)
+        def parent_of(channel):
+            # category_id: a categoria apagada junto com o canal já não está no cache (channel.category seria None)
+            if channel.category_id is None:
+                return None
+            return new_categories.get(channel.category_id) or guild.get_channel(channel.category_id)
+
+        def channel_factory(channel):
+            if isinstance(channel, discord.TextChannel):
+                return lambda: guild.create_text_channel(
+                    name=channel.name, category=parent_of(channel), topic=channel.topic,
+                    slowmode_delay=channel.slowmode_delay, nsfw=channel.nsfw, reason=reason)
+            if isinstance(channel, discord.VoiceChannel):
+                return lambda: guild.create_voice_channel(
+                    name=channel.name, category=parent_of(channel), bitrate=channel.bitrate,
+                    user_limit=channel.user_limit, reason=reason)
+            return None
+
+        jobs = []
+        for channel, future in children:
+            factory = channel_factory(channel)
+            if factory is None:
+                future.set_result(None)
+            else:
+                jobs.append(create(future, factory))
+        for role, future in batch['roles']:
+            jobs.append(create(future, lambda r=role: guild.create_role(
+                name=r.name, color=r.color, permissions=r.permissions,
+                hoist=r.hoist, mentionable=r.mentionable, reason=reason)))
+        await asyncio.gather(*jobs)
+
+        # 3) Posições originais em uma chamada para canais e outra para cargos
+        channel_positions = {
+            future.result(): old.position
+            for old, future in batch['channels'] if future.result()
+        }
+        if channel_positions:
+            try:
+                await action_scheduler.run(PRIORITY_RECREATE, guild.id,
+                                           lambda: edit_channel_positions(guild, channel_positions, reason=reason))
+            except Exception as e:
+                print(f"❌ Erro ao reposicionar canais: {e}")
+
+        role_positions = {}
+        for old, future in batch['roles']:
+            role = future.result()
+            position = clamp_role_position(guild, old.position)
+            if role is not None and role.position != position:
+                role_positions[role] = position
+        if role_positions:
+            try:
+                await action_scheduler.run(PRIORITY_RECREATE, guild.id,
+                                           lambda: guild.edit_role_positions(role_positions, reason=reason))
+            except Exception as e:
+                print(f"❌ Erro ao reposicionar cargos: {e}")
+
+RESTORE_CONCURRENCY = ACTION_GUILD_RECREATE_SLOTS  # Passos simultâneos da restauração (limite do agendador)
+RESTORE_PROGRESS_INTERVAL = 2.0  # Segundos entre atualizações da mensagem de progresso
+RESTORE_CHANNEL_TYPES = ('text', 'news', 'voice', 'stage_voice', 'forum')
+RESTORE_MEMBER_CONCURRENCY = 2  # Membros recebendo cargos ao mesmo tempo (em PRIORITY_BULK, abaixo dos outros passos)
+RESTORE_JOBS_KEEP = 5  # Jobs concluídos mantidos por servidor (interrompidos ficam até serem retomados)
+RESTORE_JOB_META_KEYS = ('mode', 'server_name', 'backup_created_at', 'created_by')
+
+def build_restore_plan(backup: Dict) -> List[Dict]:
+    """Grafo de dependências da restauração: cargos e categorias -> canais -> posições"""
+    steps = []
+
+    role_keys = []
+    role_members = {}  # chave do cargo -> membros empacotados
+    for index, role in enumerate(backup.get('roles', [])):
+        if role.get('managed'):
+            continue  # Cargos de integração são recriados pela própria integração
+        key = f"role:{role.get('id', index)}"
+        role_keys.append(key)
+        if role.get('members'):
+            role_members[key] = role['members']
+            role = {field: value for field, value in role.items() if field != 'members'}
+        steps.append({'key': key, 'kind': 'role', 'action': 'create', 'record': role, 'deps': []})
+
+    # Canais com sobrescritas esperam os cargos citados nelas
+    known_roles = set(role_keys)
+
+    def overwrite_deps(record: Dict) -> List[str]:
+        keys = (f"role:{target_id}" for target_id, target_type, _, _ in unpack_overwrites(record.get('overwrites'))
+                if target_type == 0)
+        return [key for key in keys if key in known_roles]
+
+    # Backups antigos guardam só o nome da categoria: resolve para o ID uma vez
+    category_keys = {}
+    category_by_name = {}
+    for index, category in enumerate(backup.get('categories', [])):
+        key = f"category:{category.get('id', index)}"
+        category_keys[str(category.get('id', index))] = key
+        category_by_name.setdefault(category['name'], key)
+        steps.append({'key': key, 'kind': 'category', 'action': 'create', 'record': category, 'deps': overwrite_deps(category)})
+
+    channel_keys = list(category_keys.values())
+    for index, channel in enumerate(backup.get('channels', [])):
+        if channel.get('type') not in RESTORE_CHANNEL_TYPES:
+            continue
+        parent = None
+        if channel.get('category_id') is not None:
+            parent = category_keys.get(str(channel['category_id']))
+        elif channel.get('category'):
+            parent = category_by_name.get(channel['category'])
+        key = f"channel:{channel.get('id', index)}"
+        channel_keys.append(key)
+        steps.append({'key': key, 'kind': 'channel', 'action': 'create', 'record': channel,
+                      'parent': parent, 'deps': ([parent] if parent else []) + overwrite_deps(channel)})
+
+    # Posições originais no fim, em uma chamada para canais e outra para cargos
+    if channel_keys:
+        steps.append({'key': 'positions:channels', 'kind': 'channel_positions', 'action': 'reorder', 'deps': channel_keys})
+    if role_keys:
+        steps.append({'key': 'positions:roles', 'kind': 'role_positions', 'action': 'reorder', 'deps': role_keys})
+    # Cargos de volta aos membros depois que todos os cargos existem
+    if role_members:
+        steps.append({'key': 'members:roles', 'kind': 'member_roles', 'action': 'assign',
+                      'record': {'roles': role_members}, 'deps': list(role_members)})
+    return steps
+
+def member_role_targets(role_members: Dict[str, str], guild, id_map: Dict[str, int]) -> Dict[int, List[int]]:
+    """Membros ainda no servidor -> cargos do backup que eles não têm (cargos sem ID são ignorados)"""
+    missing = {}
+    for role_key, packed in role_members.items():
+        role_id = id_map.get(role_key)
+        if role_id is None:
+            continue
+        for member_id in unpack_ids(packed):
+            member = guild.get_member(member_id)
+            if member is not None and role_id not in member_role_ids(member):
+                missing.setdefault(member_id, []).append(role_id)
+    return missing
+
+def reconcile_restore_plan(backup: Dict, guild) -> List[Dict]:
+    """Compara o backup com o servidor atual e mantém só a diferença (criar, editar, reordenar)"""
+    steps = build_restore_plan(backup)
+
+    # Índices do servidor atual: por ID (get_role/get_channel) e por nome/tipo/categoria
+    roles_by_name = {}
+    for role in guild.roles:
+        if role != guild.default_role and not role.managed:
+            roles_by_name.setdefault(role.name, []).append(role)
+    channels_by_signature = {}
+    for channel in guild.channels:
+        parent = channel.category.name if channel.category else None
+        channels_by_signature.setdefault((channel.name, str(channel.type), parent), []).append(channel)
+
+    claimed = set()
+    live_ids = {}  # chave do passo -> ID do objeto encontrado
+    step_keys = {step['key'] for step in steps}
+
+    def pick(by_id, candidates):
+        if by_id is not None and by_id.id not in claimed:
+            return by_id
+        for candidate in candidates or ():
+            if candidate.id not in claimed:
+                return candidate
+        return None
+
+    for step in steps:
+        kind = step['kind']
+        if kind not in ('role', 'category', 'channel'):
+            continue
+        record = step['record']
+        old_id = record.get('id')
+
+        if kind == 'role':
+            live = guild.get_role(old_id) if old_id else None
+            if live is not None and live.managed:
+                live = None
+            live = pick(live, roles_by_name.get(record['name']))
+        else:
+            channel_type = 'category' if kind == 'category' else record['type']
+            live = guild.get_channel(old_id) if old_id else None
+            if live is not None and str(live.type) != channel_type:
+                live = None
+            parent = None if kind == 'category' else record.get('category')
+            live = pick(live, channels_by_signature.get((record['name'], channel_type, parent)))
+
+        if live is None:
+            continue  # Não existe mais: continua como criação
+        claimed.add(live.id)
+        live_ids[step['key']] = live.id
+
+        changes = {}
+        if live.name != record['name']:
+            changes['name'] = record['name']
+        if kind == 'role':
+            if live.permissions.value != record['permissions']:
+                changes['permissions'] = record['permissions']
+            if str(live.color) != record.get('color', '#000000'):
+                changes['color'] = record.get('color', '#000000')
+            for attribute in ('hoist', 'mentionable'):
+                if attribute in record and getattr(live, attribute) != record[attribute]:
+                    changes[attribute] = record[attribute]
+        if kind in ('category', 'channel') and 'overwrites' in record:
+            # Backups antigos não têm sobrescritas: nesses, as do servidor ficam como estão.
+            # Sobrescritas comparadas já com os IDs dos cargos encontrados (cargo a criar = diferente)
+            wanted = set()
+            for target_id, target_type, allow, deny in unpack_overwrites(record.get('overwrites')):
+                role_key = f"role:{target_id}"
+                if target_type == 0 and role_key in step_keys:
+                    target_id = live_ids.get(role_key, 0)
+                wanted.add((target_id, target_type, allow, deny))
+            current = set(channel_overwrites(live))
+            if wanted != current:
+                changes['overwrites'] = True
+        if kind == 'channel':
+            for attribute in ('topic', 'nsfw', 'slowmode_delay', 'bitrate', 'user_limit'):
+                if attribute in record and hasattr(live, attribute) and getattr(live, attribute) != record[attribute]:
+                    changes[attribute] = record[attribute]
+            # Categoria: compara com o destino (que pode ter sido encontrado ou ainda será criado)
+            parent_key = step.get('parent')
+            wanted_parent = live_ids.get(parent_key) if parent_key else None
+            if parent_key and wanted_parent is None:
+                changes['category'] = parent_key
+            elif live.category_id != wanted_parent:
+                changes['category'] = parent_key
+
+        step['action'] = 'edit' if changes else 'keep'
+        step['target_id'] = live.id
+        step['changes'] = changes
+
+    # Membros: só fica no plano se alguém ainda está sem algum cargo (cargo a criar conta como faltando)
+    for step in steps:
+        if step['kind'] == 'member_roles':
+            id_map = {key: live_ids.get(key, 0) for key in step['record']['roles']}
+            if not member_role_targets(step['record']['roles'], guild, id_map):
+                steps.remove(step)
+            break
+
+    return steps
+
+def summarize_plan(steps: List[Dict]) -> Dict[str, Dict[str, int]]:
+    """Contagem do plano por ação e tipo: {'create': {'role': 3, ...}, ...}"""
+    summary = {}
+    for step in steps:
+        kinds = summary.setdefault(step['action'], {})
+        kinds[step['kind']] = kinds.get(step['kind'], 0) + 1
+    return summary
+
+# Rotas da API usadas pela restauração: (limite, janela em segundos) até o bot observar o bucket real
+RESTORE_BUCKET_DEFAULTS = {
+    'POST /guilds/{guild_id}/roles': (5, 5.0),
+    'POST /guilds/{guild_id}/channels': (5, 5.0),
+    'PATCH /guilds/{guild_id}/roles/{role_id}': (5, 5.0),
+    'PATCH /channels/{channel_id}': (5, 5.0),
+    'PATCH /guilds/{guild_id}/channels': (5, 5.0),
+    'PATCH /guilds/{guild_id}/roles': (5, 5.0),
+    'PATCH /guilds/{guild_id}/members/{user_id}': (10, 10.0),
+}
+MEMBER_ROLES_ROUTE = 'PATCH /guilds/{guild_id}/members/{user_id}'
+RESTORE_CALL_LATENCY = 0.3  # Segundos por chamada (ida e volta) fora das esperas de rate limit
+GUILD_ROLE_LIMIT = 250
+GUILD_CHANNEL_LIMIT = 500
+
+def step_route(step: Dict, guild_id: int) -> Optional[Tuple[str, str]]:
+    """Rota (chave do discord.py) e parâmetro principal do bucket que o passo vai usar"""
+    kind, action = step['kind'], step['action']
+    if action == 'keep':
+        return None
+    if kind == 'role':
+        if action == 'edit':
+            return 'PATCH /guilds/{guild_id}/roles/{role_id}', str(guild_id)
+        return 'POST /guilds/{guild_id}/roles', str(guild_id)
+    if kind in ('category', 'channel'):
+        if action == 'edit':
+            return 'PATCH /channels/{channel_id}', str(step['target_id'])  # Um bucket por canal
+        return 'POST /guilds/{guild_id}/channels', str(guild_id)
+    if kind == 'channel_positions':
+        return 'PATCH /guilds/{guild_id}/channels', str(guild_id)
+    if kind == 'member_roles':
+        return MEMBER_ROLES_ROUTE, str(guild_id)
+    return 'PATCH /guilds/{guild_id}/roles', str(guild_id)
+
+def observed_bucket_limit(route_key: str, major: str) -> Optional[Tuple[int, float]]:
+    """Limite e janela que o discord.py já viu nos cabeçalhos desse bucket
+
+    None se o bucket nunca foi usado ou se o discord.py não expõe mais esses
+    internos (aí valem os RESTORE_BUCKET_DEFAULTS).
+    """
+    hashes = getattr(bot.http, '_bucket_hashes', None)
+    buckets = getattr(bot.http, '_buckets', None)
+    if not isinstance(hashes, dict) or not isinstance(buckets, dict):
+        return None
+    bucket_hash = hashes.get(route_key)
+    ratelimit = buckets.get(f'{bucket_hash}:{major}' if bucket_hash else f'{route_key}:{major}')
+    limit = getattr(ratelimit, 'limit', None)
+    reset_after = getattr(ratelimit, 'reset_after', None)
+    if getattr(ratelimit, 'expires', None) is None or not isinstance(limit, int) or not reset_after or reset_after <= 0:
+        return None
+    return limit, reset_after
+
+def restore_plan_issues(backup: Dict, steps: List[Dict], guild) -> List[Tuple[str, str]]:
+    """Itens que vão falhar (ou sair diferentes) sem precisar chamar a API"""
+    issues = []
+    me = guild.me
+    permissions = me.guild_permissions if me else discord.Permissions.none()
+    top_position = me.top_role.position if me else 0
+    kinds = {step['kind'] for step in steps if step['action'] != 'keep'}
+
+    if kinds & {'role', 'role_positions', 'member_roles'} and not permissions.manage_roles:
+        issues.append(("🎭 Cargos", "bot sem permissão de Gerenciar Cargos"))
+    if kinds & {'category', 'channel', 'channel_positions'} and not permissions.manage_channels:
+        issues.append(("📺 Canais", "bot sem permissão de Gerenciar Canais"))
+
+    for role in backup.get('roles', []):
+        if role.get('managed'):
+            issues.append((f"🎭 {role['name']}", "cargo de integração: ignorado (a integração recria)"))
+    for channel in backup.get('channels', []):
+        if channel.get('type') not in RESTORE_CHANNEL_TYPES + ('category',):
+            issues.append((f"📺 {channel['name']}", f"tipo `{channel.get('type')}` não suportado: ignorado"))
+
+    community = 'COMMUNITY' in guild.features
+    creates = {'role': 0, 'channel': 0}
+    for step in steps:
+        kind, action = step['kind'], step['action']
+        if kind not in ('role', 'category', 'channel') or action == 'keep':
+            continue
+        record = step['record']
+        if kind == 'role':
+            if action == 'create':
+                creates['role'] += 1
+            target = guild.get_role(step['target_id']) if action == 'edit' else None
+            if target is not None and target.position >= top_position:
+                issues.append((f"🎭 {record['name']}", "acima do cargo mais alto do bot: edição vai falhar"))
+                continue
+            if record.get('position', 0) >= top_position:
+                issues.append((f"🎭 {record['name']}", f"posição {record.get('position')} acima do bot: fica abaixo de {me.top_role.name if me else 'bot'}"))
+            # Só administradores podem dar permissões que o próprio bot não tem
+            missing = discord.Permissions(record['permissions'] & ~permissions.value)
+            if missing.value and not permissions.administrator and (action == 'create' or 'permissions' in step['changes']):
+                names = ', '.join(name for name, value in missing if value)[:100]
+                issues.append((f"🎭 {record['name']}", f"permissões que o bot não tem: {names}"))
+        else:
+            if action == 'create':
+                creates['channel'] += 1
+            if record.get('type') in ('news', 'stage_voice', 'forum') and not community:
+                issues.append((f"📺 {record['name']}", f"`{record['type']}` exige servidor Comunidade"))
+
+    if len(guild.roles) + creates['role'] > GUILD_ROLE_LIMIT:
+        issues.append(("🎭 Cargos", f"{len(guild.roles)} + {creates['role']} passa do limite de {GUILD_ROLE_LIMIT}"))
+    if len(guild.channels) + creates['channel'] > GUILD_CHANNEL_LIMIT:
+        issues.append(("📺 Canais", f"{len(guild.channels)} + {creates['channel']} passa do limite de {GUILD_CHANNEL_LIMIT}"))
+    return issues
+
+def estimate_restore_plan(backup: Dict, steps: List[Dict], guild, concurrency: Optional[int] = None) -> Dict:
+    """Simulação da restauração: chamadas por bucket, tempo estimado e problemas previstos"""
+    # O limite que vale é o do agendador por servidor, não a constante (pode ter sido ajustado)
+    concurrency = min(concurrency or RESTORE_CONCURRENCY, action_scheduler.guild_recreate_slots)
+    buckets = {}  # rota -> {parâmetro principal: chamadas}
+    for step in steps:
+        route = step_route(step, guild.id)
+        if route is None:
+            continue
+        count = 1
+        if step['kind'] == 'member_roles':
+            # Uma chamada por membro sem algum cargo; cargos ainda a criar contam como faltando
+            id_map = {s['key']: s.get('target_id', 0) for s in steps if s['kind'] == 'role'}
+            count = len(member_role_targets(step['record']['roles'], guild, id_map))
+        majors = buckets.setdefault(route[0], {})
+        majors[route[1]] = majors.get(route[1], 0) + count
+
+    report = []
+    slowest = 0.0
+    for route_key, majors in buckets.items():
+        calls = sum(majors.values())
+        seconds = 0.0
+        observed = False
+        for major, count in majors.items():
+            limits = observed_bucket_limit(route_key, major)
+            observed = observed or limits is not None
+            limit, per = limits or RESTORE_BUCKET_DEFAULTS[route_key]
+            # A primeira janela sai na hora; cada janela cheia seguinte espera o reset
+            seconds = max(seconds, (-(-count // max(1, limit)) - 1) * per)
+        limit, per = observed_bucket_limit(route_key, next(iter(majors))) or RESTORE_BUCKET_DEFAULTS[route_key]
+        report.append({'route': route_key, 'calls': calls, 'buckets': len(majors), 'limit': limit,
+                       'per': per, 'observed': observed, 'seconds': seconds})
+        slowest = max(slowest, seconds)
+
+    calls = sum(entry['calls'] for entry in report)
+    # Cargos dos membros vão no fim, com concorrência própria (menor)
+    member_calls = sum(entry['calls'] for entry in report if entry['route'] == MEMBER_ROLES_ROUTE)
+    latency = (calls - member_calls) * RESTORE_CALL_LATENCY / concurrency
+    latency += member_calls * RESTORE_CALL_LATENCY / RESTORE_MEMBER_CONCURRENCY
+    return {
+        'buckets': report,
+        'calls': calls,
+        'seconds': slowest + latency,
+        'concurrency': concurrency,
+        'issues': restore_plan_issues(backup, steps, guild)
+    }
+
+class RestoreJob:
+    """Executa um plano de restauração em paralelo, mapeando IDs antigos para os novos objetos"""
+
+    def __init__(self, guild, backup_id: str, steps: List[Dict], reason: str,
+                 job_id: Optional[str] = None, meta: Optional[Dict] = None, results: Optional[Dict] = None):
+        self.guild = guild
+        self.backup_id = backup_id
+        self.steps = {step['key']: step for step in steps}
+        self.reason = reason
+        self.job_id = job_id  # Com ID, cada passo concluído vira um checkpoint persistido
+        self.meta = meta or {}
+        self.id_map = {}  # chave do passo -> ID do objeto novo
+        self.done = set()
+        self.failed = {}  # chave do passo -> erro
+        self.roles = {}  # ID -> cargo criado agora (o cache só recebe o cargo pelo gateway)
+        self.members_restored = 0
+        self.started = None
+        self.finished = None
+
+        # Objetos que já existem no servidor (modo diferencial) entram no mapa desde o início
+        for key, step in self.steps.items():
+            if step['action'] in ('keep', 'edit'):
+                self.id_map[key] = step['target_id']
+            if step['action'] == 'keep':
+                self.done.add(key)
+
+        # Retomada: o que já foi concluído não é refeito (falhas são tentadas de novo)
+        for key, result in (results or {}).items():
+            if key in self.steps and 'error' not in result:
+                if result.get('id'):
+                    self.id_map[key] = result['id']
+                self.done.add(key)
+        self.baseline = len(self.done)  # Concluídos antes desta execução (para o ETA)
+
+    @classmethod
+    def from_record(cls, guild, record: Dict) -> 'RestoreJob':
+        """Reconstrói um job persistido para retomá-lo"""
+        meta = {key: record.get(key) for key in RESTORE_JOB_META_KEYS}
+        return cls(guild, record['backup_id'], record['steps'], f"Restauração do backup {record['backup_id']} (retomada)",
+                   job_id=record['job_id'], meta=meta, results=record.get('results', {}))
+
+    def to_record(self) -> Dict:
+        """Forma persistida: metadados, plano e resultados por passo"""
+        now = datetime.utcnow().isoformat()
+        return {
+            'job_id': self.job_id,
+            'backup_id': self.backup_id,
+            **{key: self.meta.get(key) for key in RESTORE_JOB_META_KEYS},
+            'status': 'running',
+            'created_at': now,
+            'updated_at': now,
+            'steps': list(self.steps.values()),
+            'results': {}
+        }
+
+    @property
+    def total(self) -> int:
+        return len(self.steps)
+
+    @property
+    def completed(self) -> int:
+        return len(self.done) + len(self.failed)
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimativa pelo ritmo observado até agora (nesta execução)"""
+        progressed = self.completed - self.baseline
+        if progressed <= 0:
+            return None
+        return self.elapsed() / progressed * (self.total - self.completed)
+
+    def counts(self, kind: str, action: str = 'create') -> int:
+        return sum(1 for key in self.done if self.steps[key]['kind'] == kind and self.steps[key]['action'] == action)
+
+    async def run(self, concurrency: int = RESTORE_CONCURRENCY, on_progress=None):
+        """Cada passo espera só as suas dependências; passos independentes rodam juntos"""
+        self.started = time.monotonic()
+        semaphore = asyncio.Semaphore(concurrency)
+        finished = {key: asyncio.Event() for key in self.steps}
+
+        async def execute(key: str, step: Dict):
+            for dep in step['deps']:
+                if dep in finished:
+                    await finished[dep].wait()
+            if key not in self.done:
+                async with semaphore:
+                    try:
+                        await self._execute(key, step)
+                        self.done.add(key)
+                    except Exception as e:
+                        self.failed[key] = str(e)
+                        print(f"❌ Erro na restauração ({key}): {e}")
+                if self.job_id:
+                    if key in self.failed:
+                        result = {'error': self.failed[key]}
+                    else:
+                        result = {'id': self.id_map[key]} if key in self.id_map else {'ok': True}
+                    security_system.checkpoint_restore_step(self.guild.id, self.job_id, key, result)
+            finished[key].set()
+            if on_progress:
+                await on_progress(self)
+
+        await asyncio.gather(*(execute(key, step) for key, step in self.steps.items()))
+        self.finished = time.monotonic()
+
+    def _resolve_channel(self, key: Optional[str]):
+        if not key:
+            return None
+        new_id = self.id_map.get(key)
+        if new_id is None:
+            # A categoria original ainda existe no servidor?
+            old_id = key.split(':', 1)[1]
+            new_id = int(old_id) if old_id.isdigit() else None
+        return self.guild.get_channel(new_id) if new_id else None
+
+    async def _call(self, factory):
+        return await action_scheduler.run(PRIORITY_RECREATE, self.guild.id, factory)
+
+    async def _execute(self, key: str, step: Dict):
+        guild, reason = self.guild, self.reason
+        kind = step['kind']
+        record = step.get('record', {})
+
+        if step['action'] == 'edit':
+            await self._edit(step)
+
+        elif kind == 'role':
+            color = discord.Color(int(record['color'].replace('#', ''), 16)) if record.get('color', '#000000') != '#000000' else discord.Color.default()
+            role = await self._call(lambda: guild.create_role(
+                name=record['name'], permissions=discord.Permissions(record['permissions']), color=color,
+                hoist=record.get('hoist', False), mentionable=record.get('mentionable', True), reason=reason))
+            self.id_map[key] = role.id
+            self.roles[role.id] = role
+
+        elif kind == 'category':
+            overwrites = self._overwrites(record.get('overwrites'))
+            category = await self._call(lambda: guild.create_category(name=record['name'], overwrites=overwrites, reason=reason))
+            self.id_map[key] = category.id
+
+        elif kind == 'channel':
+            category = self._resolve_channel(step.get('parent'))
+            overwrites = self._overwrites(record.get('overwrites'))
+            channel_type = record['type']
+            if channel_type in ('text', 'news'):
+                factory = lambda: guild.create_text_channel(
+                    name=record['name'], category=category, news=channel_type == 'news', topic=record.get('topic'),
+                    slowmode_delay=record.get('slowmode_delay', 0), nsfw=record.get('nsfw', False),
+                    overwrites=overwrites, reason=reason)
+            elif channel_type == 'voice':
+                factory = lambda: guild.create_voice_channel(
+                    name=record['name'], category=category, bitrate=record.get('bitrate', 64000),
+                    user_limit=record.get('user_limit', 0), overwrites=overwrites, reason=reason)
+            elif channel_type == 'stage_voice':
+                factory = lambda: guild.create_stage_channel(name=record['name'], category=category, overwrites=overwrites, reason=reason)
+            else:
+                topic = {'topic': record['topic']} if record.get('topic') else {}
+                factory = lambda: guild.create_forum(name=record['name'], category=category, overwrites=overwrites, reason=reason, **topic)
+            channel = await self._call(factory)
+            self.id_map[key] = channel.id
+
+        elif kind == 'channel_positions':
+            # Só o que está fora do lugar
+            positions = {}
+            for dep in step['deps']:
+                channel = guild.get_channel(self.id_map.get(dep, 0))
+                position = self.steps[dep]['record']['position']
+                if channel is not None and channel.position != position:
+                    positions[channel] = position
+            if positions:
+                await self._call(lambda: edit_channel_positions(guild, positions, reason=reason))
+
+        elif kind == 'role_positions':
+            # Cargos novos não podem passar do cargo mais alto do bot
+            positions = {}
+            for dep in step['deps']:
+                role_id = self.id_map.get(dep, 0)
+                role = guild.get_role(role_id) or self.roles.get(role_id)  # Recém-criado pode não estar no cache
+                position = clamp_role_position(guild, self.steps[dep]['record']['position'])
+                if role is not None and role.position != position:
+                    positions[role] = position
+            if positions:
+                await self._call(lambda: guild.edit_role_positions(positions, reason=reason))
+
+        elif kind == 'member_roles':
+            await self._assign_member_roles(step)
+
+    def _overwrites(self, packed: Optional[str]) -> Dict:
+        """Sobrescritas do backup com os IDs novos dos cargos (alvos que sumiram ficam de fora)"""
+        guild = self.guild
+        overwrites = {}
+        for target_id, target_type, allow, deny in unpack_overwrites(packed):
+            if target_type == 0:
+                role_id = self.id_map.get(f"role:{target_id}", target_id)
+                target = guild.get_role(role_id) or self.roles.get(role_id)
+            else:
+                target = guild.get_member(target_id) or discord.Object(target_id)
+            if target is not None:
+                overwrites[target] = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+        return overwrites
+
+    async def _assign_member_roles(self, step: Dict):
+        """Devolve os cargos aos membros: uma chamada por membro, poucas por vez e em prioridade baixa"""
+        guild = self.guild
+        missing = member_role_targets(step['record']['roles'], guild, self.id_map)
+        pending = iter(missing.items())
+        failures = 0
+
+        async def worker():
+            nonlocal failures
+            for member_id, role_ids in pending:
+                # Confere de novo na hora: o membro pode ter saído ou recebido os cargos enquanto isso
+                member = guild.get_member(member_id)
+                if member is None:
+                    continue
+                current = member_role_ids(member)
+                roles = [discord.Object(role_id) for role_id in role_ids if role_id not in current]
+                if not roles:
+                    continue
+                try:
+                    await action_scheduler.run(PRIORITY_BULK, guild.id, lambda: member.add_roles(
+                        *roles, reason=self.reason, atomic=False))
+                    self.members_restored += 1
+                except Exception as e:
+                    failures += 1
+                    print(f"❌ Erro ao devolver cargos a {member_id}: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(RESTORE_MEMBER_CONCURRENCY)))
+        if failures:
+            raise Exception(f"{failures} de {len(missing)} membros ficaram sem os cargos")
+
+    async def _edit(self, step: Dict):
+        """Aplica só os campos que mudaram em um cargo/canal que ainda existe"""
+        guild, changes = self.guild, dict(step['changes'])
+        if step['kind'] == 'role':
+            target = guild.get_role(step['target_id'])
+            if 'permissions' in changes:
+                changes['permissions'] = discord.Permissions(changes['permissions'])
+            if 'color' in changes:
+                changes['color'] = discord.Color(int(changes['color'].replace('#', ''), 16))
+        else:
+            target = guild.get_channel(step['target_id'])
+            if 'category' in changes:
+                changes['category'] = self._resolve_channel(changes['category'])
+            if 'overwrites' in changes:
+                changes['overwrites'] = self._overwrites(step['record'].get('overwrites'))
+        if target is None:
+            raise Exception(f"{step['key']} não existe mais no servidor")
+        await self._call(lambda: target.edit(reason=self.reason, **changes))
+
+LOG_EMBEDS_PER_MESSAGE = 10  # Limite do Discord por mensagem
+LOG_EMBED_CHARS_PER_MESSAGE = 6000  # Limite do Discord para o total de texto das embeds
+LOG_MESSAGES_PER_WINDOW = 5  # Rate limit do canal: 5 mensagens...
+LOG_RATE_WINDOW = 5.0  # ...a cada 5 segundos
+LOG_SUMMARIZE_DEPTH = 30  # Com a fila acima disso, logs de baixa severidade viram um resumo
+
+class LogDispatcher:
+    """Fila de logs por canal com envio em segundo plano, várias embeds por mensagem"""
+
+    def __init__(self):
+        self.queues = {}  # channel_id -> deque[(embed, time.monotonic())]
+        self.summaries = {}  # channel_id -> {título: quantidade} dos logs resumidos
+        self.senders = {}  # channel_id -> tarefa de envio
+        self.stats = {'sent_messages': 0, 'sent_embeds': 0, 'summarized': 0, 'failed': 0, 'last_lag_ms': 0.0}
+
+    def depth(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def oldest_lag_ms(self) -> float:
+        """Há quanto tempo o log mais antigo da fila está esperando"""
+        now = time.monotonic()
+        return max(((now - queue[0][1]) * 1000 for queue in self.queues.values() if queue), default=0.0)
+
+    def submit(self, channel, embed: discord.Embed, low_severity: bool = False):
+        """Enfileira sem bloquear; sob sobrecarga, logs de baixa severidade são resumidos"""
+        queue = self.queues.setdefault(channel.id, deque())
+        if low_severity and len(queue) >= LOG_SUMMARIZE_DEPTH:
+            summary = self.summaries.setdefault(channel.id, {})
+            summary[embed.title] = summary.get(embed.title, 0) + 1
+            self.stats['summarized'] += 1
+        else:
+            queue.append((embed, time.monotonic()))
+
+        if channel.id not in self.senders:
+            self.senders[channel.id] = asyncio.create_task(self._sender(channel))
+
+    def _summary_embed(self, channel_id: int) -> Optional[discord.Embed]:
+        summary = self.summaries.pop(channel_id, None)
+        if not summary:
+            return None
+        lines = [f"• {title} ×{count}" for title, count in sorted(summary.items(), key=lambda x: -x[1])]
+        return discord.Embed(
+            title="📦 Logs resumidos (fila sobrecarregada)",
+            description='\n'.join(lines)[:4000],
+            color=COLORS['info'],
+            timestamp=datetime.utcnow()
+        )
+
+    async def _sender(self, channel):
+        queue = self.queues[channel.id]
+        sent_at = deque()  # Envios dentro da janela do rate limit
+        try:
+            while queue or self.summaries.get(channel.id):
+                # Ritmo do canal: no máximo LOG_MESSAGES_PER_WINDOW por janela
+                now = time.monotonic()
+                while sent_at and now - sent_at[0] >= LOG_RATE_WINDOW:
+                    sent_at.popleft()
+                if len(sent_at) >= LOG_MESSAGES_PER_WINDOW:
+                    await asyncio.sleep(LOG_RATE_WINDOW - (now - sent_at[0]))
+                    continue
+
+                embeds, chars, oldest = [], 0, None
+                while queue and len(embeds) < LOG_EMBEDS_PER_MESSAGE:
+                    embed, enqueued = queue[0]
+                    if embeds and chars + len(embed) > LOG_EMBED_CHARS_PER_MESSAGE:
+                        break
+                    queue.popleft()
+                    embeds.append(embed)
+                    chars += len(embed)
+                    oldest = enqueued if oldest is None else oldest
+                if len(embeds) < LOG_EMBEDS_PER_MESSAGE:
+                    summary = self._summary_embed(channel.id)
+                    if summary:
+                        embeds.append(summary)
+
+                sent_at.append(time.monotonic())
+                try:
+                    await action_scheduler.run(PRIORITY_LOG, channel.guild.id, lambda: channel.send(embeds=embeds))
+                    self.stats['sent_messages'] += 1
+                    self.stats['sent_embeds'] += len(embeds)
+                    if oldest is not None:
+                        self.stats['last_lag_ms'] = (time.monotonic() - oldest) * 1000
+                except Exception as e:
+                    self.stats['failed'] += len(embeds)
+                    print(f"❌ Erro ao enviar log de segurança: {e}")
+        finally:
+            del self.senders[channel.id]
+
+def create_storage(mode: str = STORAGE_MODE):
+    """Cria o backend de armazenamento configurado"""
+    if mode == 'journal':
+        return JournalStorage()
+    if mode == 'sharded':
+        return ShardedStorage()
+    if mode == 'sqlite':
+        return SQLiteStorage()
+    if mode != 'json':
+        print(f"⚠️ Modo de armazenamento desconhecido '{mode}', usando 'json'")
+    return JsonStorage()
+
 class SecurityBot:
     def __init__(self):
-        self.guild_configs = {}  # Configurações por servidor
+        self.guild_configs = {}  # Configurações por servidor (forma persistida)
+        self.config_cache = {}  # guild_id -> GuildConfig materializada (nova versão a cada edição)
         self.restored_roles = {}  # Para armazenar cargos removidos
         self.security_logs = {}  # Logs por servidor
         self.user_warnings = {}  # Avisos por usuário
-        self.spam_tracker = {}  # Rastreamento de spam
+        self.spam_tracker = RateTracker()  # Rastreamento de spam
         self.backup_data = {}  # Backups de canais/cargos
-        self.ban_tracker = {}  # Rastreamento de banimentos por usuário/bot
+        self.ban_tracker = {}  # Rastreamento de banimentos por usuário/bot (forma persistida)
+        self.ban_windows = {}  # Janelas vivas por servidor/executor (BanWindow)
+        self._dirty_ban_windows = set()  # (servidor, executor) a serializar na próxima gravação
         self.bot_activity_logs = {}  # Logs de atividade de bots
+        self.restore_jobs = {}  # Restaurações de backup com checkpoint (plano + resultados por passo)
+        self.active_restores = {}  # job_id -> RestoreJob em execução neste processo
+
+        self.storage = create_storage()
+        self.pending_changes = []  # Mutações ainda não gravadas no diário
+        self._storage_lock = asyncio.Lock()
+        self._background_tasks = []
+        self._loaded_guilds = set()  # Servidores já lidos do disco (modo 'sharded')
+
+        # Write-behind: handlers apenas marcam o estado como sujo
+        self.dirty = False
+        self.dirty_bytes = 0
+        self.persist_stats = {'saves_requested': 0, 'saves_performed': 0, 'bytes_written': 0, 'last_blocked_ms': 0.0}
+        self._dirty_event = asyncio.Event()
+        self._threshold_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._last_flush = 0.0
+
+    def _state_dict(self) -> Dict:
+        return {section: getattr(self, section) for section in PERSISTED_SECTIONS}
+
+    def record_change(self, op: str, path: List, value=None, limit: Optional[int] = None, guild_id=None,
+                      schedule: bool = True):
+        """Registra uma mutação do estado (já aplicada em memória) para o diário"""
+        change = {'op': op, 'path': [str(part) for part in path]}
+        if op != 'del':
+            change['value'] = value
+        if limit:
+            change['limit'] = limit
+        if guild_id is not None:
+            change['guild'] = str(guild_id)
+
+        # Nunca grava por cima de um servidor que ainda não foi lido do disco
+        shard_guild = change_guild_id(change)
+        if shard_guild is not None:
+            self.ensure_guild_loaded(shard_guild)
+
+        self.pending_changes.append(change)
+        if schedule:
+            self.mark_dirty(len(json.dumps(value, ensure_ascii=False)) if op != 'del' else 0)
+
+    def mark_dirty(self, nbytes: int = 0):
+        """Agenda uma gravação; o agendador junta várias marcações em uma só escrita"""
+        self.dirty = True
+        self.dirty_bytes += nbytes
+        self.persist_stats['saves_requested'] += 1
+        self._dirty_event.set()
+        if self.dirty_bytes >= PERSIST_DIRTY_BYTES_THRESHOLD:
+            self._threshold_event.set()
+
+    async def flush(self):
+        """Grava agora tudo o que está pendente (para comandos que precisam de durabilidade)"""
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.dirty_bytes = 0
+            self._dirty_event.clear()
+            self._threshold_event.clear()
+
+            written = await self.save_data()
+            self._last_flush = asyncio.get_running_loop().time()
+            self.persist_stats['saves_performed'] += 1
+            self.persist_stats['bytes_written'] += written
+
+    async def _persistence_loop(self):
+        """Tarefa única que grava o estado sujo no máximo a cada PERSIST_FLUSH_INTERVAL_MS"""
+        loop = asyncio.get_running_loop()
+        interval = PERSIST_FLUSH_INTERVAL_MS / 1000
+        try:
+            while True:
+                await self._dirty_event.wait()
+
+                delay = self._last_flush + interval - loop.time()
+                if delay > 0 and self.dirty_bytes < PERSIST_DIRTY_BYTES_THRESHOLD:
+                    try:
+                        await asyncio.wait_for(self._threshold_event.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+
+                await self.flush()
+        except asyncio.CancelledError:
+            # Desligamento: não perde o que ainda estava pendente
+            await self.flush()
+            print(f"💾 Dados salvos no desligamento ({self.persist_stats['bytes_written']} bytes gravados na sessão)")
+            raise
 
     async def load_data(self):
         """Carrega dados de segurança salvos"""
         try:
-            if os.path.exists(SECURITY_DATA_FILE):
-                async with aiofiles.open(SECURITY_DATA_FILE, 'r', encoding='utf-8') as f:
-                    content = await f.read()
-                    data = json.loads(content)
-                    self.guild_configs = data.get('guild_configs', {})
-                    self.restored_roles = data.get('restored_roles', {})
-                    self.security_logs = data.get('security_logs', {})
-                    self.user_warnings = data.get('user_warnings', {})
-                    self.backup_data = data.get('backup_data', {})
-                    self.ban_tracker = data.get('ban_tracker', {})
-                    self.bot_activity_logs = data.get('bot_activity_logs', {})
+            async with self._storage_lock:
+                data = await self.storage.load()
+                for section in PERSISTED_SECTIONS:
+                    setattr(self, section, data.get(section, {}))
+                self.pending_changes = []
+                self.config_cache = {}
+                self.ban_windows = {}
+                self._dirty_ban_windows = set()
+                self._loaded_guilds = set(self.guild_configs.keys()) if not self.storage.lazy else set(self.storage.migrated_guilds)
+
+                # Consolida o diário lido para começar com um arquivo limpo
+                if STORAGE_MODE == 'journal' and self.storage.journal_bytes:
+                    await self.storage.compact(self._state_dict())
         except Exception as e:
             print(f"❌ Erro ao carregar dados de segurança: {e}")
 
-    async def save_data(self):
-        """Salva dados de segurança"""
+    async def save_data(self) -> int:
+        """Salva dados de segurança e retorna os bytes gravados"""
+        async with self._storage_lock:
+            self._sync_ban_tracker()
+            changes, self.pending_changes = self.pending_changes, []
+            try:
+                written = await self.storage.save(self._state_dict(), changes)
+                blocked_ms = self.storage.blocked_ms
+                if self.storage.needs_compaction():
+                    written += await self.storage.compact(self._state_dict())
+                    blocked_ms += self.storage.blocked_ms
+                # Sem print: o write-behind grava a cada poucos segundos; fica no !sec_status
+                self.persist_stats['last_blocked_ms'] = blocked_ms
+                return written
+            except Exception as e:
+                # Devolve as mutações e remarca como sujo para nova tentativa
+                self.pending_changes[:0] = changes
+                self.dirty = True
+                self._dirty_event.set()
+                print(f"❌ Erro ao salvar dados de segurança: {e}")
+                return 0
+
+    async def compact_storage(self):
+        """Compacta o diário em um snapshot completo"""
+        async with self._storage_lock:
+            try:
+                await self.storage.compact(self._state_dict())
+            except Exception as e:
+                print(f"❌ Erro ao compactar dados de segurança: {e}")
+
+    def start_background_tasks(self):
+        """Inicia as tarefas de manutenção do armazenamento (apenas uma vez)"""
+        if self._background_tasks:
+            return
+        self._background_tasks.append(asyncio.create_task(self._persistence_loop()))
+        self._background_tasks.append(asyncio.create_task(self._spam_sweep_loop()))
+        if STORAGE_MODE == 'journal':
+            self._background_tasks.append(asyncio.create_task(self._journal_compaction_loop()))
+
+    async def _spam_sweep_loop(self):
+        while True:
+            await asyncio.sleep(SPAM_SWEEP_INTERVAL)
+            self.spam_tracker.sweep()
+
+    async def _journal_compaction_loop(self):
+        while True:
+            await asyncio.sleep(JOURNAL_COMPACT_INTERVAL)
+            if self.storage.journal_bytes:
+                await self.compact_storage()
+
+    def ensure_guild_loaded(self, guild_id):
+        """Carrega sob demanda os dados de um servidor (modo 'sharded')"""
+        guild_id_str = str(guild_id)
+        if not self.storage.lazy or guild_id_str in self._loaded_guilds:
+            return
+        self._loaded_guilds.add(guild_id_str)
+
         try:
-            data = {
-                'guild_configs': self.guild_configs,
-                'restored_roles': self.restored_roles,
-                'security_logs': self.security_logs,
-                'user_warnings': self.user_warnings,
-                'backup_data': self.backup_data,
-                'ban_tracker': self.ban_tracker,
-                'bot_activity_logs': self.bot_activity_logs
-            }
-            async with aiofiles.open(SECURITY_DATA_FILE, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(data, indent=2, ensure_ascii=False))
+            data = self.storage.load_guild(guild_id_str)
         except Exception as e:
-            print(f"❌ Erro ao salvar dados de segurança: {e}")
+            print(f"❌ Erro ao carregar dados do servidor {guild_id_str}: {e}")
+            return
+        print(f"⚠️ Servidor {guild_id_str} carregado no loop (não foi pré-carregado)")
+        self._merge_guild_data(guild_id_str, data)
+
+    async def preload_guilds(self, guild_ids):
+        """Lê os arquivos dos servidores em threads, antes que um evento precise deles"""
+        if not self.storage.lazy:
+            return
+
+        async def preload(guild_id_str: str):
+            if guild_id_str in self._loaded_guilds:
+                return
+            try:
+                data = await asyncio.to_thread(self.storage.load_guild, guild_id_str)
+            except Exception as e:
+                print(f"❌ Erro ao carregar dados do servidor {guild_id_str}: {e}")
+                return
+            # Um evento pode ter carregado o servidor pelo caminho síncrono enquanto isso
+            if guild_id_str not in self._loaded_guilds:
+                self._loaded_guilds.add(guild_id_str)
+                self._merge_guild_data(guild_id_str, data)
+
+        await asyncio.gather(*(preload(str(guild_id)) for guild_id in guild_ids))
+
+    def _merge_guild_data(self, guild_id_str: str, data: Dict):
+        # Mescla com o que já estiver em memória (o que está em memória é mais novo)
+        for section, value in data.items():
+            if section == 'restored_roles':
+                for user_id, entry in value.items():
+                    self.restored_roles.setdefault(user_id, entry)
+                continue
+            target = getattr(self, section)
+            current = target.get(guild_id_str)
+            if current is None:
+                target[guild_id_str] = value
+            elif isinstance(value, list):
+                target[guild_id_str] = value + current
+            elif isinstance(value, dict):
+                target[guild_id_str] = {**value, **current}
+
+    def get_guild_config(self, guild_id: int) -> GuildConfig:
+        """Obtém configuração do servidor (materializada uma vez por versão)"""
+        config = self.config_cache.get(guild_id)
+        if config is not None:
+            return config
+
+        self.ensure_guild_loaded(guild_id)
+        raw = self.guild_configs.setdefault(str(guild_id), {})
+        # Merge any missing keys from DEFAULT_CONFIG; registradas para o diário/SQLite verem o
+        # mesmo estado da memória, mas sem agendar gravação só por ter lido a configuração
+        for key, value in DEFAULT_CONFIG.items():
+            if key not in raw:
+                raw[key] = list(value) if isinstance(value, list) else value
+                self.record_change('set', ['guild_configs', guild_id, key], raw[key], schedule=False)
+        config = self.config_cache[guild_id] = GuildConfig(raw)
+        return config
+
+    def update_guild_config(self, guild_id: int, **changes) -> GuildConfig:
+        """Cria uma nova versão da configuração e registra as chaves alteradas"""
+        config = self.get_guild_config(guild_id).replace(**changes)
+        self.config_cache[guild_id] = config
+
+        raw = self.guild_configs[str(guild_id)]
+        persisted = config.to_dict()
+        for key in changes:
+            raw[key] = persisted[key]
+            self.record_change('set', ['guild_configs', guild_id, key], persisted[key])
+        return config
+
+    def guild_restore_jobs(self, guild_id) -> Dict[str, Dict]:
+        self.ensure_guild_loaded(guild_id)
+        return self.restore_jobs.get(str(guild_id), {})
+
+    def save_restore_job(self, guild_id, record: Dict, keep: int = RESTORE_JOBS_KEEP):
+        """Grava o plano de um job novo e descarta os jobs concluídos mais antigos"""
+        guild_id_str = str(guild_id)
+        jobs = self.guild_restore_jobs(guild_id_str)
+        self.restore_jobs[guild_id_str] = jobs
+        jobs[record['job_id']] = record
+        self.record_change('set', ['restore_jobs', guild_id_str, record['job_id']], record)
+
+        finished = [job_id for job_id, job in jobs.items() if job['status'] == 'done']
+        for job_id in finished[:max(0, len(finished) - keep)]:
+            del jobs[job_id]
+            self.record_change('del', ['restore_jobs', guild_id_str, job_id])
+
+    def checkpoint_restore_step(self, guild_id, job_id: str, step_key: str, result: Dict):
+        """Registra o resultado de um passo (só essa entrada vai para o diário)"""
+        guild_id_str = str(guild_id)
+        job = self.restore_jobs.get(guild_id_str, {}).get(job_id)
+        if job is None:
+            return
+        job['results'][step_key] = result
+        self.record_change('set', ['restore_jobs', guild_id_str, job_id, 'results', step_key], result)
 
-    def get_guild_config(self, guild_id: int):
-        """Obtém configuração do servidor"""
+    def set_restore_job_status(self, guild_id, job_id: str, status: str):
         guild_id_str = str(guild_id)
-        if guild_id_str not in self.guild_configs:
-            self.guild_configs[guild_id_str] = DEFAULT_CONFIG.copy()
-        else:
-            # Merge any missing keys from DEFAULT_CONFIG
-            for key, value in DEFAULT_CONFIG.items():
-                if key not in self.guild_configs[guild_id_str]:
-                    self.guild_configs[guild_id_str][key] = value
-        return self.guild_configs[guild_id_str]
+        job = self.restore_jobs.get(guild_id_str, {}).get(job_id)
+        if job is None:
+            return
+        job['status'] = status
+        job['updated_at'] = datetime.utcnow().isoformat()
+        self.record_change('set', ['restore_jobs', guild_id_str, job_id, 'status'], status)
+        self.record_change('set', ['restore_jobs', guild_id_str, job_id, 'updated_at'], job['updated_at'])
+
+    def expand_backup(self, guild_id, backup: Dict) -> Dict:
+        """Reconstrói um backup completo a partir do manifesto (backups antigos já vêm completos)"""
+        if not backup.get('manifest'):
+            return backup
+        objects = self.backup_data.get(str(guild_id), {}).get('objects', {})
+        expanded = {key: value for key, value in backup.items() if key != 'manifest'}
+        for kind in BACKUP_RECORD_KINDS:
+            # Objeto ausente vira registro vazio, que a verificação acusa
+            expanded[kind] = [objects.get(digest, {}) for digest in backup.get(kind, [])]
+        return expanded
+
+    def find_full_backup(self, guild_id, backup_id: str, expand: bool = True) -> Optional[Dict]:
+        """Procura um backup completo pelo ID e o devolve já reconstruído"""
+        for backup in self.backup_data.get(str(guild_id), {}).get('full_backups', []):
+            if backup.get('backup_id', '').upper() == backup_id.upper():
+                return self.expand_backup(guild_id, backup) if expand else backup
+        return None
+
+    def check_backup_integrity(self, guild_id, manifest: Dict) -> List[str]:
+        """Confere o checksum do manifesto e o hash de cada objeto referenciado"""
+        if not manifest.get('manifest'):
+            return []
+        issues = []
+        if backup_checksum(manifest) != manifest.get('checksum'):
+            issues.append("❌ Checksum do manifesto não confere")
+        objects = self.backup_data.get(str(guild_id), {}).get('objects', {})
+        for kind in BACKUP_RECORD_KINDS:
+            for digest in manifest.get(kind, []):
+                if digest not in objects:
+                    issues.append(f"❌ Objeto ausente ({kind}): {digest[:12]}")
+                elif content_hash(objects[digest]) != digest:
+                    issues.append(f"❌ Objeto corrompido ({kind}): {digest[:12]}")
+        return issues
+
+    async def verify_persisted_backup(self, guild_id, manifest: Dict, new_hashes: List[str]):
+        """Confirma no disco o manifesto e os objetos recém-gravados de um backup"""
+        persisted, objects = await self.storage.read_backup(str(guild_id), manifest['backup_id'], new_hashes)
+        if not persisted:
+            raise Exception("Backup não foi encontrado após salvamento")
+        if persisted.get('checksum') != manifest['checksum'] or backup_checksum(persisted) != manifest['checksum']:
+            raise Exception("Checksum do backup gravado não confere")
+        # Objetos já existentes foram conferidos quando foram gravados
+        for digest in new_hashes:
+            if digest not in objects or content_hash(objects[digest]) != digest:
+                raise Exception(f"Objeto {digest[:12]} não confere no disco")
+
+    def store_full_backup(self, guild_id, manifest: Dict, objects: Dict[str, Dict], keep: int = 10) -> List[str]:
+        """Grava o manifesto, só os objetos novos, e remove os que nenhum backup usa mais"""
+        guild_id_str = str(guild_id)
+        bucket = self.backup_data[guild_id_str]
+        stored = bucket.setdefault('objects', {})
+
+        new_objects = []
+        for digest, record in objects.items():
+            if digest not in stored:
+                stored[digest] = record
+                self.record_change('set', ['backup_data', guild_id_str, 'objects', digest], record)
+                new_objects.append(digest)
+
+        bucket.setdefault('full_backups', []).append(manifest)
+        bucket['full_backups'] = bucket['full_backups'][-keep:]
+        self.record_change('push', ['backup_data', guild_id_str, 'full_backups'], manifest, limit=keep)
+
+        referenced = set()
+        for backup in bucket['full_backups']:
+            if backup.get('manifest'):
+                for kind in BACKUP_RECORD_KINDS:
+                    referenced.update(backup.get(kind, []))
+        for digest in [digest for digest in stored if digest not in referenced]:
+            del stored[digest]
+            self.record_change('del', ['backup_data', guild_id_str, 'objects', digest])
+        return new_objects
+
+    async def get_recent_logs(self, guild_id, limit: int) -> List[Dict]:
+        """Últimos logs do servidor (consulta indexada no modo 'sqlite')"""
+        guild_id_str = str(guild_id)
+        if isinstance(self.storage, SQLiteStorage):
+            await self.flush()
+            return await self.storage.fetch_logs(guild_id_str, limit)
+        return self.security_logs.get(guild_id_str, [])[-limit:]
+
+    async def get_user_warnings(self, guild_id, user_id, limit: int = 10):
+        """Últimos avisos de um usuário e o total deles"""
+        guild_id_str, user_id_str = str(guild_id), str(user_id)
+        if isinstance(self.storage, SQLiteStorage):
+            await self.flush()
+            return await self.storage.fetch_warnings(guild_id_str, user_id_str, limit)
+        warnings = self.user_warnings.get(guild_id_str, {}).get(user_id_str, [])
+        return warnings[-limit:], len(warnings)
+
+    def get_ban_window(self, guild_id, user_id) -> Optional[BanWindow]:
+        """Janela de banimentos do executor (montada do formato persistido na primeira vez)"""
+        guild_id_str, user_id_str = str(guild_id), str(user_id)
+        windows = self.ban_windows.setdefault(guild_id_str, {})
+        window = windows.get(user_id_str)
+        if window is None:
+            records = self.ban_tracker.get(guild_id_str, {}).get(user_id_str)
+            if records is None:
+                return None
+            window = windows[user_id_str] = BanWindow.from_records(records)
+        return window
+
+    def _sync_ban_tracker(self):
+        """Serializa só as janelas alteradas desde a última gravação"""
+        for guild_id_str, user_id_str in self._dirty_ban_windows:
+            window = self.ban_windows.get(guild_id_str, {}).get(user_id_str)
+            if window is not None:
+                self.ban_tracker.setdefault(guild_id_str, {})[user_id_str] = window.to_records()
+                self.record_change('set', ['ban_tracker', guild_id_str, user_id_str],
+                                   self.ban_tracker[guild_id_str][user_id_str], schedule=False)
+            elif self.ban_tracker.get(guild_id_str, {}).pop(user_id_str, None) is not None:
+                self.record_change('del', ['ban_tracker', guild_id_str, user_id_str], schedule=False)
+        self._dirty_ban_windows.clear()
+
+    async def get_ban_activity(self, guild_id, limit: int) -> List[Dict]:
+        """Executores com mais banimentos rastreados, do maior para o menor"""
+        guild_id_str = str(guild_id)
+        self.ensure_guild_loaded(guild_id_str)
+        executors = set(self.ban_tracker.get(guild_id_str, {})) | set(self.ban_windows.get(guild_id_str, {}))
+
+        activity = []
+        for user_id in executors:
+            window = self.get_ban_window(guild_id_str, user_id)
+            if window:
+                activity.append({
+                    'user_id': user_id,
+                    'count': len(window),
+                    'recent': window.last_timestamp(),
+                    'is_bot': window.is_bot
+                })
+        activity.sort(key=lambda x: x['count'], reverse=True)
+        return activity[:limit]
+
+    async def storage_report(self) -> Dict:
+        """Tamanho em disco e tamanho do estado no codec atual vs JSON"""
+        report = await run_serializer(measure_encoding, snapshot_state(self._state_dict()))
+        report['disk'] = self.storage.disk_usage()
+        report['codec'] = DATA_CODEC
+        return report
+
+    async def export_json(self) -> bytes:
+        """Estado completo no layout do security_data.json (para backup/importação)"""
+        if self.storage.lazy:
+            for guild_id in self.storage.guild_ids():
+                self.ensure_guild_loaded(guild_id)
+        return await run_serializer(lambda state: dump_json(state, 2).encode('utf-8'),
+                                    snapshot_state(self._state_dict()))
 
     async def get_logs_channel(self, guild):
         """Encontra o canal de logs configurado"""
         config = self.get_guild_config(guild.id)
-        if config['logs_channel_id']:
-            return guild.get_channel(config['logs_channel_id'])
+        if config.logs_channel_id:
+            return guild.get_channel(config.logs_channel_id)
         return None
 
     async def log_security_action(self, guild, title: str, description: str, color: int, fields: List[Dict] = None):
@@ -174,68 +3471,51 @@ class SecurityBot:
 
         embed.set_footer(text="Sistema de Segurança Automático")
 
-        try:
-            await logs_channel.send(embed=embed)
+        # Entrega em segundo plano: o handler não espera o envio nem o rate limit
+        log_dispatcher.submit(logs_channel, embed, low_severity=color in (COLORS['success'], COLORS['info']))
 
-            # Salva no histórico
-            guild_id_str = str(guild.id)
-            if guild_id_str not in self.security_logs:
-                self.security_logs[guild_id_str] = []
-
-            log_entry = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'title': title,
-                'description': description
-            }
-            self.security_logs[guild_id_str].append(log_entry)
-
-            # Mantém apenas os últimos logs
-            config = self.get_guild_config(guild.id)
-            max_logs = config['max_logs_history']
-            self.security_logs[guild_id_str] = self.security_logs[guild_id_str][-max_logs:]
+        # Salva no histórico
+        guild_id_str = str(guild.id)
+        if guild_id_str not in self.security_logs:
+            self.security_logs[guild_id_str] = []
 
-            await self.save_data()
+        log_entry = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'title': title,
+            'description': description
+        }
+        self.security_logs[guild_id_str].append(log_entry)
 
-        except Exception as e:
-            print(f"❌ Erro ao enviar log de segurança: {e}")
+        # Mantém apenas os últimos logs
+        config = self.get_guild_config(guild.id)
+        max_logs = config.max_logs_history
+        self.security_logs[guild_id_str] = self.security_logs[guild_id_str][-max_logs:]
+        self.record_change('push', ['security_logs', guild_id_str], log_entry, limit=max_logs)
 
     async def track_ban_activity(self, guild, user_or_bot, target):
         """Rastreia atividade de banimentos para detectar ações suspeitas"""
         guild_id_str = str(guild.id)
         user_id_str = str(user_or_bot.id)
-        now = datetime.utcnow()
-
-        # Inicializa rastreamento se necessário
-        if guild_id_str not in self.ban_tracker:
-            self.ban_tracker[guild_id_str] = {}
-        
-        if user_id_str not in self.ban_tracker[guild_id_str]:
-            self.ban_tracker[guild_id_str][user_id_str] = []
-
-        # Adiciona o banimento atual
-        ban_entry = {
-            'timestamp': now.isoformat(),
-            'target_id': target.id,
-            'target_name': str(target),
-            'is_bot': user_or_bot.bot
-        }
-        self.ban_tracker[guild_id_str][user_id_str].append(ban_entry)
-
-        # Remove banimentos antigos (fora do timeframe)
         config = self.get_guild_config(guild.id)
-        timeframe_minutes = config.get('ban_timeframe_minutes', 10)
-        cutoff_time = now - timedelta(minutes=timeframe_minutes)
 
-        self.ban_tracker[guild_id_str][user_id_str] = [
-            ban for ban in self.ban_tracker[guild_id_str][user_id_str]
-            if datetime.fromisoformat(ban['timestamp']) > cutoff_time
-        ]
+        # Adiciona o banimento atual e remove os antigos (fora do timeframe)
+        window = self.get_ban_window(guild_id_str, user_id_str)
+        if window is None:
+            window = self.ban_windows[guild_id_str][user_id_str] = BanWindow(user_or_bot.bot)
+        now = time.monotonic()
+        window.add(target.id, str(target), now)
+        timeframe_minutes = config.ban_timeframe_minutes
+        window.prune(timeframe_minutes * 60, now)
+
+        # Serializado só na próxima gravação, uma vez por executor
+        self._dirty_ban_windows.add((guild_id_str, user_id_str))
+        self.mark_dirty(64)
 
         # Verifica se excedeu o limite
-        max_bans = config.get('max_bans_per_timeframe', 4)
-        recent_bans = len(self.ban_tracker[guild_id_str][user_id_str])
+        max_bans = config.max_bans_per_timeframe
+        recent_bans = len(window)
 
-        if recent_bans >= max_bans and config.get('auto_ban_mass_banner', True):
+        if recent_bans >= max_bans and config.auto_ban_mass_banner:
             # 👑 OWNER DO BOT É INTOCÁVEL
             if user_or_bot.id == OWNER_ID:
                 await self.log_security_action(
@@ -247,7 +3527,7 @@ class SecurityBot:
                 return
 
             # Verifica whitelist
-            if user_or_bot.id in config.get('whitelist_users', []):
+            if user_or_bot.id in config.whitelist_users:
                 await self.log_security_action(
                     guild,
                     "🚨 BANIMENTOS EM MASSA DETECTADOS - Usuário Autorizado",
@@ -262,11 +3542,11 @@ class SecurityBot:
                 
                 if user_or_bot.bot:
                     # Se for um bot, tenta bani-lo
-                    await user_or_bot.ban(reason=reason)
+                    await bulk_ban_queue.ban(guild, user_or_bot, reason=reason)
                     bot_type = "🤖 BOT"
                 else:
                     # Se for usuário, tenta banir
-                    await user_or_bot.ban(reason=reason)
+                    await bulk_ban_queue.ban(guild, user_or_bot, reason=reason)
                     bot_type = "👤 USUÁRIO"
 
                 await self.log_security_action(
@@ -281,9 +3561,12 @@ class SecurityBot:
                     ]
                 )
 
-                # Limpa o rastreamento
-                del self.ban_tracker[guild_id_str][user_id_str]
-                await self.save_data()
+                # Limpa o rastreamento: janela e registros persistidos juntos, senão
+                # get_ban_window remontaria a janela antiga a partir do ban_tracker
+                self.ban_windows[guild_id_str].pop(user_id_str, None)
+                self._dirty_ban_windows.discard((guild_id_str, user_id_str))
+                if self.ban_tracker.get(guild_id_str, {}).pop(user_id_str, None) is not None:
+                    self.record_change('del', ['ban_tracker', guild_id_str, user_id_str])
 
             except Exception as e:
                 await self.log_security_action(
@@ -308,10 +3591,43 @@ class SecurityBot:
 # Instância global do sistema de segurança
 security_system = SecurityBot()
 
+# Fila priorizada das chamadas à API
+action_scheduler = ActionScheduler()
+
+# Envio dos logs em segundo plano
+log_dispatcher = LogDispatcher()
+
+# Índice das entradas de auditoria recebidas pelo gateway
+audit_correlator = AuditLogCorrelator()
+
+# Regras de mensagem compiladas por servidor
+message_rules = MessageRuleEngine()
+
+# Banimentos acumulados e enviados em lote
+bulk_ban_queue = BulkBanQueue()
+
+# Detecção de raids nas entradas
+raid_detector = JoinRaidDetector()
+
+# Punições coordenadas por executor
+punishment_coordinator = PunishmentCoordinator()
+
+# Recriação em lote de canais/cargos deletados
+recreation_engine = RecreationEngine()
+
+@bot.event
+async def on_guild_join(guild):
+    """Servidor novo (ou que voltou): carrega os dados dele fora do loop"""
+    await security_system.preload_guilds([guild.id])
+
 @bot.event
 async def on_ready():
-    """Evento executado quando o bot está pronto"""
-    await security_system.load_data()
+    """Evento executado quando o bot está pronto (também a cada reconexão)"""
+    if startup_timeline.finished:
+        # Reconexão: o estado em memória é o mais recente, não recarrega do disco
+        print(f"🔄 Reconectado ao gateway | SERVIDORES: {len(bot.guilds)}")
+        return
+    startup_timeline.mark('servidores prontos')
     
     # Status interessante e dinâmico
     activities = [
@@ -346,19 +3662,25 @@ async def on_ready():
     print("💎 OWNER DO BOT É COMPLETAMENTE INTOCÁVEL!")
     print("⚡ NENHUM COMANDO PODE AFETAR O DONO DO BOT!")
     print("🔥" + "=" * 60 + "🔥")
+    startup_timeline.report()
     
     # Atualiza status a cada 30 segundos
     async def update_status():
         while True:
             await asyncio.sleep(30)
             new_activity = random.choice(activities)
-            await bot.change_presence(
+            await action_scheduler.run(PRIORITY_COSMETIC, None, lambda: bot.change_presence(
                 status=discord.Status.online,
                 activity=new_activity
-            )
+            ))
     
     # Inicia task de atualização de status
-    bot.loop.create_task(update_status())
+    bot.status_task = asyncio.create_task(update_status())
+
+@bot.event
+async def on_audit_log_entry_create(entry):
+    """Entrega as entradas de auditoria aos detectores que estão esperando por elas"""
+    audit_correlator.feed(entry)
 
 @bot.event
 async def on_guild_channel_delete(channel):
@@ -367,14 +3689,15 @@ async def on_guild_channel_delete(channel):
         guild = channel.guild
         config = security_system.get_guild_config(guild.id)
 
-        if not config['protection_enabled']:
+        if not config.protection_enabled:
             return
 
         # Salva backup do canal
-        if config['backup_channels']:
+        if config.backup_channels:
             guild_id_str = str(guild.id)
             if guild_id_str not in security_system.backup_data:
                 security_system.backup_data[guild_id_str] = {'channels': [], 'roles': []}
+                security_system.record_change('set', ['backup_data', guild_id_str], {'channels': [], 'roles': []})
 
             channel_backup = {
                 'name': channel.name,
@@ -385,135 +3708,42 @@ async def on_guild_channel_delete(channel):
                 'deleted_at': datetime.utcnow().isoformat()
             }
             security_system.backup_data[guild_id_str]['channels'].append(channel_backup)
+            security_system.record_change('push', ['backup_data', guild_id_str, 'channels'], channel_backup)
 
-        await asyncio.sleep(config['audit_log_delay'])
-
-        async for entry in guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=1):
-            if entry.target.id == channel.id:
-                executor = entry.user
-
-                # 👑 OWNER E WHITELIST TÊM PROTEÇÃO TOTAL
-                if executor.id == OWNER_ID:
-                    await security_system.log_security_action(
-                        guild,
-                        "Canal Deletado - 👑 OWNER DO BOT",
-                        f"🟢 {executor.mention} (OWNER) deletou o canal #{channel.name} - ✅ **AUTORIZADO**",
-                        COLORS['success']
-                    )
-                    return
-                elif executor.id in config['whitelist_users']:
-                    await security_system.log_security_action(
-                        guild,
-                        "Canal Deletado - Usuário Autorizado",
-                        f"🟢 {executor.mention} deletou o canal #{channel.name}",
-                        COLORS['success']
-                    )
-                    return
-
-                # Verifica se é um bot e se deve ser banido
-                if executor.bot and config.get('auto_ban_bots_on_deletion', True):
-                    try:
-                        await executor.ban(reason=f"🔒 Bot deletou canal #{channel.name}")
-                        await security_system.log_security_action(
-                            guild,
-                            "🤖 BOT BANIDO - Deletou Canal",
-                            f"🚨 Bot {executor.mention} foi banido por deletar canal #{channel.name}",
-                            COLORS['danger'],
-                            [
-                                {'name': '📺 Canal', 'value': f"#{channel.name}", 'inline': True},
-                                {'name': '🤖 Bot', 'value': executor.mention, 'inline': True},
-                                {'name': '⚡ Ação', 'value': "Banimento automático", 'inline': True}
-                            ]
-                        )
-                        return
-                    except Exception as e:
-                        await security_system.log_security_action(
-                            guild,
-                            "❌ ERRO AO BANIR BOT",
-                            f"Falha ao banir bot {executor.mention}: {str(e)}",
-                            COLORS['danger']
-                        )
-
-                # Aplica punição para usuários
-                member = guild.get_member(executor.id)
-                punishment = config['channel_delete_punishment']
-                
-                if member:
-                    original_roles = [role for role in member.roles if role != guild.default_role]
-                    
-                    # Salva cargos antes de aplicar punição
-                    if original_roles and config.get('save_roles_before_kick', True):
-                        security_system.restored_roles[str(executor.id)] = {
-                            'roles': [role.id for role in original_roles],
-                            'removed_at': datetime.utcnow().isoformat(),
-                            'reason': f"Deletou canal #{channel.name}",
-                            'guild_id': guild.id
-                        }
-                    
-                    # Aplica punição baseada na configuração
-                    if config.get('use_kick_instead_remove_roles', False):
-                        try:
-                            await member.kick(reason=f"🔒 Segurança: Deletou canal #{channel.name}")
-                            punishment = "kick"
-                        except discord.Forbidden:
-                            # Se não tem permissão para kick, remove cargos
-                            try:
-                                await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou canal")
-                                punishment = "remove_roles (sem permissão para kick)"
-                            except:
-                                punishment = "falha (sem permissões)"
-                        except Exception as e:
-                            # Se falhar o kick por outro motivo, remove cargos como fallback
-                            try:
-                                await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou canal")
-                                punishment = "remove_roles (kick falhou)"
-                            except:
-                                punishment = "falha (erro geral)"
-                    elif punishment == 'remove_roles':
-                        try:
-                            await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou canal")
-                        except:
-                            punishment = "falha (sem permissões para remover cargos)"
-
-                # Recria o canal automaticamente se habilitado
-                recreated_channel = None
-                if config['auto_recreate_channels']:
-                    try:
-                        # Determina o tipo de canal
-                        if isinstance(channel, discord.TextChannel):
-                            recreated_channel = await guild.create_text_channel(
-                                name=channel.name,
-                                category=channel.category,
-                                position=channel.position,
-                                topic=channel.topic,
-                                reason=f"🔄 Recriação automática após deletação por {executor}"
-                            )
-                        elif isinstance(channel, discord.VoiceChannel):
-                            recreated_channel = await guild.create_voice_channel(
-                                name=channel.name,
-                                category=channel.category,
-                                position=channel.position,
-                                reason=f"🔄 Recriação automática após deletação por {executor}"
-                            )
-                    except Exception as e:
-                        print(f"❌ Erro ao recriar canal: {e}")
-
-                action_text = config['channel_delete_punishment']
-                if recreated_channel:
-                    action_text += f" + Canal recriado: {recreated_channel.mention}"
+        # Executor pelo evento do gateway; a API só é consultada se ele não chegar a tempo
+        entry = await audit_correlator.wait_for(guild, discord.AuditLogAction.channel_delete, channel.id, config.audit_log_delay)
+        if entry is not None:
+            executor = entry.user
 
+            # 👑 OWNER E WHITELIST TÊM PROTEÇÃO TOTAL
+            if executor.id == OWNER_ID:
                 await security_system.log_security_action(
                     guild,
-                    "🚨 CANAL DELETADO",
-                    f"⚠️ {executor.mention} deletou o canal #{channel.name}",
-                    COLORS['danger'],
-                    [
-                        {'name': '📺 Canal', 'value': f"#{channel.name}", 'inline': True},
-                        {'name': '👤 Responsável', 'value': executor.mention, 'inline': True},
-                        {'name': '⚡ Ação', 'value': action_text, 'inline': True}
-                    ]
+                    "Canal Deletado - 👑 OWNER DO BOT",
+                    f"🟢 {executor.mention} (OWNER) deletou o canal #{channel.name} - ✅ **AUTORIZADO**",
+                    COLORS['success']
                 )
-                break
+                return
+            elif executor.id in config.whitelist_users:
+                await security_system.log_security_action(
+                    guild,
+                    "Canal Deletado - Usuário Autorizado",
+                    f"🟢 {executor.mention} deletou o canal #{channel.name}",
+                    COLORS['success']
+                )
+                return
+
+            # Uma punição por executor: exclusões em rajada entram no mesmo incidente
+            incident = punishment_coordinator.open(guild, executor, config, 'channel', f"#{channel.name}")
+            recreated_channel = None
+            try:
+                await incident.punished.wait()
+
+                # Recria o canal automaticamente se habilitado (em lote com o resto do incidente)
+                if config.auto_recreate_channels and not incident.bot_banned:
+                    recreated_channel = await recreation_engine.recreate_channel(channel, executor)
+            finally:
+                punishment_coordinator.close(incident, recreated_channel.mention if recreated_channel else None)
     except Exception as e:
         print(f"❌ Erro no detector de exclusão de canais: {e}")
 
@@ -524,14 +3754,15 @@ async def on_guild_role_delete(role):
         guild = role.guild
         config = security_system.get_guild_config(guild.id)
 
-        if not config['protection_enabled']:
+        if not config.protection_enabled:
             return
 
         # Salva backup do cargo
-        if config['backup_roles']:
+        if config.backup_roles:
             guild_id_str = str(guild.id)
             if guild_id_str not in security_system.backup_data:
                 security_system.backup_data[guild_id_str] = {'channels': [], 'roles': []}
+                security_system.record_change('set', ['backup_data', guild_id_str], {'channels': [], 'roles': []})
 
             role_backup = {
                 'name': role.name,
@@ -541,137 +3772,42 @@ async def on_guild_role_delete(role):
                 'deleted_at': datetime.utcnow().isoformat()
             }
             security_system.backup_data[guild_id_str]['roles'].append(role_backup)
+            security_system.record_change('push', ['backup_data', guild_id_str, 'roles'], role_backup)
 
-        await asyncio.sleep(config['audit_log_delay'])
-
-        async for entry in guild.audit_logs(action=discord.AuditLogAction.role_delete, limit=1):
-            if entry.target.id == role.id:
-                executor = entry.user
-
-                # 👑 OWNER E WHITELIST TÊM PROTEÇÃO TOTAL
-                if executor.id == OWNER_ID:
-                    await security_system.log_security_action(
-                        guild,
-                        "Cargo Deletado - 👑 OWNER DO BOT",
-                        f"🟢 {executor.mention} (OWNER) deletou o cargo @{role.name} - ✅ **AUTORIZADO**",
-                        COLORS['success']
-                    )
-                    return
-                elif executor.id in config['whitelist_users']:
-                    await security_system.log_security_action(
-                        guild,
-                        "Cargo Deletado - Usuário Autorizado",
-                        f"🟢 {executor.mention} deletou o cargo @{role.name}",
-                        COLORS['success']
-                    )
-                    return
-
-                # Verifica se é um bot e se deve ser banido
-                if executor.bot and config.get('auto_ban_bots_on_deletion', True):
-                    try:
-                        await executor.ban(reason=f"🔒 Bot deletou cargo @{role.name}")
-                        await security_system.log_security_action(
-                            guild,
-                            "🤖 BOT BANIDO - Deletou Cargo",
-                            f"🚨 Bot {executor.mention} foi banido por deletar cargo @{role.name}",
-                            COLORS['danger'],
-                            [
-                                {'name': '🎭 Cargo', 'value': f"@{role.name}", 'inline': True},
-                                {'name': '🤖 Bot', 'value': executor.mention, 'inline': True},
-                                {'name': '⚡ Ação', 'value': "Banimento automático", 'inline': True}
-                            ]
-                        )
-                        return
-                    except Exception as e:
-                        await security_system.log_security_action(
-                            guild,
-                            "❌ ERRO AO BANIR BOT",
-                            f"Falha ao banir bot {executor.mention}: {str(e)}",
-                            COLORS['danger']
-                        )
-
-                # Aplica punição para usuários
-                member = guild.get_member(executor.id)
-                punishment = config['role_delete_punishment']
-
-                if member:
-                    original_roles = [r for r in member.roles if r != guild.default_role]
-                    
-                    # Salva cargos antes de aplicar punição
-                    if original_roles and config.get('save_roles_before_kick', True):
-                        security_system.restored_roles[str(executor.id)] = {
-                            'roles': [r.id for r in original_roles],
-                            'removed_at': datetime.utcnow().isoformat(),
-                            'reason': f"Deletou cargo @{role.name}",
-                            'guild_id': guild.id
-                        }
-                    
-                    # Aplica punição baseada na configuração
-                    if punishment == 'ban':
-                        try:
-                            await member.ban(reason=f"🔒 Segurança: Deletou cargo @{role.name}")
-                        except:
-                            punishment = "falha (sem permissão para banir)"
-                    elif config.get('use_kick_instead_remove_roles', False):
-                        try:
-                            await member.kick(reason=f"🔒 Segurança: Deletou cargo @{role.name}")
-                            punishment = "kick"
-                        except discord.Forbidden:
-                            # Se não tem permissão para kick, remove cargos
-                            try:
-                                await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou cargo")
-                                punishment = "remove_roles (sem permissão para kick)"
-                            except:
-                                punishment = "falha (sem permissões)"
-                        except Exception as e:
-                            # Se falhar o kick por outro motivo, remove cargos como fallback
-                            try:
-                                await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou cargo")
-                                punishment = "remove_roles (kick falhou)"
-                            except:
-                                punishment = "falha (erro geral)"
-                    else:  # remove_roles
-                        try:
-                            await member.remove_roles(*original_roles, reason="🔒 Segurança: Deletou cargo")
-                        except:
-                            punishment = "falha (sem permissões para remover cargos)"
-
-                # Recria o cargo automaticamente se habilitado
-                recreated_role = None
-                if config['auto_recreate_roles']:
-                    try:
-                        recreated_role = await guild.create_role(
-                            name=role.name,
-                            color=role.color,
-                            permissions=role.permissions,
-                            hoist=role.hoist,
-                            mentionable=role.mentionable,
-                            reason=f"🔄 Recriação automática após deletação por {executor}"
-                        )
-                        # Tenta reposicionar o cargo
-                        try:
-                            await recreated_role.edit(position=role.position)
-                        except:
-                            pass
-                    except Exception as e:
-                        print(f"❌ Erro ao recriar cargo: {e}")
-
-                action_text = punishment
-                if recreated_role:
-                    action_text += f" + Cargo recriado: {recreated_role.mention}"
+        # Executor pelo evento do gateway; a API só é consultada se ele não chegar a tempo
+        entry = await audit_correlator.wait_for(guild, discord.AuditLogAction.role_delete, role.id, config.audit_log_delay)
+        if entry is not None:
+            executor = entry.user
 
+            # 👑 OWNER E WHITELIST TÊM PROTEÇÃO TOTAL
+            if executor.id == OWNER_ID:
                 await security_system.log_security_action(
                     guild,
-                    "🚨 CARGO DELETADO",
-                    f"⚠️ {executor.mention} deletou o cargo @{role.name}",
-                    COLORS['danger'],
-                    [
-                        {'name': '🎭 Cargo', 'value': f"@{role.name}", 'inline': True},
-                        {'name': '👤 Responsável', 'value': executor.mention, 'inline': True},
-                        {'name': '⚡ Ação', 'value': action_text, 'inline': True}
-                    ]
+                    "Cargo Deletado - 👑 OWNER DO BOT",
+                    f"🟢 {executor.mention} (OWNER) deletou o cargo @{role.name} - ✅ **AUTORIZADO**",
+                    COLORS['success']
                 )
-                break
+                return
+            elif executor.id in config.whitelist_users:
+                await security_system.log_security_action(
+                    guild,
+                    "Cargo Deletado - Usuário Autorizado",
+                    f"🟢 {executor.mention} deletou o cargo @{role.name}",
+                    COLORS['success']
+                )
+                return
+
+            # Uma punição por executor: exclusões em rajada entram no mesmo incidente
+            incident = punishment_coordinator.open(guild, executor, config, 'role', f"@{role.name}")
+            recreated_role = None
+            try:
+                await incident.punished.wait()
+
+                # Recria o cargo automaticamente se habilitado (em lote com o resto do incidente)
+                if config.auto_recreate_roles and not incident.bot_banned:
+                    recreated_role = await recreation_engine.recreate_role(role, executor)
+            finally:
+                punishment_coordinator.close(incident, recreated_role.mention if recreated_role else None)
     except Exception as e:
         print(f"❌ Erro no detector de exclusão de cargos: {e}")
 
@@ -681,52 +3817,53 @@ async def on_member_ban(guild, user):
     try:
         config = security_system.get_guild_config(guild.id)
         
-        if not config.get('monitor_bot_activity', True):
+        # Banimentos do anti-raid já entram no resumo do incidente
+        if raid_detector.consume_removal(guild.id, user.id):
             return
 
-        await asyncio.sleep(config['audit_log_delay'])
+        if not config.monitor_bot_activity:
+            return
 
         # Verifica quem fez o banimento
-        async for entry in guild.audit_logs(action=discord.AuditLogAction.ban, limit=1):
-            if entry.target.id == user.id:
-                executor = entry.user
+        entry = await audit_correlator.wait_for(guild, discord.AuditLogAction.ban, user.id, config.audit_log_delay)
+        if entry is not None:
+            executor = entry.user
 
-                # Registra o banimento no rastreador
-                await security_system.track_ban_activity(guild, executor, user)
+            # Registra o banimento no rastreador
+            await security_system.track_ban_activity(guild, executor, user)
 
-                # Log da ação de banimento
-                executor_type = "🤖 Bot" if executor.bot else "👤 Usuário"
-                target_type = "🤖 Bot" if user.bot else "👤 Usuário"
+            # Log da ação de banimento
+            executor_type = "🤖 Bot" if executor.bot else "👤 Usuário"
+            target_type = "🤖 Bot" if user.bot else "👤 Usuário"
                 
-                # Se for o owner, apenas registra
-                if executor.id == OWNER_ID:
-                    await security_system.log_security_action(
-                        guild,
-                        f"🔨 Banimento por 👑 OWNER",
-                        f"🟢 {executor.mention} (OWNER) baniu {target_type} {user.mention}",
-                        COLORS['success']
-                    )
-                elif executor.id in config.get('whitelist_users', []):
-                    await security_system.log_security_action(
-                        guild,
-                        f"🔨 Banimento por Usuário Autorizado",
-                        f"🟡 {executor.mention} baniu {target_type} {user.mention}",
-                        COLORS['info']
-                    )
-                else:
-                    # Log normal de banimento
-                    await security_system.log_security_action(
-                        guild,
-                        f"🔨 Banimento Detectado",
-                        f"⚠️ {executor_type} {executor.mention} baniu {target_type} {user.mention}",
-                        COLORS['warning'] if executor.bot else COLORS['info'],
-                        [
-                            {'name': '🎯 Executor', 'value': f"{executor_type} {executor.mention}", 'inline': True},
-                            {'name': '👤 Alvo', 'value': f"{target_type} {user.mention}", 'inline': True},
-                            {'name': '📝 Motivo', 'value': entry.reason or "Sem motivo especificado", 'inline': False}
-                        ]
-                    )
-                break
+            # Se for o owner, apenas registra
+            if executor.id == OWNER_ID:
+                await security_system.log_security_action(
+                    guild,
+                    f"🔨 Banimento por 👑 OWNER",
+                    f"🟢 {executor.mention} (OWNER) baniu {target_type} {user.mention}",
+                    COLORS['success']
+                )
+            elif executor.id in config.whitelist_users:
+                await security_system.log_security_action(
+                    guild,
+                    f"🔨 Banimento por Usuário Autorizado",
+                    f"🟡 {executor.mention} baniu {target_type} {user.mention}",
+                    COLORS['info']
+                )
+            else:
+                # Log normal de banimento
+                await security_system.log_security_action(
+                    guild,
+                    f"🔨 Banimento Detectado",
+                    f"⚠️ {executor_type} {executor.mention} baniu {target_type} {user.mention}",
+                    COLORS['warning'] if executor.bot else COLORS['info'],
+                    [
+                        {'name': '🎯 Executor', 'value': f"{executor_type} {executor.mention}", 'inline': True},
+                        {'name': '👤 Alvo', 'value': f"{target_type} {user.mention}", 'inline': True},
+                        {'name': '📝 Motivo', 'value': entry.reason or "Sem motivo especificado", 'inline': False}
+                    ]
+                )
 
     except Exception as e:
         print(f"❌ Erro no monitoramento de banimentos: {e}")
@@ -737,13 +3874,17 @@ async def on_member_join(member):
     guild = member.guild
     config = security_system.get_guild_config(guild.id)
 
-    if not config['protection_enabled']:
+    if not config.protection_enabled:
+        return
+
+    # Anti-raid: durante um raid as contas novas são removidas em lote (um único log)
+    if config.anti_raid_enabled and raid_detector.observe(member, config):
         return
 
     # Ban automático de bots
-    if member.bot and config['auto_ban_bots']:
+    if member.bot and config.auto_ban_bots:
         try:
-            await member.ban(reason="🔒 Segurança: Bot banido automaticamente")
+            await bulk_ban_queue.ban(guild, member, reason="🔒 Segurança: Bot banido automaticamente")
             await security_system.log_security_action(
                 guild,
                 "🤖 Bot Banido",
@@ -754,11 +3895,11 @@ async def on_member_join(member):
             print(f"❌ Erro ao banir bot: {e}")
 
     # Ban de contas muito novas
-    if not member.bot and config['auto_ban_new_accounts']:
+    if not member.bot and config.auto_ban_new_accounts:
         account_age = (datetime.utcnow().replace(tzinfo=member.created_at.tzinfo) - member.created_at).days
-        if account_age < config['new_account_days']:
+        if account_age < config.new_account_days:
             try:
-                await member.ban(reason=f"🔒 Segurança: Conta muito nova ({account_age} dias)")
+                await bulk_ban_queue.ban(guild, member, reason=f"🔒 Segurança: Conta muito nova ({account_age} dias)")
                 await security_system.log_security_action(
                     guild,
                     "🆕 Conta Nova Banida",
@@ -792,163 +3933,32 @@ async def on_message(message):
                 title="🚫 ACESSO NEGADO",
                 description=f"❌ **COMANDO RESTRITO:** `!sec_{command_name}`\n\n👑 **APENAS O OWNER PODE USAR COMANDOS!**",
                 color=COLORS['danger']
-            )
-            embed.add_field(
-                name="🆔 Verificação",
-                value=f"**Owner ID:** `{OWNER_ID}`\n**Seu ID:** `{message.author.id}`\n**Status:** ❌ Não autorizado",
-                inline=False
-            )
-            embed.add_field(
-                name="💡 Comando Público",
-                value="• `!sec_help` - Central de ajuda",
-                inline=False
-            )
-            embed.set_footer(text=f"Bloqueio de segurança ativo")
-            
-            await message.reply(embed=embed)
-            return  # BLOQUEIA EXECUÇÃO AQUI
-    
-    config = security_system.get_guild_config(guild.id)
-
-    if not config['protection_enabled']:
-        await bot.process_commands(message)
-        return
-
-    # Anti-spam
-    if config['anti_spam_enabled']:
-        user_id = str(message.author.id)
-        guild_id = str(guild.id)
-
-        if guild_id not in security_system.spam_tracker:
-            security_system.spam_tracker[guild_id] = {}
-
-        if user_id not in security_system.spam_tracker[guild_id]:
-            security_system.spam_tracker[guild_id][user_id] = []
-
-        now = datetime.utcnow()
-        user_messages = security_system.spam_tracker[guild_id][user_id]
-
-        # Remove mensagens antigas
-        user_messages[:] = [msg_time for msg_time in user_messages 
-                           if (now - msg_time).seconds < config['spam_time_window']]
-
-        user_messages.append(now)
-
-        if len(user_messages) >= config['spam_message_count']:
-            try:
-                await message.author.timeout(
-                    timedelta(seconds=config['auto_mute_duration']),
-                    reason="🔒 Anti-spam: Muitas mensagens em pouco tempo"
-                )
-                await security_system.log_security_action(
-                    guild,
-                    "🚫 Usuário Mutado por Spam",
-                    f"{message.author.mention} foi mutado por {config['auto_mute_duration']}s",
-                    COLORS['warning']
-                )
-                user_messages.clear()
-            except Exception as e:
-                print(f"❌ Erro ao mutar por spam: {e}")
-
-    # Anti mass ping
-    if config['auto_kick_mass_ping']:
-        mention_count = len(message.mentions)
-        if mention_count >= config['max_mentions']:
-            try:
-                await message.delete()
-                await message.author.timeout(
-                    timedelta(seconds=config['mass_ping_mute_duration']),
-                    reason=f"🔒 Mass ping: {mention_count} menções"
-                )
-                await security_system.log_security_action(
-                    guild,
-                    "🚫 Usuário Silenciado por Mass Ping",
-                    f"{message.author.mention} silenciado por {config['mass_ping_mute_duration']}s ({mention_count} menções)",
-                    COLORS['warning']
-                )
-            except Exception as e:
-                print(f"❌ Erro ao silenciar por mass ping: {e}")
+            )
+            embed.add_field(
+                name="🆔 Verificação",
+                value=f"**Owner ID:** `{OWNER_ID}`\n**Seu ID:** `{message.author.id}`\n**Status:** ❌ Não autorizado",
+                inline=False
+            )
+            embed.add_field(
+                name="💡 Comando Público",
+                value="• `!sec_help` - Central de ajuda",
+                inline=False
+            )
+            embed.set_footer(text=f"Bloqueio de segurança ativo")
+            
+            await message.reply(embed=embed)
+            return  # BLOQUEIA EXECUÇÃO AQUI
+    
+    config = security_system.get_guild_config(guild.id)
 
-    # Anti convite
-    if config['auto_delete_invite_links']:
-        invite_pattern = r'discord\.gg/\w+'
-        if re.search(invite_pattern, message.content):
-            try:
-                await message.delete()
-                await security_system.log_security_action(
-                    guild,
-                    "🔗 Link de Convite Deletado",
-                    f"Mensagem de {message.author.mention} continha convite",
-                    COLORS['info']
-                )
-            except Exception as e:
-                print(f"❌ Erro ao deletar convite: {e}")
+    if not config.protection_enabled:
+        await bot.process_commands(message)
+        return
 
-    # Anti @everyone/@here
-    if config.get('auto_ban_everyone_mention', True):
-        # Verifica se a mensagem contém @everyone ou @here
-        if '@everyone' in message.content or '@here' in message.content:
-            # 👑 OWNER DO BOT É INTOCÁVEL
-            if message.author.id == OWNER_ID:
-                await security_system.log_security_action(
-                    guild,
-                    "👑 @everyone/@here por OWNER",
-                    f"🟢 {message.author.mention} (OWNER) usou @everyone/@here - ✅ **AUTORIZADO**",
-                    COLORS['success']
-                )
-            # Verifica whitelist
-            elif message.author.id in config.get('whitelist_users', []):
-                await security_system.log_security_action(
-                    guild,
-                    "🟡 @everyone/@here por Usuário Autorizado",
-                    f"🟡 {message.author.mention} usou @everyone/@here (whitelist)",
-                    COLORS['warning']
-                )
-            else:
-                # Ban automático para quem não está na whitelist
-                try:
-                    await message.delete()  # Deleta a mensagem primeiro
-                    await message.author.ban(reason="🔒 Uso não autorizado de @everyone/@here")
-                    
-                    await security_system.log_security_action(
-                        guild,
-                        "🚨 USUÁRIO BANIDO - @everyone/@here",
-                        f"⚠️ {message.author.mention} foi banido por usar @everyone/@here",
-                        COLORS['danger'],
-                        [
-                            {'name': '📝 Mensagem', 'value': f"```{message.content[:100]}```", 'inline': False},
-                            {'name': '👤 Usuário', 'value': message.author.mention, 'inline': True},
-                            {'name': '⚡ Ação', 'value': "Banimento automático", 'inline': True},
-                            {'name': '📺 Canal', 'value': message.channel.mention, 'inline': True}
-                        ]
-                    )
-                except discord.Forbidden:
-                    # Se não conseguir banir, tenta outras punições
-                    try:
-                        await message.author.timeout(
-                            timedelta(hours=24),
-                            reason="🔒 Uso não autorizado de @everyone/@here (sem permissão para banir)"
-                        )
-                        await security_system.log_security_action(
-                            guild,
-                            "🔇 USUÁRIO MUTADO - @everyone/@here",
-                            f"⚠️ {message.author.mention} foi mutado por 24h (sem permissão para banir)",
-                            COLORS['warning']
-                        )
-                    except:
-                        await security_system.log_security_action(
-                            guild,
-                            "❌ ERRO - @everyone/@here",
-                            f"Não foi possível punir {message.author.mention} por usar @everyone/@here",
-                            COLORS['danger']
-                        )
-                except Exception as e:
-                    await security_system.log_security_action(
-                        guild,
-                        "❌ ERRO AO BANIR - @everyone/@here",
-                        f"Erro ao banir {message.author.mention}: {str(e)}",
-                        COLORS['danger']
-                    )
+    # Todas as regras (spam, mass ping, convite, termos bloqueados, @everyone) em uma passada
+    verdicts = message_rules.evaluate(message, config, security_system.spam_tracker)
+    if verdicts:
+        await message_rules.apply(message, config, verdicts)
 
     await bot.process_commands(message)
 
@@ -970,30 +3980,39 @@ async def config_security(ctx, setting: str = None, *, value: str = None):
         embed = discord.Embed(title="🔧 Configurações de Segurança", color=COLORS['info'])
 
         # Mostra configurações atuais
-        embed.add_field(name="🤖 auto_ban_bots", value="✅" if config['auto_ban_bots'] else "❌", inline=True)
-        embed.add_field(name="🆕 auto_ban_new_accounts", value="✅" if config['auto_ban_new_accounts'] else "❌", inline=True)
-        embed.add_field(name="📅 new_account_days", value=config['new_account_days'], inline=True)
-        embed.add_field(name="🛡️ protection_enabled", value="✅" if config['protection_enabled'] else "❌", inline=True)
-        embed.add_field(name="📢 anti_spam_enabled", value="✅" if config['anti_spam_enabled'] else "❌", inline=True)
-        embed.add_field(name="🚫 auto_kick_mass_ping", value="✅" if config['auto_kick_mass_ping'] else "❌", inline=True)
-        embed.add_field(name="🔗 auto_delete_invite_links", value="✅" if config['auto_delete_invite_links'] else "❌", inline=True)
-        embed.add_field(name="💾 backup_channels", value="✅" if config['backup_channels'] else "❌", inline=True)
-        embed.add_field(name="🔄 auto_recreate_channels", value="✅" if config['auto_recreate_channels'] else "❌", inline=True)
-        embed.add_field(name="🔄 auto_recreate_roles", value="✅" if config['auto_recreate_roles'] else "❌", inline=True)
-        embed.add_field(name="🤖 monitor_bot_activity", value="✅" if config['monitor_bot_activity'] else "❌", inline=True)
-        embed.add_field(name="🚨 auto_ban_mass_banner", value="✅" if config['auto_ban_mass_banner'] else "❌", inline=True)
-        embed.add_field(name="🛡️ bot_protection_enabled", value="✅" if config['bot_protection_enabled'] else "❌", inline=True)
-        embed.add_field(name="📊 max_bans_per_timeframe", value=config['max_bans_per_timeframe'], inline=True)
-        embed.add_field(name="⏰ ban_timeframe_minutes", value=config['ban_timeframe_minutes'], inline=True)
-        embed.add_field(name="👢 use_kick_instead_remove_roles", value="✅" if config['use_kick_instead_remove_roles'] else "❌", inline=True)
-        embed.add_field(name="💾 save_roles_before_kick", value="✅" if config['save_roles_before_kick'] else "❌", inline=True)
-        embed.add_field(name="🤖 auto_ban_bots_on_deletion", value="✅" if config['auto_ban_bots_on_deletion'] else "❌", inline=True)
-        embed.add_field(name="🚫 auto_ban_everyone_mention", value="✅" if config['auto_ban_everyone_mention'] else "❌", inline=True)
-        embed.add_field(name="📺 logs_channel_id", value=f"<#{config['logs_channel_id']}>" if config['logs_channel_id'] else "Não definido", inline=True)
+        embed.add_field(name="🤖 auto_ban_bots", value="✅" if config.auto_ban_bots else "❌", inline=True)
+        embed.add_field(name="🆕 auto_ban_new_accounts", value="✅" if config.auto_ban_new_accounts else "❌", inline=True)
+        embed.add_field(name="📅 new_account_days", value=config.new_account_days, inline=True)
+        embed.add_field(name="🛡️ protection_enabled", value="✅" if config.protection_enabled else "❌", inline=True)
+        embed.add_field(name="📢 anti_spam_enabled", value="✅" if config.anti_spam_enabled else "❌", inline=True)
+        embed.add_field(name="🚫 auto_kick_mass_ping", value="✅" if config.auto_kick_mass_ping else "❌", inline=True)
+        embed.add_field(name="🔗 auto_delete_invite_links", value="✅" if config.auto_delete_invite_links else "❌", inline=True)
+        embed.add_field(name="💾 backup_channels", value="✅" if config.backup_channels else "❌", inline=True)
+        embed.add_field(name="🔄 auto_recreate_channels", value="✅" if config.auto_recreate_channels else "❌", inline=True)
+        embed.add_field(name="🔄 auto_recreate_roles", value="✅" if config.auto_recreate_roles else "❌", inline=True)
+        embed.add_field(name="🤖 monitor_bot_activity", value="✅" if config.monitor_bot_activity else "❌", inline=True)
+        embed.add_field(name="🚨 auto_ban_mass_banner", value="✅" if config.auto_ban_mass_banner else "❌", inline=True)
+        embed.add_field(name="🛡️ bot_protection_enabled", value="✅" if config.bot_protection_enabled else "❌", inline=True)
+        embed.add_field(name="📊 max_bans_per_timeframe", value=config.max_bans_per_timeframe, inline=True)
+        embed.add_field(name="⏰ ban_timeframe_minutes", value=config.ban_timeframe_minutes, inline=True)
+        embed.add_field(name="👢 use_kick_instead_remove_roles", value="✅" if config.use_kick_instead_remove_roles else "❌", inline=True)
+        embed.add_field(name="💾 save_roles_before_kick", value="✅" if config.save_roles_before_kick else "❌", inline=True)
+        embed.add_field(name="🤖 auto_ban_bots_on_deletion", value="✅" if config.auto_ban_bots_on_deletion else "❌", inline=True)
+        embed.add_field(name="🚫 auto_ban_everyone_mention", value="✅" if config.auto_ban_everyone_mention else "❌", inline=True)
+        embed.add_field(name="🔤 blocked_terms", value=', '.join(config.blocked_terms) or "Nenhum", inline=True)
+        embed.add_field(
+            name="🚨 Anti-raid",
+            value=f"anti_raid_enabled: {'✅' if config.anti_raid_enabled else '❌'}\n"
+                  f"raid_join_threshold: {config.raid_join_threshold} | raid_join_window: {config.raid_join_window}s\n"
+                  f"raid_account_age_days: {config.raid_account_age_days} | raid_mode_duration: {config.raid_mode_duration}s\n"
+                  f"raid_action: {config.raid_action}",
+            inline=False
+        )
+        embed.add_field(name="📺 logs_channel_id", value=f"<#{config.logs_channel_id}>" if config.logs_channel_id else "Não definido", inline=True)
 
         embed.add_field(
             name="💡 Exemplos de uso:",
-            value="`!sec_c use_kick_instead_remove_roles true`\n`!sec_c save_roles_before_kick true`\n`!sec_c auto_ban_bots_on_deletion true`\n`!sec_c max_bans_per_timeframe 4`",
+            value="`!sec_c use_kick_instead_remove_roles true`\n`!sec_c save_roles_before_kick true`\n`!sec_c auto_ban_bots_on_deletion true`\n`!sec_c max_bans_per_timeframe 4`\n`!sec_c blocked_terms golpe, nitro grátis`\n`!sec_c raid_join_threshold 15`",
             inline=False
         )
 
@@ -1002,70 +4021,84 @@ async def config_security(ctx, setting: str = None, *, value: str = None):
 
     # Aplica configuração
     if setting == 'auto_ban_bots':
-        config['auto_ban_bots'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_ban_new_accounts':
-        config['auto_ban_new_accounts'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'new_account_days':
-        config['new_account_days'] = int(value)
+        new_value = int(value)
     elif setting == 'protection_enabled':
-        config['protection_enabled'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'anti_spam_enabled':
-        config['anti_spam_enabled'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_kick_mass_ping':
-        config['auto_kick_mass_ping'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_delete_invite_links':
-        config['auto_delete_invite_links'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'backup_channels':
-        config['backup_channels'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'backup_roles':
-        config['backup_roles'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_recreate_channels':
-        config['auto_recreate_channels'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_recreate_roles':
-        config['auto_recreate_roles'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'max_mentions':
-        config['max_mentions'] = int(value)
+        new_value = int(value)
     elif setting == 'spam_message_count':
-        config['spam_message_count'] = int(value)
+        new_value = int(value)
     elif setting == 'auto_mute_duration':
-        config['auto_mute_duration'] = int(value)
+        new_value = int(value)
     elif setting == 'mass_ping_mute_duration':
-        config['mass_ping_mute_duration'] = int(value)
+        new_value = int(value)
     elif setting == 'logs_channel_id':
         if value.startswith('#'):
             channel = discord.utils.get(ctx.guild.channels, name=value[1:])
         else:
             channel = ctx.guild.get_channel(int(value.strip('<#>')))
-        config['logs_channel_id'] = channel.id if channel else None
+        new_value = channel.id if channel else None
     elif setting == 'monitor_bot_activity':
-        config['monitor_bot_activity'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_ban_mass_banner':
-        config['auto_ban_mass_banner'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'bot_protection_enabled':
-        config['bot_protection_enabled'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'max_bans_per_timeframe':
-        config['max_bans_per_timeframe'] = int(value)
+        new_value = int(value)
     elif setting == 'ban_timeframe_minutes':
-        config['ban_timeframe_minutes'] = int(value)
+        new_value = int(value)
     elif setting == 'use_kick_instead_remove_roles':
-        config['use_kick_instead_remove_roles'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'save_roles_before_kick':
-        config['save_roles_before_kick'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_ban_bots_on_deletion':
-        config['auto_ban_bots_on_deletion'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
     elif setting == 'auto_ban_everyone_mention':
-        config['auto_ban_everyone_mention'] = value.lower() == 'true'
+        new_value = value.lower() == 'true'
+    elif setting == 'anti_raid_enabled':
+        new_value = value.lower() == 'true'
+    elif setting in ('raid_join_threshold', 'raid_join_window', 'raid_account_age_days', 'raid_mode_duration'):
+        new_value = int(value)
+    elif setting == 'raid_action':
+        if value.lower() not in ('ban', 'kick'):
+            await ctx.reply("❌ Use `ban` ou `kick`!")
+            return
+        new_value = value.lower()
+    elif setting == 'blocked_terms':
+        # Lista separada por vírgulas; "none" limpa
+        new_value = [] if value.lower() == 'none' else [term.strip() for term in value.split(',') if term.strip()]
     else:
         await ctx.reply("❌ Configuração inválida!")
         return
 
-    await security_system.save_data()
+    config = security_system.update_guild_config(ctx.guild.id, **{setting: new_value})
+    await security_system.flush()
 
     embed = discord.Embed(
         title="✅ Configuração Atualizada",
         description=f"**{setting}** = **{value}**",
         color=COLORS['success']
     )
+    embed.set_footer(text=f"Versão da configuração: {config.version}")
     await ctx.reply(embed=embed)
 
 @bot.command(name='whitelist', aliases=['w'])
@@ -1077,9 +4110,9 @@ async def manage_whitelist(ctx, action: str = None, user: discord.Member = None)
     if not action:
         embed = discord.Embed(title="🔐 Whitelist de Segurança", color=COLORS['info'])
 
-        if config['whitelist_users']:
+        if config.whitelist_users:
             users = []
-            for user_id in config['whitelist_users']:
+            for user_id in config.whitelist_users:
                 user_obj = bot.get_user(user_id)
                 users.append(user_obj.mention if user_obj else f"ID: {user_id}")
             embed.add_field(name="👥 Usuários", value='\n'.join(users), inline=False)
@@ -1095,17 +4128,17 @@ async def manage_whitelist(ctx, action: str = None, user: discord.Member = None)
         return
 
     if action == 'add':
-        if user.id not in config['whitelist_users']:
-            config['whitelist_users'].append(user.id)
-            await security_system.save_data()
+        if user.id not in config.whitelist_users:
+            security_system.update_guild_config(ctx.guild.id, whitelist_users=config.whitelist_users | {user.id})
+            await security_system.flush()
             await ctx.reply(f"✅ {user.mention} adicionado à whitelist!")
         else:
             await ctx.reply("❌ Usuário já está na whitelist!")
 
     elif action == 'remove':
-        if user.id in config['whitelist_users']:
-            config['whitelist_users'].remove(user.id)
-            await security_system.save_data()
+        if user.id in config.whitelist_users:
+            security_system.update_guild_config(ctx.guild.id, whitelist_users=config.whitelist_users - {user.id})
+            await security_system.flush()
             await ctx.reply(f"✅ {user.mention} removido da whitelist!")
         else:
             await ctx.reply("❌ Usuário não está na whitelist!")
@@ -1130,9 +4163,10 @@ async def restore_roles(ctx, user: discord.Member):
                 roles_to_restore.append(role)
 
         if roles_to_restore:
-            await user.add_roles(*roles_to_restore, reason=f"Restauração por {ctx.author}")
+            await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.add_roles(*roles_to_restore, reason=f"Restauração por {ctx.author}"))
             del security_system.restored_roles[user_id]
-            await security_system.save_data()
+            security_system.record_change('del', ['restored_roles', user_id], guild_id=user_data['guild_id'])
+            await security_system.flush()
 
             await ctx.reply(f"✅ Cargos de {user.mention} restaurados!")
         else:
@@ -1141,6 +4175,89 @@ async def restore_roles(ctx, user: discord.Member):
     except Exception as e:
         await ctx.reply(f"❌ Erro: {e}")
 
+RESTORE_JOB_STATUS_LABELS = {
+    'running': "🔄 Em andamento",
+    'interrupted': "⏸️ Interrompido",
+    'failed': "⚠️ Com falhas",
+    'done': "✅ Concluído"
+}
+
+def restore_job_state(job_id: str, record: Dict) -> str:
+    """'running' no disco sem job ativo significa que o bot caiu no meio da restauração"""
+    if record['status'] == 'running' and job_id not in security_system.active_restores:
+        return 'interrupted'
+    return record['status']
+
+@bot.group(name='restore_job', aliases=['jobs'], invoke_without_command=True)
+@is_owner()
+async def restore_job(ctx):
+    """Jobs de restauração de backup (sem subcomando: lista os do servidor)"""
+    await restore_status(ctx)
+
+@restore_job.command(name='resume', aliases=['retomar'])
+@is_owner()
+async def restore_resume(ctx, job_id: str):
+    """Retoma um job de restauração a partir do último checkpoint"""
+    job_id = job_id.upper()
+    record = security_system.guild_restore_jobs(ctx.guild.id).get(job_id)
+    if record is None:
+        await ctx.reply(f"❌ Job `{job_id}` não encontrado! Use `!sec_restore_job status` para ver os jobs.")
+        return
+    if job_id in security_system.active_restores:
+        await ctx.reply(f"❌ Job `{job_id}` já está em execução!")
+        return
+    if record['status'] == 'done':
+        await ctx.reply(f"✅ Job `{job_id}` já foi concluído!")
+        return
+
+    job = RestoreJob.from_record(ctx.guild, record)
+    security_system.set_restore_job_status(ctx.guild.id, job_id, 'running')
+    message = await ctx.reply(f"🔄 Retomando job `{job_id}`: {job.completed}/{job.total} passos já concluídos...")
+    try:
+        await run_restore_job(ctx, message, job)
+    except Exception as e:
+        await ctx.reply(f"❌ Erro ao retomar restauração: {e}")
+
+@restore_job.command(name='status')
+@is_owner()
+async def restore_status(ctx, job_id: str = None):
+    """Progresso de um job de restauração (ou lista dos jobs do servidor)"""
+    jobs = security_system.guild_restore_jobs(ctx.guild.id)
+
+    if job_id is None:
+        embed = discord.Embed(title="🧾 Jobs de Restauração", color=COLORS['info'])
+        if not jobs:
+            embed.description = "Nenhum job de restauração registrado."
+        for job_id, record in list(jobs.items())[-10:]:
+            active = security_system.active_restores.get(job_id)
+            done = active.completed if active else len([r for r in record['results'].values() if 'error' not in r])
+            embed.add_field(
+                name=f"`{job_id}` • {RESTORE_JOB_STATUS_LABELS[restore_job_state(job_id, record)]}",
+                value=f"🆔 Backup `{record['backup_id']}` ({record.get('mode', 'full')})\n📊 {done}/{len(record['steps'])} passos\n📅 {datetime.fromisoformat(record['updated_at']).strftime('%d/%m/%Y %H:%M')}",
+                inline=False
+            )
+        await ctx.reply(embed=embed)
+        return
+
+    job_id = job_id.upper()
+    record = jobs.get(job_id)
+    if record is None:
+        await ctx.reply(f"❌ Job `{job_id}` não encontrado!")
+        return
+
+    # Em execução: progresso ao vivo; senão, reconstrói a partir dos checkpoints
+    active = security_system.active_restores.get(job_id)
+    if active is not None:
+        embed = restore_progress_embed(active)
+    else:
+        failed = [key for key, result in record['results'].items() if 'error' in result]
+        embed = restore_progress_embed(RestoreJob.from_record(ctx.guild, record),
+                                       updated_at=record['updated_at'], failures=len(failed))
+        if record['status'] != 'done':
+            embed.add_field(name="▶️ Retomar", value=f"`!sec_restore_job resume {job_id}`", inline=False)
+    embed.title = f"🧾 JOB {job_id} • {RESTORE_JOB_STATUS_LABELS[restore_job_state(job_id, record)]}"
+    await ctx.reply(embed=embed)
+
 @bot.command(name='status', aliases=['s'])
 @is_owner()
 async def security_status(ctx):
@@ -1161,13 +4278,13 @@ async def security_status(ctx):
 
     # Proteções ativas
     protections = []
-    if config['protection_enabled']:
+    if config.protection_enabled:
         protections.append("🛡️ Proteção geral ativa")
-        if config['auto_ban_bots']:
+        if config.auto_ban_bots:
             protections.append("🤖 Anti-bot")
-        if config['anti_spam_enabled']:
+        if config.anti_spam_enabled:
             protections.append("📢 Anti-spam")
-        if config['auto_kick_mass_ping']:
+        if config.auto_kick_mass_ping:
             protections.append("🚫 Anti mass-ping")
     else:
         protections.append("❌ Proteções desativadas")
@@ -1176,26 +4293,97 @@ async def security_status(ctx):
 
     # Canal de logs
     logs_channel = "Não configurado"
-    if config['logs_channel_id']:
-        logs_channel = f"<#{config['logs_channel_id']}>"
+    if config.logs_channel_id:
+        logs_channel = f"<#{config.logs_channel_id}>"
     embed.add_field(name="📺 Canal de Logs", value=logs_channel, inline=True)
 
+    # Persistência write-behind
+    stats = security_system.persist_stats
+    embed.add_field(
+        name="💾 Persistência",
+        value=f"Pedidos: {stats['saves_requested']}\nGravações: {stats['saves_performed']}\nBytes: {stats['bytes_written']}\nLoop bloqueado: {stats['last_blocked_ms']:.2f} ms\nPendente: {'Sim' if security_system.dirty else 'Não'}",
+        inline=True
+    )
+
+    # Origem dos executores identificados (gateway vs consulta à API)
+    audit_stats = audit_correlator.stats
+    embed.add_field(
+        name="🔎 Auditoria",
+        value=f"Gateway: {audit_stats['gateway']}\nAPI (fallback): {audit_stats['fallback']}\nNão encontrados: {audit_stats['missed']}",
+        inline=True
+    )
+
+    # Rastreador do anti-spam
+    spam_tracker = security_system.spam_tracker
+    embed.add_field(
+        name="🧮 Anti-Spam",
+        value=f"Usuários: {len(spam_tracker)}/{spam_tracker.max_users}\nMemória: {spam_tracker.memory_bytes() / 1024:.1f} KB\nDescartados: {spam_tracker.evicted}",
+        inline=True
+    )
+
+    # Incidentes de raid nas entradas
+    raid_stats = raid_detector.stats
+    embed.add_field(
+        name="🚨 Anti-Raid",
+        value=f"Raids: {raid_stats['raids']} | Ativos: {raid_detector.active()}\nRemovidas: {raid_stats['removed']}\nFalhas: {raid_stats['failed']}",
+        inline=True
+    )
+
+    # Banimentos enviados em lote
+    ban_stats = bulk_ban_queue.stats
+    embed.add_field(
+        name="🔨 Banimentos em Lote",
+        value=f"Pedidos: {ban_stats['requested']} | Lotes: {ban_stats['chunks']}\nBanidos: {ban_stats['banned']} | Falhas: {ban_stats['failed']}",
+        inline=True
+    )
+
+    # Custo da avaliação de regras por mensagem
+    rule_stats = message_rules.stats
+    embed.add_field(
+        name="🧩 Regras de Mensagem",
+        value=f"Mensagens: {rule_stats['messages']}\nMédia: {message_rules.average_us():.1f} µs | Máx: {rule_stats['max_ns'] / 1000:.1f} µs\nVeredictos: {rule_stats['verdicts']} | Compilações: {rule_stats['compiled']}",
+        inline=True
+    )
+
+    # Fila priorizada de ações (espera média/máxima por prioridade)
+    action_lines = []
+    for priority, name in enumerate(PRIORITY_NAMES):
+        stats = action_scheduler.stats[priority]
+        average = stats['wait_ms_total'] / stats['done'] if stats['done'] else 0.0
+        action_lines.append(f"{name}: {action_scheduler.depth(priority)} na fila | {average:.0f}/{stats['wait_ms_max']:.0f} ms")
+    embed.add_field(name="⚡ Fila de Ações", value='\n'.join(action_lines), inline=False)
+
+    # Fila de envio dos logs
+    log_stats = log_dispatcher.stats
+    embed.add_field(
+        name="📨 Logs",
+        value=f"Na fila: {log_dispatcher.depth()}\nAtraso: {log_dispatcher.oldest_lag_ms() / 1000:.1f}s (último: {log_stats['last_lag_ms'] / 1000:.1f}s)\nMensagens: {log_stats['sent_messages']} ({log_stats['sent_embeds']} embeds)\nResumidos: {log_stats['summarized']}",
+        inline=True
+    )
+
+    # Tempo de recuperação do último lote recriado
+    recovery = recreation_engine.last_recovery
+    embed.add_field(
+        name="🔄 Recriação",
+        value=(f"Último lote: {recovery['items']} itens\nFalhas: {recovery['failed']}\nTempo: {recovery['ms'] / 1000:.1f}s"
+               if recovery else "Nenhum lote recriado"),
+        inline=True
+    )
+
     await ctx.reply(embed=embed)
 
 @bot.command(name='logs', aliases=['l'])
 @is_owner()
 async def view_logs(ctx, limit: int = 10):
     """Visualiza logs recentes"""
-    guild_id_str = str(ctx.guild.id)
-    logs = security_system.security_logs.get(guild_id_str, [])
+    recent_logs = await security_system.get_recent_logs(ctx.guild.id, limit)
 
-    if not logs:
+    if not recent_logs:
         await ctx.reply("❌ Nenhum log encontrado!")
         return
 
     embed = discord.Embed(title="📋 Logs Recentes", color=COLORS['info'])
 
-    recent_logs = logs[-limit:]
     for log in recent_logs:
         timestamp = datetime.fromisoformat(log['timestamp']).strftime("%d/%m %H:%M")
         embed.add_field(
@@ -1252,35 +4440,190 @@ async def view_backups(ctx):
     if not backups['channels'] and not backups['roles'] and not backups.get('full_backups'):
         embed.add_field(name="💾 Status", value="Nenhum backup disponível", inline=False)
     
-    # Informações do arquivo
-    import os
-    if os.path.exists(SECURITY_DATA_FILE):
-        file_size = os.path.getsize(SECURITY_DATA_FILE)
-        file_size_mb = file_size / (1024 * 1024)
+    # Informações do armazenamento
+    report = await security_system.storage_report()
+    if report['disk']:
         embed.add_field(
             name="📁 Arquivo de Dados", 
-            value=f"📄 `{SECURITY_DATA_FILE}`\n💾 Tamanho: {file_size_mb:.2f} MB\n✅ Status: Acessível", 
+            value=(f"📄 `{security_system.storage.path}` ({STORAGE_MODE}/{report['codec']})\n"
+                   f"💾 Em disco: {report['disk'] / (1024 * 1024):.2f} MB\n"
+                   f"📦 Estado: {report['encoded'] / 1024:.1f} KB vs {report['json'] / 1024:.1f} KB em JSON "
+                   f"(-{report['savings']:.0f}%)\n✅ Status: Acessível"), 
             inline=True
         )
     else:
         embed.add_field(
             name="📁 Arquivo de Dados", 
-            value=f"📄 `{SECURITY_DATA_FILE}`\n❌ Status: Não encontrado", 
+            value=f"📄 `{security_system.storage.path}`\n❌ Status: Não encontrado", 
             inline=True
         )
         
-    embed.add_field(name="💡 Comandos", value="`!sec_save` - Criar backup completo\n`!sec_restore <ID>` - Restaurar backup\n`!sec_verify_backup <ID>` - Verificar backup", inline=False)
+    embed.add_field(name="💡 Comandos", value="`!sec_save` - Criar backup completo\n`!sec_restaurar <ID>` - Restaurar backup\n`!sec_verify_backup <ID>` - Verificar backup\n`!sec_export` - Exportar dados em JSON", inline=False)
 
     await ctx.reply(embed=embed)
 
+@bot.command(name='export', aliases=['exportar'])
+@is_owner()
+async def export_data(ctx):
+    """Exporta todos os dados de segurança em JSON"""
+    await security_system.flush()
+    content = await security_system.export_json()
+    filename = f"security_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    await ctx.reply(
+        f"📤 Exportação em JSON ({len(content) / 1024:.1f} KB) - compatível com `{SECURITY_DATA_FILE}`",
+        file=discord.File(io.BytesIO(content), filename=filename)
+    )
+
+PLAN_KIND_LABELS = {'role': '🎭 cargos', 'category': '📁 categorias', 'channel': '📺 canais'}
+
+def format_plan_summary(steps: List[Dict], summary: Dict[str, Dict[str, int]]) -> str:
+    """Prévia do plano para a confirmação: contagens e alguns nomes de cada ação"""
+    lines = []
+    for action, label in (('create', '➕ Criar'), ('edit', '✏️ Editar'), ('keep', '✅ Manter')):
+        kinds = summary.get(action)
+        if not kinds:
+            continue
+        counts = ', '.join(f"{count} {PLAN_KIND_LABELS[kind]}" for kind, count in kinds.items())
+        names = [step['record']['name'] for step in steps if step['action'] == action][:5]
+        lines.append(f"**{label}:** {counts}" + (f"\n└ {', '.join(names)}{'...' if sum(kinds.values()) > 5 else ''}" if action != 'keep' else ''))
+    if summary.get('reorder'):
+        lines.append("**🔀 Reordenar:** posições conferidas ao final")
+    if summary.get('assign'):
+        lines.append("**👥 Membros:** cargos devolvidos a quem ainda está no servidor")
+    return '\n'.join(lines)[:1024] or "Nenhuma alteração"
+
+def restore_dry_run_embed(backup_id: str, steps: List[Dict], summary: Dict, estimate: Dict) -> discord.Embed:
+    """Resultado da simulação: plano, chamadas por bucket, tempo estimado e alertas"""
+    embed = discord.Embed(
+        title="🧪 SIMULAÇÃO DE RESTAURAÇÃO",
+        description=f"🆔 **Backup:** `{backup_id}`\nNada foi alterado no servidor.",
+        color=COLORS['info']
+    )
+    embed.add_field(name="🧮 Plano", value=format_plan_summary(steps, summary), inline=False)
+
+    lines = []
+    for entry in sorted(estimate['buckets'], key=lambda entry: -entry['calls']):
+        source = "observado" if entry['observed'] else "padrão"
+        spread = f" em {entry['buckets']} buckets" if entry['buckets'] > 1 else ""
+        lines.append(f"`{entry['route']}` ➜ **{entry['calls']}**{spread} ({entry['limit']}/{entry['per']:.0f}s {source})")
+    embed.add_field(name=f"📡 Chamadas à API ({estimate['calls']})", value='\n'.join(lines)[:1024] or "Nenhuma", inline=False)
+
+    minutes, seconds = divmod(int(estimate['seconds']), 60)
+    embed.add_field(name="⏳ Tempo Estimado", value=f"~{minutes}min {seconds}s" if minutes else f"~{seconds}s", inline=True)
+    embed.add_field(name="⚡ Concorrência", value=str(estimate['concurrency']), inline=True)
+
+    issues = estimate['issues']
+    if issues:
+        shown = '\n'.join(f"**{name}:** {reason}" for name, reason in issues[:15])
+        more = f"\n... e mais {len(issues) - 15}" if len(issues) > 15 else ""
+        embed.add_field(name=f"⚠️ Alertas ({len(issues)})", value=(shown + more)[:1024], inline=False)
+    else:
+        embed.add_field(name="✅ Alertas", value="Nenhum problema previsto", inline=False)
+
+    embed.set_footer(text=f"Para executar: !sec_restaurar {backup_id}")
+    return embed
+
+def restore_progress_embed(job: RestoreJob, updated_at: Optional[str] = None, failures: Optional[int] = None) -> discord.Embed:
+    """Embed de progresso da restauração (barra, contagem e ETA)
+
+    Com updated_at, mostra o estado persistido de um job parado em vez do progresso ao vivo.
+    """
+    total = job.total or 1
+    filled = int(job.completed / total * 20)
+    bar = f"`{'█' * filled}{'░' * (20 - filled)}` {job.completed}/{job.total}"
+    embed = discord.Embed(
+        title="🔄 RESTAURANDO BACKUP",
+        description=bar if updated_at else f"⚠️ **NÃO INTERROMPA O PROCESSO**\n\n{bar}",
+        color=COLORS['warning']
+    )
+    embed.add_field(name="🎭 Cargos", value=str(job.counts('role')), inline=True)
+    embed.add_field(name="📁 Categorias", value=str(job.counts('category')), inline=True)
+    embed.add_field(name="📺 Canais", value=str(job.counts('channel')), inline=True)
+    embed.add_field(name="❌ Falhas", value=str(len(job.failed) if failures is None else failures), inline=True)
+    if updated_at:
+        embed.add_field(name="📅 Atualizado", value=datetime.fromisoformat(updated_at).strftime('%d/%m/%Y %H:%M'), inline=True)
+    else:
+        eta = job.eta_seconds()
+        embed.add_field(name="⏱️ Decorrido", value=f"{job.elapsed():.0f}s", inline=True)
+        embed.add_field(name="⏳ ETA", value=f"{eta:.0f}s" if eta is not None else "calculando...", inline=True)
+    return embed
+
+async def run_restore_job(ctx, message, job: RestoreJob):
+    """Executa (ou retoma) um job de restauração, atualizando o embed e o estado persistido"""
+    await message.edit(embed=restore_progress_embed(job))
+
+    last_edit = 0.0
+
+    async def report(job):
+        nonlocal last_edit
+        now = time.monotonic()
+        if now - last_edit < RESTORE_PROGRESS_INTERVAL:
+            return
+        last_edit = now
+        try:
+            await message.edit(embed=restore_progress_embed(job))
+        except Exception as e:
+            print(f"❌ Erro ao atualizar progresso da restauração: {e}")
+
+    security_system.active_restores[job.job_id] = job
+    try:
+        await job.run(concurrency=action_scheduler.guild_recreate_slots, on_progress=report)
+    finally:
+        # Job com falhas fica marcado para ser retomado; interrupções deixam 'running' no disco
+        del security_system.active_restores[job.job_id]
+        security_system.set_restore_job_status(ctx.guild.id, job.job_id, 'failed' if job.failed else 'done')
+        await security_system.flush()
+
+    restored_count = {'categories': job.counts('category'), 'channels': job.counts('channel'), 'roles': job.counts('role')}
+    backup_id = job.backup_id
+
+    # Sucesso
+    success_embed = discord.Embed(
+        title="✅ BACKUP RESTAURADO COM SUCESSO" if not job.failed else "⚠️ RESTAURAÇÃO CONCLUÍDA COM FALHAS",
+        description=f"🎉 **Restauração concluída!**\n\n🆔 **Backup ID:** `{backup_id}`" if not job.failed else
+                    f"🆔 **Backup ID:** `{backup_id}`\n\nUse `!sec_restore_job resume {job.job_id}` para tentar os passos que falharam.",
+        color=COLORS['success'] if not job.failed else COLORS['warning'],
+        timestamp=datetime.utcnow()
+    )
+
+    success_embed.add_field(
+        name="📊 Itens Restaurados",
+        value=f"📁 **Categorias:** {restored_count['categories']}\n📺 **Canais:** {restored_count['channels']}\n🎭 **Cargos:** {restored_count['roles']}\n✏️ **Editados:** {sum(job.counts(kind, 'edit') for kind in ('role', 'category', 'channel'))}\n👥 **Membros:** {job.members_restored}\n❌ **Falhas:** {len(job.failed)}\n⏱️ **Tempo:** {job.elapsed():.0f}s",
+        inline=True
+    )
+
+    backup_date = job.meta.get('backup_created_at')
+    success_embed.add_field(
+        name="ℹ️ Informações",
+        value=f"🏰 **Servidor Original:** {job.meta.get('server_name')}\n📅 **Backup de:** {datetime.fromisoformat(backup_date).strftime('%d/%m/%Y') if backup_date else '?'}\n👤 **Restaurado por:** {ctx.author.mention}",
+        inline=True
+    )
+
+    success_embed.set_footer(text=f"Sistema de Segurança - Restauração Completa • Job {job.job_id}")
+
+    await message.edit(embed=success_embed)
+
+    # Log da restauração
+    await security_system.log_security_action(
+        ctx.guild,
+        "🔄 BACKUP RESTAURADO",
+        f"Backup `{backup_id}` restaurado por {ctx.author.mention}",
+        COLORS['success'],
+        [
+            {'name': '🆔 ID', 'value': backup_id, 'inline': True},
+            {'name': '🧾 Job', 'value': job.job_id, 'inline': True},
+            {'name': '📊 Restaurados', 'value': f"{restored_count['channels']} canais, {restored_count['roles']} cargos", 'inline': True}
+        ]
+    )
+
 @bot.command(name='restore_backup', aliases=['restaurar'])
 @is_owner()
-async def restore_backup(ctx, backup_id: str = None):
-    """🔥 Restaura um backup completo usando o ID com 5 confirmações"""
+async def restore_backup(ctx, backup_id: str = None, *flags):
+    """🔥 Restaura um backup completo usando o ID com 5 confirmações (--diff aplica só as diferenças, --dry-run só simula)"""
     if not backup_id:
         embed = discord.Embed(
             title="❌ ID Necessário",
-            description="Use: `!sec_restore <ID_do_backup>`\n\nPara ver backups disponíveis: `!sec_b`",
+            description="Use: `!sec_restaurar <ID_do_backup>`\n`!sec_restaurar <ID> --diff` ➜ aplica só o que mudou\n`!sec_restaurar <ID> --dry-run` ➜ simula sem alterar nada\n\nPara ver backups disponíveis: `!sec_b`",
             color=COLORS['danger']
         )
         await ctx.reply(embed=embed)
@@ -1288,14 +4631,9 @@ async def restore_backup(ctx, backup_id: str = None):
         
     try:
         guild_id_str = str(ctx.guild.id)
-        backups = security_system.backup_data.get(guild_id_str, {}).get('full_backups', [])
         
         # Procura backup pelo ID
-        target_backup = None
-        for backup in backups:
-            if backup.get('backup_id', '').upper() == backup_id.upper():
-                target_backup = backup
-                break
+        target_backup = security_system.find_full_backup(guild_id_str, backup_id)
                 
         if not target_backup:
             embed = discord.Embed(
@@ -1306,6 +4644,23 @@ async def restore_backup(ctx, backup_id: str = None):
             await ctx.reply(embed=embed)
             return
 
+        # Plano calculado antes das confirmações: no modo --diff, compara com o servidor atual
+        diff_mode = '--diff' in flags
+        steps = reconcile_restore_plan(target_backup, ctx.guild) if diff_mode else build_restore_plan(target_backup)
+        summary = summarize_plan(steps)
+        if '--dry-run' in flags:
+            estimate = estimate_restore_plan(target_backup, steps, ctx.guild)
+            await ctx.reply(embed=restore_dry_run_embed(backup_id, steps, summary, estimate))
+            return
+        if diff_mode and not summary.get('create') and not summary.get('edit'):
+            embed = discord.Embed(
+                title="✅ Nada a Restaurar",
+                description=f"Todos os canais e cargos do backup `{backup_id}` já existem no servidor.",
+                color=COLORS['success']
+            )
+            await ctx.reply(embed=embed)
+            return
+
         # Sistema de confirmação múltipla (5 vezes)
         confirmations = [
             "⚠️ **CONFIRMAÇÃO 1/5** - Você deseja restaurar este backup?",
@@ -1329,7 +4684,11 @@ async def restore_backup(ctx, backup_id: str = None):
             embed.add_field(name="⏰ Tempo limite", value="45 segundos", inline=True)
             
             if i == 5:
-                embed.add_field(name="🚨 ATENÇÃO", value="**ESTA É A CONFIRMAÇÃO FINAL!**\n🔴 Todos os canais e cargos serão recriados!", inline=False)
+                if diff_mode:
+                    embed.add_field(name="🚨 ATENÇÃO", value="**ESTA É A CONFIRMAÇÃO FINAL!**\n🟡 Apenas as diferenças abaixo serão aplicadas.", inline=False)
+                else:
+                    embed.add_field(name="🚨 ATENÇÃO", value="**ESTA É A CONFIRMAÇÃO FINAL!**\n🔴 Todos os canais e cargos serão recriados!", inline=False)
+                embed.add_field(name="🧮 Alterações", value=format_plan_summary(steps, summary), inline=False)
             
             confirm_msg = await ctx.reply(embed=embed)
             await confirm_msg.add_reaction('✅')
@@ -1371,120 +4730,14 @@ async def restore_backup(ctx, backup_id: str = None):
             if i < 5:
                 await asyncio.sleep(3)
 
-        # Inicia restauração
-        progress_embed = discord.Embed(
-            title="🔄 RESTAURANDO BACKUP",
-            description="⚠️ **NÃO INTERROMPA O PROCESSO**\n\n🔄 Iniciando restauração...",
-            color=COLORS['warning']
-        )
-        await confirm_msg.edit(embed=progress_embed)
-        
-        restored_count = {'categories': 0, 'channels': 0, 'roles': 0}
-        
-        # Restaura categorias
-        progress_embed.description = "🔄 **Criando categorias...**"
-        await confirm_msg.edit(embed=progress_embed)
-        
-        for category_data in target_backup.get('categories', []):
-            try:
-                await ctx.guild.create_category(
-                    name=category_data['name'],
-                    reason=f"Restauração do backup {backup_id}"
-                )
-                restored_count['categories'] += 1
-            except Exception as e:
-                print(f"Erro ao criar categoria {category_data['name']}: {e}")
-        
-        # Restaura canais
-        progress_embed.description = f"🔄 **Criando canais...** ({len(target_backup['channels'])} para processar)"
-        await confirm_msg.edit(embed=progress_embed)
-        
-        for channel_data in target_backup['channels']:
-            try:
-                category = None
-                if channel_data.get('category'):
-                    category = discord.utils.get(ctx.guild.categories, name=channel_data['category'])
-                
-                if channel_data['type'] == 'text':
-                    await ctx.guild.create_text_channel(
-                        name=channel_data['name'],
-                        category=category,
-                        topic=channel_data.get('topic'),
-                        slowmode_delay=channel_data.get('slowmode_delay', 0),
-                        nsfw=channel_data.get('nsfw', False),
-                        reason=f"Restauração do backup {backup_id}"
-                    )
-                elif channel_data['type'] == 'voice':
-                    await ctx.guild.create_voice_channel(
-                        name=channel_data['name'],
-                        category=category,
-                        bitrate=channel_data.get('bitrate', 64000),
-                        user_limit=channel_data.get('user_limit', 0),
-                        reason=f"Restauração do backup {backup_id}"
-                    )
-                    
-                restored_count['channels'] += 1
-                
-            except Exception as e:
-                print(f"Erro ao criar canal {channel_data['name']}: {e}")
-        
-        # Restaura cargos
-        progress_embed.description = f"🔄 **Criando cargos...** ({len(target_backup['roles'])} para processar)"
-        await confirm_msg.edit(embed=progress_embed)
-        
-        for role_data in target_backup['roles']:
-            try:
-                permissions = discord.Permissions(role_data['permissions'])
-                color = discord.Color(int(role_data['color'].replace('#', ''), 16)) if role_data['color'] != '#000000' else discord.Color.default()
-                
-                await ctx.guild.create_role(
-                    name=role_data['name'],
-                    permissions=permissions,
-                    color=color,
-                    hoist=role_data.get('hoist', False),
-                    mentionable=role_data.get('mentionable', True),
-                    reason=f"Restauração do backup {backup_id}"
-                )
-                restored_count['roles'] += 1
-                
-            except Exception as e:
-                print(f"Erro ao criar cargo {role_data['name']}: {e}")
-
-        # Sucesso
-        success_embed = discord.Embed(
-            title="✅ BACKUP RESTAURADO COM SUCESSO",
-            description=f"🎉 **Restauração concluída!**\n\n🆔 **Backup ID:** `{backup_id}`",
-            color=COLORS['success'],
-            timestamp=datetime.utcnow()
-        )
-        
-        success_embed.add_field(
-            name="📊 Itens Restaurados",
-            value=f"📁 **Categorias:** {restored_count['categories']}\n📺 **Canais:** {restored_count['channels']}\n🎭 **Cargos:** {restored_count['roles']}",
-            inline=True
-        )
-        
-        success_embed.add_field(
-            name="ℹ️ Informações",
-            value=f"🏰 **Servidor Original:** {target_backup['server_name']}\n📅 **Backup de:** {datetime.fromisoformat(target_backup['created_at']).strftime('%d/%m/%Y')}\n👤 **Restaurado por:** {ctx.author.mention}",
-            inline=True
-        )
-        
-        success_embed.set_footer(text="Sistema de Segurança - Restauração Completa")
-        
-        await confirm_msg.edit(embed=success_embed)
-        
-        # Log da restauração
-        await security_system.log_security_action(
-            ctx.guild,
-            "🔄 BACKUP RESTAURADO",
-            f"Backup `{backup_id}` restaurado por {ctx.author.mention}",
-            COLORS['success'],
-            [
-                {'name': '🆔 ID', 'value': backup_id, 'inline': True},
-                {'name': '📊 Restaurados', 'value': f"{restored_count['channels']} canais, {restored_count['roles']} cargos", 'inline': True}
-            ]
-        )
+        # Inicia restauração: plano em grafo persistido, passos independentes em paralelo
+        job = RestoreJob(ctx.guild, backup_id, steps, f"Restauração do backup {backup_id}",
+                         job_id=str(uuid.uuid4())[:8].upper(),
+                         meta={'mode': 'diff' if diff_mode else 'full', 'server_name': target_backup['server_name'],
+                               'backup_created_at': target_backup['created_at'], 'created_by': ctx.author.id})
+        security_system.save_restore_job(ctx.guild.id, job.to_record())
+        await security_system.flush()
+        await run_restore_job(ctx, confirm_msg, job)
 
     except Exception as e:
         error_embed = discord.Embed(
@@ -1498,37 +4751,30 @@ async def restore_backup(ctx, backup_id: str = None):
 @is_owner()
 async def view_ban_activity(ctx, limite: int = 10):
     """Visualiza atividade de banimentos recentes"""
-    guild_id_str = str(ctx.guild.id)
-    ban_data = security_system.ban_tracker.get(guild_id_str, {})
+    # Usuários/bots com mais banimentos, já ordenados
+    activity = await security_system.get_ban_activity(ctx.guild.id, limite)
 
     embed = discord.Embed(title="🔨 Atividade de Banimentos", color=COLORS['info'])
 
-    if not ban_data:
+    if not activity:
         embed.add_field(name="📊 Status", value="Nenhuma atividade de banimento registrada", inline=False)
         await ctx.reply(embed=embed)
         return
 
-    # Mostra usuários/bots com mais banimentos
     activity_summary = []
-    for user_id, bans in ban_data.items():
-        if bans:  # Se tem banimentos recentes
-            user = bot.get_user(int(user_id))
-            user_name = user.display_name if user else f"ID: {user_id}"
-            is_bot = any(ban.get('is_bot', False) for ban in bans[:1]) if bans else False
-            bot_icon = "🤖" if is_bot else "👤"
-            
-            activity_summary.append({
-                'name': f"{bot_icon} {user_name}",
-                'count': len(bans),
-                'recent': bans[-1]['timestamp'] if bans else None
-            })
-
-    # Ordena por quantidade de banimentos
-    activity_summary.sort(key=lambda x: x['count'], reverse=True)
+    for item in activity:
+        user = bot.get_user(int(item['user_id']))
+        user_name = user.display_name if user else f"ID: {item['user_id']}"
+        bot_icon = "🤖" if item['is_bot'] else "👤"
+        activity_summary.append({
+            'name': f"{bot_icon} {user_name}",
+            'count': item['count'],
+            'recent': item['recent']
+        })
 
     if activity_summary:
         summary_text = []
-        for item in activity_summary[:limite]:
+        for item in activity_summary:
             recent_time = datetime.fromisoformat(item['recent']).strftime("%d/%m %H:%M") if item['recent'] else "N/A"
             summary_text.append(f"{item['name']}: {item['count']} banimentos (último: {recent_time})")
         
@@ -1542,7 +4788,7 @@ async def view_ban_activity(ctx, limite: int = 10):
         config = security_system.get_guild_config(ctx.guild.id)
         embed.add_field(
             name="⚙️ Configurações",
-            value=f"Máximo: {config['max_bans_per_timeframe']} banimentos\nTempo: {config['ban_timeframe_minutes']} minutos\nAuto-ban: {'✅' if config['auto_ban_mass_banner'] else '❌'}",
+            value=f"Máximo: {config.max_bans_per_timeframe} banimentos\nTempo: {config.ban_timeframe_minutes} minutos\nAuto-ban: {'✅' if config.auto_ban_mass_banner else '❌'}",
             inline=True
         )
     else:
@@ -1584,7 +4830,8 @@ async def warn_user(ctx, user: discord.Member, *, reason: str = "Sem motivo espe
     }
 
     security_system.user_warnings[guild_id][user_id].append(warning)
-    await security_system.save_data()
+    security_system.record_change('push', ['user_warnings', guild_id, user_id], warning)
+    await security_system.flush()
 
     warnings_count = len(security_system.user_warnings[guild_id][user_id])
 
@@ -1617,10 +4864,7 @@ async def view_warnings(ctx, user: discord.Member = None):
     if not user:
         user = ctx.author
 
-    user_id = str(user.id)
-    guild_id = str(ctx.guild.id)
-
-    warnings = security_system.user_warnings.get(guild_id, {}).get(user_id, [])
+    warnings, total_warnings = await security_system.get_user_warnings(ctx.guild.id, user.id, 10)
 
     if not warnings:
         await ctx.reply(f"✅ {user.mention} não possui avisos!")
@@ -1631,7 +4875,7 @@ async def view_warnings(ctx, user: discord.Member = None):
         color=COLORS['warning']
     )
 
-    for i, warning in enumerate(warnings[-10:], 1):  # Últimos 10
+    for i, warning in enumerate(warnings, 1):  # Últimos 10
         timestamp = datetime.fromisoformat(warning['timestamp']).strftime("%d/%m %H:%M")
         moderator = bot.get_user(warning['moderator'])
         mod_name = moderator.mention if moderator else "Desconhecido"
@@ -1642,7 +4886,7 @@ async def view_warnings(ctx, user: discord.Member = None):
             inline=False
         )
 
-    embed.add_field(name="📊 Total", value=len(warnings), inline=True)
+    embed.add_field(name="📊 Total", value=total_warnings, inline=True)
 
     await ctx.reply(embed=embed)
 
@@ -1656,7 +4900,8 @@ async def clear_warnings(ctx, user: discord.Member):
     if guild_id in security_system.user_warnings and user_id in security_system.user_warnings[guild_id]:
         warnings_count = len(security_system.user_warnings[guild_id][user_id])
         del security_system.user_warnings[guild_id][user_id]
-        await security_system.save_data()
+        security_system.record_change('del', ['user_warnings', guild_id, user_id])
+        await security_system.flush()
 
         await ctx.reply(f"✅ {warnings_count} avisos de {user.mention} foram limpos!")
     else:
@@ -1682,10 +4927,10 @@ async def mute_user(ctx, user: discord.Member, duration: int = 300, *, reason: s
         return
         
     try:
-        await user.timeout(
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.timeout(
             timedelta(seconds=duration),
             reason=f"🔒 Mutado por {ctx.author}: {reason}"
-        )
+        ))
 
         embed = discord.Embed(
             title="🔇 Usuário Mutado",
@@ -1717,7 +4962,7 @@ async def mute_user(ctx, user: discord.Member, duration: int = 300, *, reason: s
 async def unmute_user(ctx, user: discord.Member):
     """Desmuta um usuário"""
     try:
-        await user.timeout(None, reason=f"Desmutado por {ctx.author}")
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.timeout(None, reason=f"Desmutado por {ctx.author}"))
         await ctx.reply(f"✅ {user.mention} foi desmutado!")
 
         await security_system.log_security_action(
@@ -1750,7 +4995,7 @@ async def ban_user(ctx, user: discord.Member, *, motivo: str = "Sem motivo espec
         return
         
     try:
-        await user.ban(reason=f"🔒 Banido por {ctx.author}: {motivo}")
+        await bulk_ban_queue.ban(ctx.guild, user, reason=f"🔒 Banido por {ctx.author}: {motivo}")
 
         embed = discord.Embed(
             title="🔨 Usuário Banido",
@@ -1773,6 +5018,119 @@ async def ban_user(ctx, user: discord.Member, *, motivo: str = "Sem motivo espec
     except Exception as e:
         await ctx.reply(f"❌ Erro ao banir usuário: {e}")
 
+@bot.command(name='massban', aliases=['banir_lote'])
+@is_owner()
+async def mass_ban(ctx, *args):
+    """Bane vários usuários em lote (IDs/menções ou filtro)"""
+    # 🔒 VERIFICAÇÃO DUPLA DE SEGURANÇA
+    if ctx.author.id != OWNER_ID:
+        await ctx.reply("🚫 Acesso negado! Apenas o owner pode usar este comando.")
+        return
+
+    guild = ctx.guild
+    usage = (
+        "`!sec_massban <id> <id> ...` ➜ IDs ou menções\n"
+        "`!sec_massban novas <dias>` ➜ Contas criadas há menos de N dias\n"
+        "`!sec_massban entrou <minutos>` ➜ Entraram nos últimos N minutos\n"
+        "`!sec_massban nome <texto>` ➜ Nome contém o texto"
+    )
+    if not args:
+        embed = discord.Embed(title="🔨 Banimento em Lote", description=usage, color=COLORS['info'])
+        await ctx.reply(embed=embed)
+        return
+
+    # Monta a lista de alvos
+    mode = args[0].lower()
+    now = datetime.now(timezone.utc)
+    try:
+        if mode == 'novas':
+            days = int(args[1])
+            targets = [member for member in guild.members if (now - member.created_at).days < days]
+            criteria = f"Contas com menos de {days} dias"
+        elif mode == 'entrou':
+            minutes = int(args[1])
+            targets = [member for member in guild.members if member.joined_at and (now - member.joined_at).total_seconds() < minutes * 60]
+            criteria = f"Entraram nos últimos {minutes} minutos"
+        elif mode == 'nome':
+            text = ' '.join(args[1:]).lower()
+            if not text:
+                raise ValueError
+            targets = [member for member in guild.members if text in member.name.lower() or text in member.display_name.lower()]
+            criteria = f"Nome contém \"{text}\""
+        else:
+            targets = [discord.Object(id=int(arg.strip('<@!>'))) for arg in args]
+            criteria = "Lista de IDs"
+    except (ValueError, IndexError):
+        await ctx.reply(f"❌ Parâmetros inválidos!\n{usage}")
+        return
+
+    # 👑 Owner, whitelist, o próprio bot e o dono do servidor nunca entram no lote
+    config = security_system.get_guild_config(guild.id)
+    protected = {OWNER_ID, ctx.author.id, guild.owner_id, bot.user.id} | config.whitelist_users
+    unique = {}
+    for target in targets:
+        if target.id not in protected:
+            unique[target.id] = target
+    targets = list(unique.values())
+
+    if not targets:
+        await ctx.reply("❌ Nenhum usuário encontrado para banir!")
+        return
+
+    preview = ', '.join(f"<@{target.id}>" for target in targets[:20])
+    if len(targets) > 20:
+        preview += f" e mais {len(targets) - 20}"
+    embed = discord.Embed(
+        title="⚠️ CONFIRMAR BANIMENTO EM LOTE",
+        description=f"**{len(targets)}** usuários serão banidos.\n\n{preview}",
+        color=COLORS['warning']
+    )
+    embed.add_field(name="🎯 Critério", value=criteria, inline=True)
+    embed.add_field(name="📦 Lotes", value=f"{-(-len(targets) // BULK_BAN_CHUNK)} x até {BULK_BAN_CHUNK}", inline=True)
+    confirm_msg = await ctx.reply(embed=embed)
+    await confirm_msg.add_reaction('✅')
+    await confirm_msg.add_reaction('❌')
+
+    def check(reaction, user):
+        return user == ctx.author and str(reaction.emoji) in ['✅', '❌'] and reaction.message.id == confirm_msg.id
+
+    try:
+        reaction, _ = await bot.wait_for('reaction_add', timeout=45.0, check=check)
+    except asyncio.TimeoutError:
+        await confirm_msg.edit(embed=discord.Embed(title="⏰ TEMPO ESGOTADO", description="Banimento em lote cancelado.", color=COLORS['warning']))
+        return
+    if str(reaction.emoji) == '❌':
+        await confirm_msg.edit(embed=discord.Embed(title="❌ CANCELADO", description="Banimento em lote cancelado.", color=COLORS['danger']))
+        return
+
+    chunks_before = bulk_ban_queue.stats['chunks']
+    reason = f"🔒 Banimento em lote por {ctx.author}: {criteria}"
+    results = await asyncio.gather(*(bulk_ban_queue.ban(guild, target, reason=reason) for target in targets), return_exceptions=True)
+    banned = sum(1 for result in results if result is True)
+    failed = [target.id for target, result in zip(targets, results) if result is not True]
+
+    embed = discord.Embed(
+        title="🔨 Banimento em Lote Concluído",
+        description=f"✅ **{banned}** banidos | ❌ **{len(failed)}** falhas",
+        color=COLORS['danger'] if banned else COLORS['warning']
+    )
+    embed.add_field(name="🎯 Critério", value=criteria, inline=True)
+    embed.add_field(name="📦 Chamadas à API", value=str(bulk_ban_queue.stats['chunks'] - chunks_before), inline=True)
+    if failed:
+        embed.add_field(name="❌ Falharam", value=', '.join(f"`{user_id}`" for user_id in failed[:30]), inline=False)
+    await confirm_msg.edit(embed=embed)
+
+    await security_system.log_security_action(
+        guild,
+        "🔨 Banimento em Lote",
+        f"{banned} usuários banidos por {ctx.author.mention}",
+        COLORS['danger'],
+        [
+            {'name': '🎯 Critério', 'value': criteria, 'inline': True},
+            {'name': '❌ Falhas', 'value': str(len(failed)), 'inline': True}
+        ]
+    )
+
 @bot.command(name='expulsar', aliases=['kick'])
 @is_owner()
 async def kick_user(ctx, user: discord.Member, *, motivo: str = "Sem motivo especificado"):
@@ -1793,7 +5151,7 @@ async def kick_user(ctx, user: discord.Member, *, motivo: str = "Sem motivo espe
         return
         
     try:
-        await user.kick(reason=f"🔒 Expulso por {ctx.author}: {motivo}")
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.kick(reason=f"🔒 Expulso por {ctx.author}: {motivo}"))
 
         embed = discord.Embed(
             title="👢 Usuário Expulso",
@@ -1825,7 +5183,7 @@ async def clear_messages(ctx, quantidade: int = 10):
         return
 
     try:
-        deleted = await ctx.channel.purge(limit=quantidade + 1)
+        deleted = await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: ctx.channel.purge(limit=quantidade + 1))
 
         embed = discord.Embed(
             title="🧹 Mensagens Limpas",
@@ -1854,7 +5212,7 @@ async def clear_messages(ctx, quantidade: int = 10):
 async def set_slowmode(ctx, segundos: int = 0):
     """Define modo lento no canal"""
     try:
-        await ctx.channel.edit(slowmode_delay=segundos)
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: ctx.channel.edit(slowmode_delay=segundos))
 
         if segundos == 0:
             await ctx.reply("✅ Modo lento desativado!")
@@ -1878,7 +5236,7 @@ async def lock_channel(ctx):
     try:
         overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
         overwrite.send_messages = False
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite))
 
         embed = discord.Embed(
             title="🔒 Canal Bloqueado",
@@ -1904,7 +5262,7 @@ async def unlock_channel(ctx):
     try:
         overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
         overwrite.send_messages = True
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite))
 
         embed = discord.Embed(
             title="🔓 Canal Desbloqueado",
@@ -2031,7 +5389,7 @@ async def manage_role(ctx, acao: str, user: discord.Member, *, nome_cargo: str):
 
     try:
         if acao.lower() in ['add', 'adicionar', 'dar']:
-            await user.add_roles(role, reason=f"Cargo adicionado por {ctx.author}")
+            await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.add_roles(role, reason=f"Cargo adicionado por {ctx.author}"))
 
             embed = discord.Embed(
                 title="✅ Cargo Adicionado",
@@ -2047,7 +5405,7 @@ async def manage_role(ctx, acao: str, user: discord.Member, *, nome_cargo: str):
             )
 
         elif acao.lower() in ['remove', 'remover', 'tirar']:
-            await user.remove_roles(role, reason=f"Cargo removido por {ctx.author}")
+            await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.remove_roles(role, reason=f"Cargo removido por {ctx.author}"))
 
             embed = discord.Embed(
                 title="❌ Cargo Removido",
@@ -2076,7 +5434,7 @@ async def change_nickname(ctx, user: discord.Member, *, novo_nick: str = None):
     """Altera o nickname de um usuário"""
     try:
         old_nick = user.display_name
-        await user.edit(nick=novo_nick, reason=f"Nickname alterado por {ctx.author}")
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: user.edit(nick=novo_nick, reason=f"Nickname alterado por {ctx.author}"))
 
         embed = discord.Embed(
             title="✏️ Nickname Alterado",
@@ -2140,7 +5498,7 @@ async def delete_role(ctx, *, nome_cargo: str):
 
     try:
         role_name = role.name
-        await role.delete(reason=f"Cargo deletado por {ctx.author}")
+        await action_scheduler.run(PRIORITY_PUNISH, ctx.guild.id, lambda: role.delete(reason=f"Cargo deletado por {ctx.author}"))
 
         embed = discord.Embed(
             title="🗑️ Cargo Deletado",
@@ -2169,7 +5527,6 @@ async def save_server(ctx):
         guild = ctx.guild
         
         # Gera ID único para o backup
-        import uuid
         backup_id = str(uuid.uuid4())[:8].upper()
         
         # Mensagem inicial
@@ -2193,7 +5550,7 @@ async def save_server(ctx):
             'members_count': guild.member_count,
             'server_icon': str(guild.icon.url) if guild.icon else None,
             'server_banner': str(guild.banner.url) if guild.banner else None,
-            'backup_version': '2.0'
+            'backup_version': '2.1'
         }
 
         # Backup de categorias
@@ -2213,6 +5570,7 @@ async def save_server(ctx):
                     'id': category.id,
                     'created_at': category.created_at.isoformat() if category.created_at else None
                 }
+                category_data['overwrites'] = pack_overwrites(channel_overwrites(category))
                 backup_data['categories'].append(category_data)
                 categories_count += 1
             except Exception as e:
@@ -2230,6 +5588,7 @@ async def save_server(ctx):
                     'type': str(channel.type),
                     'position': channel.position,
                     'category': channel.category.name if channel.category else None,
+                    'category_id': channel.category_id,
                     'id': channel.id,
                     'created_at': channel.created_at.isoformat() if channel.created_at else None
                 }
@@ -2245,6 +5604,8 @@ async def save_server(ctx):
                     channel_data['bitrate'] = channel.bitrate
                 if hasattr(channel, 'user_limit'):
                     channel_data['user_limit'] = channel.user_limit
+                # Sobrescritas cruas quando disponíveis: sem montar objetos Role/Member para cada alvo
+                channel_data['overwrites'] = pack_overwrites(channel_overwrites(channel))
                     
                 backup_data['channels'].append(channel_data)
                 channels_count += 1
@@ -2255,6 +5616,16 @@ async def save_server(ctx):
         progress_embed.description = f"🔄 **Salvando cargos...** ({len(guild.roles)} encontrados)"
         await message.edit(embed=progress_embed)
         
+        # Uma passada pelos membros (IDs dos cargos direto do array interno do membro);
+        # role.members varreria todos os membros de novo para cada cargo
+        role_members = {}
+        for member in guild.members:
+            for role_id in member_role_ids(member):
+                members = role_members.get(role_id)
+                if members is None:
+                    members = role_members[role_id] = array('Q')
+                members.append(member.id)
+
         roles_count = 0
         for role in guild.roles:
             if role != guild.default_role:
@@ -2267,10 +5638,12 @@ async def save_server(ctx):
                         'hoist': role.hoist,
                         'mentionable': role.mentionable,
                         'managed': role.managed,
-                        'members_count': len(role.members),
+                        'members_count': len(role_members.get(role.id, ())),
                         'id': role.id,
                         'created_at': role.created_at.isoformat() if role.created_at else None
                     }
+                    if role.id in role_members and not role.managed:
+                        role_data['members'] = pack_ids(role_members[role.id])
                     backup_data['roles'].append(role_data)
                     roles_count += 1
                 except Exception as e:
@@ -2288,40 +5661,27 @@ async def save_server(ctx):
         guild_id_str = str(guild.id)
         if guild_id_str not in security_system.backup_data:
             security_system.backup_data[guild_id_str] = {'channels': [], 'roles': [], 'full_backups': []}
+            security_system.record_change('set', ['backup_data', guild_id_str], {'channels': [], 'roles': [], 'full_backups': []})
 
-        # Adiciona o novo backup mantendo histórico
-        if 'full_backups' not in security_system.backup_data[guild_id_str]:
-            security_system.backup_data[guild_id_str]['full_backups'] = []
-            
-        security_system.backup_data[guild_id_str]['full_backups'].append(backup_data)
-        
-        # Mantém apenas os últimos 10 backups
-        security_system.backup_data[guild_id_str]['full_backups'] = security_system.backup_data[guild_id_str]['full_backups'][-10:]
+        # Adiciona o novo backup mantendo histórico (últimos 10); canais/cargos
+        # iguais aos de backups anteriores não são gravados de novo
+        manifest, objects = await run_serializer(build_backup_manifest, backup_data)
+        new_objects = security_system.store_full_backup(guild_id_str, manifest, objects)
+        print(f"💾 Backup {backup_id}: {len(new_objects)} de {len(objects)} objetos novos")
         
         # Salva os dados no arquivo
-        await security_system.save_data()
+        await security_system.flush()
 
-        # Verifica se o backup foi salvo corretamente
+        # Verifica se o backup foi salvo corretamente (lê do disco só este backup)
         try:
-            # Recarrega os dados para verificar
-            await security_system.load_data()
-            saved_backup = None
-            if guild_id_str in security_system.backup_data:
-                for backup in security_system.backup_data[guild_id_str].get('full_backups', []):
-                    if backup.get('backup_id') == backup_id:
-                        saved_backup = backup
-                        break
-            
-            if not saved_backup:
-                raise Exception("Backup não foi encontrado após salvamento")
-                
+            await security_system.verify_persisted_backup(guild_id_str, manifest, new_objects)
         except Exception as e:
             raise Exception(f"Falha na verificação do backup: {str(e)}")
 
         # Embed final de sucesso
         success_embed = discord.Embed(
             title="✅ BACKUP COMPLETO SALVO COM SUCESSO",
-            description=f"🎉 **Backup realizado e verificado!**\n\n🆔 **ID do Backup:** `{backup_id}`\n💾 **Arquivo salvo em:** `security_data.json`",
+            description=f"🎉 **Backup realizado e verificado!**\n\n🆔 **ID do Backup:** `{backup_id}`\n💾 **Arquivo salvo em:** `{security_system.storage.path}`",
             color=COLORS['success'],
             timestamp=datetime.utcnow()
         )
@@ -2340,7 +5700,7 @@ async def save_server(ctx):
         
         success_embed.add_field(
             name="⚡ Comandos Úteis", 
-            value=f"• `!sec_restore {backup_id}` - Restaurar backup\n• `!sec_backup` - Ver todos os backups\n• `!sec_logs` - Ver logs do sistema", 
+            value=f"• `!sec_restaurar {backup_id}` - Restaurar backup\n• `!sec_backup` - Ver todos os backups\n• `!sec_logs` - Ver logs do sistema", 
             inline=False
         )
         
@@ -2402,14 +5762,9 @@ async def verify_backup(ctx, backup_id: str = None):
     
     try:
         guild_id_str = str(ctx.guild.id)
-        backups = security_system.backup_data.get(guild_id_str, {}).get('full_backups', [])
         
         # Procura backup pelo ID
-        target_backup = None
-        for backup in backups:
-            if backup.get('backup_id', '').upper() == backup_id.upper():
-                target_backup = backup
-                break
+        target_backup = security_system.find_full_backup(guild_id_str, backup_id)
                 
         if not target_backup:
             embed = discord.Embed(
@@ -2473,6 +5828,18 @@ async def verify_backup(ctx, backup_id: str = None):
             if 'permissions' not in role:
                 issues.append(f"❌ Cargo {i+1} sem permissões")
         
+        # Recalcula o checksum gravado na criação do backup
+        manifest = security_system.find_full_backup(guild_id_str, backup_id, expand=False)
+        checksum_issues = security_system.check_backup_integrity(guild_id_str, manifest)
+        issues.extend(checksum_issues)
+        if manifest.get('checksum'):
+            checksum_status = "✅ Confere" if not checksum_issues else "❌ Não confere"
+            embed.add_field(
+                name="🔐 Checksum",
+                value=f"`sha256:{manifest['checksum'][:16]}…`\n{checksum_status}",
+                inline=True
+            )
+        
         # Status da verificação
         if not issues:
             status_text = "✅ **Backup íntegro e válido**\n🔒 Todos os dados estão corretos\n⚡ Pronto para restauração"
@@ -2690,6 +6057,7 @@ async def security_help(ctx):
     # Comandos de moderação
     moderation_commands = [
         "🔨 `!sec_banir @user motivo` ➜ Banir usuário",
+        "🔨 `!sec_massban ids/filtro` ➜ Banir em lote",
         "👢 `!sec_expulsar @user motivo` ➜ Expulsar usuário", 
         "🔇 `!sec_m @user tempo motivo` ➜ Mutar usuário",
         "🔊 `!sec_desmutar @user` ➜ Desmutar usuário",
@@ -2715,7 +6083,12 @@ async def security_help(ctx):
         "📺 `!sec_canais` ➜ Listar todos os canais",
         "📋 `!sec_audit [limite]` ➜ Logs de auditoria",
         "💾 `!sec_save` ➜ Backup completo com ID",
-        "🔄 `!sec_restore <ID>` ➜ Restaurar backup por ID"
+        "📤 `!sec_export` ➜ Exportar dados em JSON",
+        "🔄 `!sec_restaurar <ID>` ➜ Restaurar backup por ID",
+        "🧪 `!sec_restaurar <ID> --dry-run` ➜ Simular restauração (chamadas e tempo)",
+        "♻️ `!sec_restore @user` ➜ Devolver cargos removidos de um usuário",
+        "🧾 `!sec_restore_job status [job]` ➜ Progresso das restaurações",
+        "▶️ `!sec_restore_job resume <job>` ➜ Retomar restauração interrompida"
     ]
 
     # Comandos de cargos